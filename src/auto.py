@@ -3,169 +3,156 @@ auto.py
 Defines functions and utilities for performing the actual automation tasks.
 """
 
+import os
 import sys
+import json
 import time
 import logging
 
-import keyboard
 import re
-import mouse
 import numpy as np
-import pyperclip
-from mss import mss
 
-from screen_types import ScreenPoint, ArrayPoint, array_to_screen
+from screen_types import ScreenPoint, ArrayPoint, array_to_screen, screen_to_array
 from logging_config import setup_logger
 from state import UiState
 from util import (
-    find_all_matches, find_first_match,
-    compare_screens, is_ui_settled, find_top_k_matches,
-    validate_state, wait_for_appearance, wait_for_paste
+    find_first_match, find_matches_multi,
+    is_ui_settled, find_top_k_matches,
+    validate_state, wait_for_paste,
+    settle_stats
 )
-from diff import generate_diff_doc
+from wait import WaitCondition, capture_region, changed, visible, wait_until, wait_ledger
+from journal import CaptureJournal
+from pipeline import PostProcessor
+from scroll import ScrollOffset, jump_to_top, scroll_page_down, turn_page
+from telemetry import telemetry
+from profiling import vision_profile
+from triage import CAPTURE, SKIP, Triage, triage_ledger, triage_report
+from worklist import WorklistRow, parse_worklist
+from diff import StreamingDocumentWriter, generate_diff_doc
 from pathlib import Path
-import cv2
 
 from constants import (
     NEUTRAL_CLICK_ZONE,
     HIGHLIGHT_START_POINT,
     REPORT_WINDOW_TOP_LEFT,
     REPORT_WINDOW_WIDTH,
-    REPORT_WINDOW_HEIGHT
+    REPORT_WINDOW_HEIGHT,
+    WORKLIST_ROW_HEIGHT,
 )
 
 logger = setup_logger(__name__)
 
 # Constant coordinates
 
-def is_scrollable(
-    scroll_bounds: tuple[int, int, int, int], match_threshold=0.95
-) -> bool:
-    """
-    Checks the bottom of the scroll area to see whether the page has scrolled after
-    performing a scroll action.
-    """
-    scx, scy, sc_width, sc_height = scroll_bounds
-
-    # checking zone will be the bottom 50 pixel row at the bottom of the scroll area
-    with mss() as sct:
-        region = {
-            "left": scx,
-            "top": sc_height - 50,
-            "width": sc_width,
-            "height": 50,
-        }
-        screenshot = sct.grab(region)
-        before = np.array(screenshot)[:, :, :3].mean(axis=2)
-
-    # perform scroll action
-    mouse.move(scx + sc_width // 2, scy + sc_height // 2)
-    time.sleep(0.1)
-
-    mouse.click()
-    time.sleep(0.1)
-
-    keyboard.press_and_release("page down")
-    time.sleep(0.5)
-
-    with mss() as sct:
-        region = {
-            "left": scx,
-            "top": sc_height - 50,
-            "width": sc_width,
-            "height": 50,
-        }
-        screenshot = sct.grab(region)
-        after = np.array(screenshot)[:, :, :3].mean(axis=2)
-
-    # check if the two images are similar
-    same_probability = (before == after).sum() / (before.shape[0] * before.shape[1])
-    return same_probability < match_threshold
-
-
-def multiple_keypress(keys: list[str]):
+def multiple_keypress(state: UiState, keys: list[str]):
     for key in keys:
-        keyboard.press(key)
+        state.keyboard.press(key)
 
     time.sleep(0.1)
 
     for key in reversed(keys):
-        keyboard.release(key)
+        state.keyboard.release(key)
 
 
-def copy_to_clipboard():
-    mouse.click("left")
+def copy_to_clipboard(state: UiState):
+    state.mouse.click("left")
     time.sleep(0.1)
-    mouse.click("left")
+    state.mouse.click("left")
     time.sleep(0.1)
-    mouse.click("left")
+    state.mouse.click("left")
     time.sleep(0.1)
 
     # Copy the selected text to the clipboard
-    pyperclip.copy("")  # Clear the clipboard
-    mouse.click("right")  # Right-click to open context menu
+    state.clipboard.copy("")  # Clear the clipboard
+    state.mouse.click("right")  # Right-click to open context menu
     time.sleep(0.1)
-    multiple_keypress(["ctrl", "c"])
+    multiple_keypress(state, ["ctrl", "c"])
 
 
 def save_rtf_to_file(rtf_data, filename):
     with open(filename, "w") as file:
         file.write(rtf_data)
 
-def locate_score_button(state: UiState) -> np.ndarray[ScreenPoint]:
+def locate_score_button(state: UiState) -> np.ndarray:
+    """
+    Score buttons on screen as rows of (x, y, width, height), x and y of the top left corner in
+    screen coordinates and the size of whichever template variant matched, top to bottom.
+    """
     logger.info("Locating report buttons")
-    score_buttons = [
-        "score_button.png",
-        "score_button_1.png",
-        "score_button_2.png",
-        "score_button_3.png",
-        "score_button_4.png",
-    ]
-    temp = []
-    for but in score_buttons:
-        template_path = f"template/{but}"
-        matches = find_all_matches(state.screen, template_path, threshold=0.9)
-        temp.extend(matches)
+    matches = find_matches_multi(
+        state.frame,
+        state.templates.matching("score_button"),
+        threshold=0.9,
+        region=state.convert_bounds(state.scroll_bounds),
+    )
 
-    final_matches = sorted([array_to_screen(state.current_monitor, array_coord) for array_coord in temp], key= lambda x: x[1])
-    logger.debug(f"Located {len(final_matches)} report buttons at points: {final_matches}")
-    return np.array(final_matches)
+    final_matches = [
+        (*array_to_screen(state.current_monitor, match.point), match.width, match.height) for match in matches
+    ]
+    logger.debug(f"Located {len(final_matches)} report buttons at: {final_matches}")
+    logger.debug(f"Matched score button variants: {[match.template for match in matches]}")
+    return np.array(final_matches, dtype=int).reshape(-1, 4)
 
-def open_report(location: ScreenPoint, state: UiState, template_path="template/report_window_open_indicator.png") -> None:
+def open_report(location: ScreenPoint, state: UiState, size: tuple[int, int] | None = None) -> None:
+    """
+    Clicks a report's score button, triage_report then waits for whatever the click opened.
+    `size` is the (width, height) of the matched button variant, the plain score_button
+    template's by default.
+    """
     logger.info("Opening report")
     logger.debug(f"Opening report: clicking at ({location[0]+10}, {location[1]+10})")
-    mouse.move(location[0]+10, location[1]+10)
-    time.sleep(0.5)
-    mouse.click()
-    wait_for_appearance(state, template_path)
-    logger.info("Report window opened")
+    if size is None:
+        button = state.templates["score_button"]
+        size = (button.width, button.height)
+    button_bounds = (*screen_to_array(state.current_monitor, location), *size)
+    before_hover = capture_region(state, button_bounds)
+    state.mouse.move(location[0]+10, location[1]+10)
+    wait_until(state, WaitCondition(
+        name="button hover", predicate=changed(before_hover), region=button_bounds, timeout=0.5, legacy_delay=0.5
+    ))
+    state.mouse.click()
+
+def close_report_window(state: UiState, template_name="report_window_open_indicator") -> None:
+    """Closes the report window, waiting for it to disappear instead of sleeping"""
+    logger.info("Closing report")
+    neutral_click_zone = NEUTRAL_CLICK_ZONE.to_absolute(state.top_left)
+    state.mouse.move(*neutral_click_zone)
+    state.mouse.click()  # bring back focus to the report interface
+    state.keyboard.send('alt+f4')
+    indicator = visible(state.templates[template_name])
+    wait_until(state, WaitCondition(
+        name="report window closed", predicate=lambda frame: not indicator(frame), timeout=2, legacy_delay=2
+    ))
     state.refresh()
 
-def wait_for_report_load(state: UiState, template_path="template/highlight_start_point.png") -> None:
-    logger.info("Waiting for report to load")
-    wait_for_appearance(state, template_path)
-    logger.info("Report now loaded in")
+def recover_report(state: UiState, triage: Triage, template_name="report_window_open_indicator") -> None:
+    """Dismisses the error dialog triage found, if any, then closes the report window if it opened"""
+    if triage.reason != "load timeout":
+        logger.info(f"Dismissing {triage.reason}")
+        before = capture_region(state, None)
+        state.keyboard.send('esc')
+        wait_until(state, WaitCondition(name="dialog dismissed", predicate=changed(before), timeout=2))
     state.refresh()
+    if visible(state.templates[template_name])(state.frame):
+        close_report_window(state)
 
-def check_if_addendum(state: UiState, template_path="template/report_addendum_label.png") -> None:
-    """Check if the report opened is an addendum, if so - close the report and exit this iteration gracefully"""
-    logger.info("Checking if report is addendum")
-
-def locate_report_top_left(state: UiState, template_path="template/report_interface.png") -> tuple[ScreenPoint, int, int]:
-    h, w, _ = cv2.imread(template_path).shape
-    temp = find_first_match(state.screen, template_path)
+def locate_report_top_left(state: UiState, template_name="report_interface") -> tuple[ScreenPoint, int, int]:
+    template = state.templates[template_name]
+    h, w = template.height, template.width
+    temp = find_first_match(state.frame, template)
     report_top_left: ScreenPoint = array_to_screen(state.current_monitor, temp)
     logger.debug(f"Located report window top left at {report_top_left} with width {w} and height {h}")
     return report_top_left, w, h
 
-def locate_highlight_start_point(state: UiState, template_path="template/highlight_start_point.png") -> ScreenPoint:
-    temp = find_first_match(state.screen, template_path)
+def locate_highlight_start_point(state: UiState, template_name="highlight_start_point") -> ScreenPoint:
+    temp = find_first_match(state.frame, state.templates[template_name])
     highlight_top_left: ScreenPoint = array_to_screen(state.current_monitor, temp)
     logger.debug(f"Located highlight start point at {highlight_top_left}")
     return highlight_top_left
 
-def locate_checkrows(state: UiState, template_path="template/version_checkrow.png") -> np.ndarray[ScreenPoint]:
-    temp: np.ndarray[ArrayPoint] = find_top_k_matches(state.screen, template_path, 2)
+def locate_checkrows(state: UiState, template_name="version_checkrow") -> np.ndarray[ScreenPoint]:
+    temp: np.ndarray[ArrayPoint] = find_top_k_matches(state.frame, state.templates[template_name], 2)
     checkrow_locations: np.ndarray[ScreenPoint] = np.array(
         sorted([array_to_screen(state.current_monitor, array_point) for array_point in temp], key=lambda x: x[1])
     )
@@ -175,27 +162,49 @@ def locate_checkrows(state: UiState, template_path="template/version_checkrow.pn
 def highlight_report(state: UiState, start_point: ScreenPoint, report_top_left: ScreenPoint, window_width, window_height) -> None:
     bottom_drag_end = ScreenPoint((report_top_left[0] + window_width // 2, report_top_left[1] + window_height + 70))
     logger.info("Start highlighting report")
-    mouse.move(start_point[0] + 3, start_point[1])
-    mouse.press()
-    mouse.move(bottom_drag_end[0], bottom_drag_end[1], duration=1)
+    state.mouse.move(start_point[0] + 3, start_point[1])
+    state.mouse.press()
+    state.mouse.move(bottom_drag_end[0], bottom_drag_end[1], duration=1)
     logger.info("Reached bottom of highlighting report, waiting for scrolling to finish")
-    is_ui_settled(state)
-    mouse.move(0, -120, absolute=False, duration=0.5)  # Drag back up into interface
-    mouse.release()
-    time.sleep(0.5)
+    # The window autoscrolls in steps, a few identical frames between two steps are not the end of the report
+    is_ui_settled(state, roi="report_window", min_stable=1.0, label="highlight")
+    state.mouse.move(0, -120, absolute=False, duration=0.5)  # Drag back up into interface
+    state.mouse.release()
+    # Nothing specific to look for after the release, just let the selection finish repainting
+    is_ui_settled(state, roi="report_window", stable_frames=2, timeout=0.5, label="highlight release")
     logger.info("Report highlighting complete")
 
 def copy_and_save(key: str, state: UiState):
     logger.info("Starting to copy and save report text")
-    report = wait_for_paste(5)
-    dic = {}
-    dic[key] = report
-    state.data.append(dic)
-    logger.info("Report text copied to UI state")
+    with telemetry.span("wait_for_paste"):
+        report = wait_for_paste(state, 5)
+    state.record(key, report)
+    logger.info("Report text copied to UI state and journal")
     logger.debug(f"Copied report to UI state, text: { \
         re.sub(r'\s+', ' ', report.replace('\n', ' ').replace('\r', '')).strip() \
     }")
 
+def toggle_report_version(state: UiState, row: ScreenPoint, row_bounds: tuple[int, int, int, int], checkrow_bounds: list[tuple[int, int, int, int]], wait_for_text: bool, label: str) -> None:
+    """
+    Clicks a version checkbox row, then waits for the report text to repaint (or, when no new text
+    is expected, only for the checkbox to flip) instead of sleeping a fixed 3 seconds
+    """
+    neutral_click_zone = NEUTRAL_CLICK_ZONE.to_absolute(state.top_left)
+    if wait_for_text:
+        # The checkboxes flip immediately, only a change elsewhere in the window is the new text
+        region = "report_window"
+        predicate = changed(capture_region(state, region), ignore=checkrow_bounds)
+    else:
+        region = row_bounds
+        predicate = changed(capture_region(state, region))
+
+    state.mouse.move(row[0]+5, row[1]+10)
+    state.mouse.click()
+    state.mouse.move(*neutral_click_zone)
+    wait_until(state, WaitCondition(
+        name=label, predicate=predicate, region=region, timeout=3, legacy_delay=3, settle=wait_for_text
+    ))
+
 def copy_one_report(state: UiState) -> None:
     # rtl, w, h = locate_report_top_left(state)
     # highlight_start_point = locate_highlight_start_point(state)
@@ -214,168 +223,309 @@ def copy_one_report(state: UiState) -> None:
     hsp = HIGHLIGHT_START_POINT.to_absolute(state.top_left)
     highlight_start_point = (hsp.x, hsp.y)
 
-    checkrow_locations = locate_checkrows(state)
+    with telemetry.span("locate_checkrows"):
+        checkrow_locations = locate_checkrows(state)
     attending_row = checkrow_locations[0]
     resident_row = checkrow_locations[1]
+    checkrow = state.templates["version_checkrow"]
+    checkrow_bounds = [
+        (*screen_to_array(state.current_monitor, row), checkrow.width, checkrow.height) for row in checkrow_locations
+    ]
+    attending_bounds, resident_bounds = checkrow_bounds
 
     # Click off the attending row to get resident report
-    mouse.move(attending_row[0]+5, attending_row[1]+10)
-    mouse.click()
-    mouse.move(*neutral_click_zone)
-    time.sleep(3)
+    with telemetry.span("toggle_report_version"):
+        toggle_report_version(state, attending_row, attending_bounds, checkrow_bounds, True, "resident text shown")
 
     # Highlight the report
-    highlight_report(state, highlight_start_point, rtl, w, h)
+    with telemetry.span("highlight_report"):
+        highlight_report(state, highlight_start_point, rtl, w, h)
     copy_and_save("resident", state)
 
     # Get attending report
-    mouse.move(resident_row[0]+5, resident_row[1]+10)
-    mouse.click()
-    mouse.move(*neutral_click_zone)
-    time.sleep(3)
-
-    mouse.move(attending_row[0]+5, attending_row[1]+10)
-    mouse.click()
-    mouse.move(*neutral_click_zone)
-    time.sleep(3)
+    with telemetry.span("toggle_report_version"):
+        toggle_report_version(state, resident_row, resident_bounds, checkrow_bounds, False, "resident unchecked")
+    with telemetry.span("toggle_report_version"):
+        toggle_report_version(state, attending_row, attending_bounds, checkrow_bounds, True, "attending text shown")
 
     # Highlight new report
-    highlight_report(state, highlight_start_point, rtl, w, h)
+    with telemetry.span("highlight_report"):
+        highlight_report(state, highlight_start_point, rtl, w, h)
     copy_and_save("attending", state)
 
-    # Close report
-    logger.info("Closing report")
-    mouse.click()  # bring back focus to the report interface
-    keyboard.send('alt+f4')
-    state.refresh()
+    # Close report, the next report's triage must not see this window still open
+    with telemetry.span("close_report"):
+        close_report_window(state)
 
-def scroll_check(state: UiState) -> bool:
+def scroll_check(state: UiState) -> ScrollOffset:
     """
-    Returns True if scroll was executed
+    Pages down and returns how far the worklist scrolled, zero if we are at the bottom
     """
     logger.info("Checking if scrollable (are we at bottom of window?)")
-    state.refresh()
-    before_scroll = state.screen  # Save for comparison
-    keyboard.send("page down")
-    time.sleep(2)
-    state.refresh()
-    after_scroll = state.screen
-    result = not compare_screens(before_scroll, after_scroll)
-    logger.info(f"Interface scrollable: {result}")
-    return result
+    offset = scroll_page_down(state)
+    logger.info(f"Interface scrollable: {offset.moved}, moved {offset.pixels}px")
+    return offset
 
-def copy_screen(iteration: int, second_screen: bool, state: UiState) -> None:
+def copy_screen(iteration: int, second_screen: bool, state: UiState) -> str:
     """
-    Copies all text on screen for potential later matching to report output
+    Copies the worklist grid text, saves it for later matching to report output and returns it
     """
     neutral_click_zone = NEUTRAL_CLICK_ZONE.to_absolute(state.top_left)
     logger.info("Copying screen grid")
-    mouse.move(*neutral_click_zone)
-    mouse.click()
-    time.sleep(0.2)
-    keyboard.send("ctrl+a")
-    time.sleep(0.5)
-
-    pyperclip.copy("")
-    keyboard.send("ctrl+c")
-    screen_text = pyperclip.paste()
+    before_click = capture_region(state, "scroll")
+    state.mouse.move(*neutral_click_zone)
+    state.mouse.click()
+    wait_until(state, WaitCondition(
+        name="grid focus", predicate=changed(before_click), region="scroll", timeout=0.2, legacy_delay=0.2
+    ))
+    before_select = capture_region(state, "scroll")
+    state.keyboard.send("ctrl+a")
+    wait_until(state, WaitCondition(
+        name="grid select all", predicate=changed(before_select), region="scroll",
+        timeout=0.5, legacy_delay=0.5, settle=True
+    ))
+
+    state.clipboard.copy("")
+    state.keyboard.send("ctrl+c")
+    screen_text = state.clipboard.paste()
 
     filename = f"screenpaste_{iteration}{'_part2' if second_screen else ''}.txt"
     with open(Path("screen_text_grid") / Path(filename), "w") as fp:
         fp.write(screen_text)
 
-    mouse.click()
-    time.sleep(0.5)
+    before_deselect = capture_region(state, "scroll")
+    state.mouse.click()
+    wait_until(state, WaitCondition(
+        name="grid deselect", predicate=changed(before_deselect), region="scroll", timeout=0.5, legacy_delay=0.5
+    ))
+    return screen_text
+
+
+def row_origin(state: UiState, button_locs: np.ndarray) -> int | None:
+    """
+    Screen y of the first row's score button with the worklist at the top. Rows start at the top
+    of the scroll area and are WORKLIST_ROW_HEIGHT apart, so only the buttons' offset within
+    their row is measured; a button missed on the first row cannot shift every row by one.
+    """
+    if not len(button_locs):
+        return None
+    grid_top = state.scroll_bounds[1]
+    offsets = (button_locs[:, 1].astype(int) - grid_top) % WORKLIST_ROW_HEIGHT
+    return grid_top + int(np.median(offsets))
 
 
-def run():
+def reports_to_open(
+    state: UiState, grid_text: str, button_locs: np.ndarray, scrolled: bool
+) -> list[tuple[WorklistRow | None, ScreenPoint]]:
+    """
+    Pairs the score buttons on screen with their worklist rows and keeps only the rows not yet
+    opened this run. Rows are found from each button's height and the measured scroll offset;
+    if a scroll could not be measured the view is assumed aligned to the bottom of the list.
+    Falls back to the last six buttons, with no rows, if the grid text could not be parsed.
+    """
+    if not scrolled:
+        state.scroll_px = 0
+        state.row_origin_y = row_origin(state, button_locs)
+
+    try:
+        rows = parse_worklist(grid_text)
+    except ValueError as e:
+        logger.error(f"Could not parse worklist grid text, check worklist.COLUMNS against the grid: {e}")
+        rows = []
+
+    if not rows:
+        logger.warning("No worklist rows parsed, guessing new rows from button positions")
+        return [(None, loc) for loc in (button_locs[-6:] if scrolled else button_locs)]
+
+    new_rows = state.worklist.update(rows)
+    if state.row_origin_y is not None and state.scroll_px is not None:
+        assignments = state.worklist.assign_by_position(rows, button_locs, state.row_origin_y - state.scroll_px)
+    else:
+        assignments = state.worklist.assign(rows, button_locs, first_visible=-1 if scrolled else 0)
+    unopened = state.worklist.unopened(assignments)
+    logger.info(
+        f"Worklist has {len(rows)} rows ({new_rows} new), {len(assignments)} visible, {len(unopened)} not yet opened"
+    )
+    return unopened
+
+
+def run(resume: bool = False, ui_state: UiState | None = None):
     """
     Main function to run the automation tasks.
+
+    Args:
+        resume (bool): Continue from the existing capture journal, skipping every report it
+            already holds a resident/attending pair for, instead of starting a new journal.
+        ui_state (UiState | None): State to drive, e.g. one wired to the simulator. By default
+            the live monitor and input devices are used.
     """
     debug_iter = False
 
-    ui_state = UiState()
-    next_button = "template/next_button.png"
-    no_further_scrolling = False
-    second_iteration_on_page = False
-    next_button_flag = True
-    screen_counter = 0
-    neutral_click_zone = NEUTRAL_CLICK_ZONE.to_absolute(ui_state.top_left)
-
-    while True:
-        logger.info("Start of iteration, finding report buttons on screen")
-        button_locs = locate_score_button(ui_state)
-        copy_screen(screen_counter, second_iteration_on_page, ui_state)
-
-        if second_iteration_on_page:
-            logger.info("Starting iteration after page down, getting only last 5 rows")
-            button_locs = button_locs[-6:]
+    ui_state = ui_state if ui_state is not None else UiState()
+    ui_state.journal = CaptureJournal(resume=resume)
+    vision_profile.start()
+    grabber_fps = os.getenv("FRAME_GRABBER_FPS")
+    if grabber_fps:
+        ui_state.start_grabber(fps=float(grabber_fps))
+    # Diff captured pairs in the background while the GUI loop runs, POSTPROCESS_WORKERS=0 defers it to the end
+    postprocess_workers = int(os.getenv("POSTPROCESS_WORKERS", "2"))
+    # DOCX_CHUNK_SIZE=n writes the comparison as it goes, into documents of at most n pairs
+    docx_chunk_size = int(os.getenv("DOCX_CHUNK_SIZE", "0"))
+    writer = None
+    pair_diffs = None
+    try:
+        if postprocess_workers > 0:
+            if docx_chunk_size > 0:
+                writer = StreamingDocumentWriter(chunk_size=docx_chunk_size)
+            ui_state.postprocessor = PostProcessor(workers=postprocess_workers, sink=writer.add if writer else None)
+            for resident, attending in ui_state.journal.resumed_pairs:
+                ui_state.postprocessor.submit(resident.text, attending.text)
+        next_button = ui_state.templates["next_button"]
+        no_further_scrolling = False
+        second_iteration_on_page = False
+        next_button_flag = True
+        neutral_click_zone = NEUTRAL_CLICK_ZONE.to_absolute(ui_state.top_left)
+        page_ordinal = 0
+
+        while True:
+            logger.info("Start of iteration, finding report buttons on screen")
+            with telemetry.span("locate_score_button"):
+                buttons = locate_score_button(ui_state)
+            button_locs = buttons[:, :2]
+            button_sizes = {(x, y): (w, h) for x, y, w, h in buttons.tolist()}
+            with telemetry.span("copy_screen"):
+                grid_text = copy_screen(ui_state.page, second_iteration_on_page, ui_state)
+            targets = reports_to_open(ui_state, grid_text, button_locs, scrolled=second_iteration_on_page)
             second_iteration_on_page = False
 
-        if debug_iter:
-            button_locs = button_locs[-1:]
-            debug_iter = False
-
-        for loc in button_locs:
-            try:
-                open_report(loc, ui_state)
-            except Exception as e:
-                logger.error(f"Error processing report corresponding to button at {loc}: {e}")
-                continue
-            try:
-                wait_for_report_load(ui_state)
-                copy_one_report(ui_state)
-            except Exception as e:
-                logger.error(f"Error processing report corresponding to button at {loc}: {e}")
-                logger.info("Closing report")
-                mouse.move(*neutral_click_zone)
-                mouse.click()  # bring back focus to the report interface
-                keyboard.send('alt+f4')
+            if debug_iter:
+                targets = targets[-1:]
+                debug_iter = False
+
+            for row, loc in targets:
+                ui_state.current_row = row
+                ui_state.page_ordinal = page_ordinal
+                page_ordinal += 1
+                if row is not None:
+                    ui_state.worklist.mark_opened(row)
+                accession = row.accession if row is not None else None
+                if ui_state.journal.is_completed(ui_state.page, ui_state.page_ordinal, accession):
+                    logger.info(f"Skipping report {accession or ui_state.page_ordinal} on page {ui_state.page}, already captured in journal")
+                    continue
+
+                telemetry.start_report(accession, ui_state.page, ui_state.page_ordinal)
+                try:
+                    with telemetry.span("open_report"):
+                        open_report(loc, ui_state, button_sizes.get((int(loc[0]), int(loc[1]))))
+                    with telemetry.span("triage_report"):
+                        triage = triage_report(ui_state)
+                except Exception as e:
+                    logger.error(f"Error processing report corresponding to button at {loc}: {e}")
+                    telemetry.finish_report("open failed")
+                    continue
+                triage_ledger.record(accession, triage)
+                if triage.route != CAPTURE:
+                    logger.warning(f"Report {accession or ui_state.page_ordinal} on page {ui_state.page}: {triage.route} ({triage.reason})")
+                    with telemetry.span("recover" if triage.route != SKIP else "close_report"):
+                        if triage.route == SKIP:
+                            close_report_window(ui_state)
+                        else:
+                            recover_report(ui_state, triage)
+                    telemetry.finish_report(f"{triage.route}: {triage.reason}")
+                    continue
+                try:
+                    copy_one_report(ui_state)
+                except Exception as e:
+                    logger.error(f"Error processing report corresponding to button at {loc}: {e}")
+                    logger.info("Closing report")
+                    with telemetry.span("recover"):
+                        close_report_window(ui_state)
+                    telemetry.finish_report("failed")
+                    continue
+                telemetry.finish_report()
+                # Rows already seen but not opened, rows further down the worklist are not known yet
+                logger.info(telemetry.progress(len(ui_state.worklist.rows) - len(ui_state.worklist.opened)))
+            ui_state.current_row = None
+
+            with telemetry.span("page_pause"):
                 time.sleep(2)
-                ui_state.refresh()
-                continue
 
-        logger.info("Writing data to JSON output")
-        ui_state.save()
-        time.sleep(2)
-
-        ## Checks
-        # If we cannot scroll down then we are at the bottom
-        if not scroll_check(ui_state):
-            no_further_scrolling = True
-        else:
-            second_iteration_on_page = True
-
-        if no_further_scrolling:
-            logger.info("Hit bottom of screen and iteration concluded. Finding 'Next' button")
-            nxb_arrtl = find_first_match(ui_state.screen, next_button, threshold=0.9)
-            if nxb_arrtl is None:
-                logger.info("Next button was not found. This is the final screen. Exiting application.")
-                break
-            logger.info("Next button found, clicking and waiting for UI update")
-            nxb_sctl = array_to_screen(ui_state.current_monitor, nxb_arrtl)
-            mouse.move(nxb_sctl[0]+3, nxb_sctl[1]+3)
-            time.sleep(1)  # wait for highlight off row to fade
-            ui_state.refresh()
-            old_screen = ui_state.screen
-            mouse.click()
-
-            # Continue to wait until new page loads
-            logger.info("Waiting for UI update")
-            while True:
-                time.sleep(1)
-                ui_state.refresh()
-                new_screen = ui_state.screen
-                if not compare_screens(old_screen, new_screen, tolerance=0.99):
-                    logger.info("UI successfully updated, scrolling to top of page")
+            ## Checks
+            # If we cannot scroll down then we are at the bottom
+            with telemetry.span("scroll_check"):
+                offset = scroll_check(ui_state)
+            if not offset.moved:
+                no_further_scrolling = True
+            else:
+                second_iteration_on_page = True
+                if offset.pixels is None or ui_state.scroll_px is None:
+                    ui_state.scroll_px = None
+                else:
+                    ui_state.scroll_px += offset.pixels
+
+            if no_further_scrolling:
+                logger.info("Hit bottom of screen and iteration concluded. Finding 'Next' button")
+                nxb_arrtl = find_first_match(ui_state.frame, next_button, threshold=0.9)
+                if nxb_arrtl is None:
+                    logger.info("Next button was not found. This is the final screen. Exiting application.")
                     break
-
-            mouse.move(*neutral_click_zone)
-            time.sleep(0.5)
-            mouse.click()
-            # Keep hitting page up until we hit top of screen and nothing changes
-            validate_state(ui_state, lambda: keyboard.send("page up"), isChanged=False)
-            no_further_scrolling = False
-
-    logger.info("Writing to word doc: report_comparisons.docx")
-    generate_diff_doc()
\ No newline at end of file
+                logger.info("Next button found, clicking and waiting for UI update")
+                nxb_sctl = array_to_screen(ui_state.current_monitor, nxb_arrtl)
+                ui_state.mouse.move(nxb_sctl[0]+3, nxb_sctl[1]+3)
+
+                # Continue to wait until new page loads
+                logger.info("Waiting for UI update")
+                try:
+                    with telemetry.span("turn_page"):
+                        turn_page(ui_state, ui_state.mouse.click)
+                except TimeoutError as e:
+                    logger.error(f"Next page never loaded, stopping: {e}")
+                    break
+                logger.info("UI successfully updated, scrolling to top of page")
+
+                with telemetry.span("jump_to_top"):
+                    ui_state.mouse.move(*neutral_click_zone)
+                    ui_state.mouse.click()
+                    if not jump_to_top(ui_state):
+                        logger.warning("ctrl+home did not reach the top of the list, falling back to page up")
+                        validate_state(ui_state, lambda: ui_state.keyboard.send("page up"), isChanged=False)
+                no_further_scrolling = False
+                ui_state.page += 1
+                page_ordinal = 0
+
+        logger.info("Writing data to report_data.pkl")
+        ui_state.save()
+        if ui_state.postprocessor is not None:
+            logger.info(f"Waiting for {ui_state.postprocessor.pending} report pairs still being post-processed")
+            ui_state.postprocessor.finish()
+            if writer is None:
+                pair_diffs = ui_state.postprocessor.results()
+    finally:
+        ui_state.close()
+        if writer is not None:
+            writer.close()
+        logger.info(f"UI settle timings (s): {settle_stats.summary()}")
+        logger.info(f"Condition waits saved {wait_ledger.total_saved:.1f}s over fixed sleeps: {wait_ledger.summary()}")
+        logger.info(f"Phase timings (s): {telemetry.summary()}")
+        logger.info(f"Report triage: {triage_ledger.summary()}")
+        if triage_ledger.accessions(SKIP):
+            logger.info(f"Skipped {len(triage_ledger.accessions(SKIP))} addendum reports: {triage_ledger.accessions(SKIP)}")
+        # TELEMETRY_DIR picks where report_timings.json/.csv are written, the working directory by default
+        telemetry_dir = Path(os.getenv("TELEMETRY_DIR", "."))
+        telemetry_dir.mkdir(parents=True, exist_ok=True)
+        telemetry.dump(telemetry_dir / "report_timings.json", telemetry_dir / "report_timings.csv")
+        logger.info(f"Wrote timings of {len(telemetry.reports)} reports to {telemetry_dir / 'report_timings.json'} and .csv")
+        if vision_profile.enabled:
+            reports = len(telemetry.reports)
+            logger.info(f"Vision cost per template/region over {reports} reports: {vision_profile.summary(reports)}")
+            logger.info(f"Vision cost per call site over {reports} reports: {vision_profile.site_summary(reports)}")
+            with open(telemetry_dir / "vision_profile.json", "w") as f:
+                json.dump({"by_key": vision_profile.summary(reports), "by_site": vision_profile.site_summary(reports)}, f, indent=2)
+        folded = vision_profile.stop(telemetry_dir / "vision_profile.folded")
+        if folded is not None:
+            logger.info(f"Wrote sampled stacks to {folded}, view with flamegraph.pl or speedscope")
+    if writer is not None:
+        logger.info(f"Wrote {writer.count} report pairs to {[str(path) for path in writer.paths]}")
+    else:
+        logger.info("Writing to word doc: report_comparisons.docx")
+        generate_diff_doc(pair_diffs, chunk_size=docx_chunk_size or None)
\ No newline at end of file
@@ -0,0 +1,403 @@
+"""
+benchmark.py
+Micro-benchmarks for the automation hot paths, run offline against the mock/ screenshots.
+
+Usage (from the repository root):
+    python src/benchmark.py peaks
+    python src/benchmark.py diff
+    python src/benchmark.py diff_scaling --pairs 2000 --max-workers 8
+    python src/benchmark.py sections
+    python src/benchmark.py diff_cache --pairs 2000
+    python src/benchmark.py docx_writer --pairs 2000
+    python src/benchmark.py pipeline --sizes 10,100,1000,10000 --edit-rate 0.2
+    python src/benchmark.py all --repeat 5
+"""
+
+import argparse
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import cv2
+import numpy as np
+
+from change import detect_changes
+from constants import FRAME_ROIS
+from corpus import CorpusConfig, generate_corpus
+from diff_cache import DiffCache
+from diff import (
+    assemble_document, diff_pairs, improve_diff_quality, parse_one_json_item, preprocess_json, write_document
+)
+from sections import KEYS
+from frame import Frame
+from ooxml import write_ooxml_document
+from templates import TemplateRegistry
+from util import compare_screens, find_peaks, match_template
+
+MOCK_SCREENSHOTS = [
+    "mock/sectra_reportlist.png",
+    "mock/sectra_scrollarea.png",
+]
+
+
+def load_mock(path: str) -> np.ndarray:
+    """Loads a mock screenshot as BGR, the same layout UiState.screen has."""
+    image = cv2.imread(path)
+    if image is None:
+        raise ValueError(f"Mock screenshot {path} could not be read")
+    return image
+
+
+def time_call(fn: Callable[[], object], repeat=20) -> dict[str, float]:
+    """Runs `fn` once to warm up then `repeat` times, returning timings in milliseconds."""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(timings), "min_ms": min(timings)}
+
+
+def report(name: str, baseline: dict[str, float], candidate: dict[str, float]) -> None:
+    speedup = baseline["median_ms"] / candidate["median_ms"]
+    print(
+        f"{name:<40} baseline {baseline['median_ms']:8.2f} ms | "
+        f"new {candidate['median_ms']:8.2f} ms | x{speedup:.1f}"
+    )
+
+
+def _argsort_top_k(result: np.ndarray, k: int) -> list[tuple[int, int]]:
+    """The original find_top_k_matches selection, kept as the benchmark baseline."""
+    flat_indices = np.argsort(result.flatten())[-k:]
+    rows, cols = np.unravel_index(flat_indices, result.shape)
+    return list(zip(cols, rows))
+
+
+def bench_peaks(args: argparse.Namespace) -> None:
+    templates = TemplateRegistry.load()
+    for path in MOCK_SCREENSHOTS:
+        gray = cv2.cvtColor(load_mock(path), cv2.COLOR_BGR2GRAY)
+        for name in ("version_checkrow", "score_button"):
+            result = match_template(gray, templates[name])
+            for k in (2, 15):
+                baseline = time_call(lambda: _argsort_top_k(result, k), args.repeat)
+                candidate = time_call(lambda: find_peaks(result, k, min_distance=10), args.repeat)
+                report(f"{path.split('/')[-1]} {name} k={k}", baseline, candidate)
+
+                old_points = _argsort_top_k(result, k)
+                distinct = len({(x // 10, y // 10) for x, y in old_points})
+                print(f"{'':<40} argsort distinct peaks {distinct}/{k}, find_peaks {len(find_peaks(result, k, min_distance=10))}/{k}")
+
+
+def _elementwise_compare_screens(arr1, arr2, tolerance=0.9) -> bool:
+    """The original compare_screens, kept as the benchmark baseline."""
+    arr1_int = arr1.astype(int)
+    arr2_int = arr2.astype(int)
+    matches = (arr1_int == arr2_int).sum()
+    return (matches / arr1_int.size) >= tolerance
+
+
+def bench_changes(args: argparse.Namespace) -> None:
+    screen = load_mock("mock/sectra_reportlist.png")
+    caret = screen.copy()
+    caret[600:616, 900:902] = 255  # a blinking caret sized change
+    scrolled = np.roll(screen, -55, axis=0)  # one worklist row further down
+
+    cases = {
+        "identical tol=1.0": (screen, screen.copy(), 1.0),
+        "caret tol=1.0": (screen, caret, 1.0),
+        "scrolled tol=0.99": (screen, scrolled, 0.99),
+        "scrolled tol=0.9": (screen, scrolled, 0.9),
+    }
+    for name, (a, b, tolerance) in cases.items():
+        frame_a, frame_b = Frame.from_bgr(a), Frame.from_bgr(b)
+        baseline = time_call(lambda: _elementwise_compare_screens(a, b, tolerance), args.repeat)
+        # Fresh frames per call so the cached grayscale conversion is included in the timing
+        candidate = time_call(
+            lambda: compare_screens(Frame(frame_a.raw), Frame(frame_b.raw), tolerance), args.repeat
+        )
+        report(name, baseline, candidate)
+        print(
+            f"{'':<40} baseline says same={_elementwise_compare_screens(a, b, tolerance)}, "
+            f"new says same={compare_screens(frame_a, frame_b, tolerance)}"
+        )
+
+    frame_a, frame_b = Frame.from_bgr(screen), Frame.from_bgr(scrolled)
+    roi = FRAME_ROIS["scroll"]
+    candidate = time_call(lambda: detect_changes(Frame(frame_a.raw), Frame(frame_b.raw), roi=roi), args.repeat)
+    print(f"{'scroll roi full report':<40} new {candidate['median_ms']:8.2f} ms")
+
+
+FINDINGS_SENTENCES = [
+    "No acute intracranial hemorrhage, mass effect or midline shift.",
+    "The ventricles and sulci are normal in size and configuration.",
+    "There is mild periventricular white matter hypoattenuation, likely chronic small vessel ischemic change.",
+    "The visualized paranasal sinuses and mastoid air cells are clear.",
+    "No suspicious pulmonary nodule or mass.",
+    "The heart is normal in size. No pericardial effusion.",
+    "Stable 4 mm nodule in the right lower lobe.",
+    "No pleural effusion or pneumothorax.",
+    "The liver, spleen, pancreas and adrenal glands are unremarkable.",
+    "No hydronephrosis. No renal calculi.",
+    "Degenerative changes of the lower lumbar spine.",
+    "No free fluid or free air.",
+]
+
+
+def _findings_pair(sentences: int, edits: int, seed: int) -> tuple[str, str]:
+    """Long, repetitive resident FINDINGS and an attending version with a few sentence and word edits"""
+    rng = random.Random(seed)
+    resident = [rng.choice(FINDINGS_SENTENCES) for _ in range(sentences)]
+    attending = list(resident)
+    for _ in range(edits):
+        index = rng.randrange(len(attending))
+        action = rng.choice(("delete", "insert", "reword"))
+        if action == "delete":
+            attending.pop(index)
+        elif action == "insert":
+            attending.insert(index, rng.choice(FINDINGS_SENTENCES))
+        else:
+            words = attending[index].split()
+            words[rng.randrange(len(words))] = rng.choice(("mild", "moderate", "small", "unchanged"))
+            attending[index] = " ".join(words)
+    return " ".join(resident), " ".join(attending)
+
+
+def _changed_chars(result: list[tuple[str, str]]) -> int:
+    return sum(len(text) for text, kind in result if kind != "normal")
+
+
+def bench_diff(args: argparse.Namespace) -> None:
+    for sentences, edits in ((20, 3), (100, 10), (400, 30)):
+        resident, attending = _findings_pair(sentences, edits, seed=sentences)
+        baseline = time_call(lambda: improve_diff_quality(resident, attending, engine="difflib"), args.repeat)
+        candidate = time_call(lambda: improve_diff_quality(resident, attending, engine="myers"), args.repeat)
+        report(f"findings {sentences} sentences {edits} edits", baseline, candidate)
+
+        old = improve_diff_quality(resident, attending, engine="difflib")
+        new = improve_diff_quality(resident, attending, engine="myers")
+        print(
+            f"{'':<40} changed chars difflib {_changed_chars(old)}, myers {_changed_chars(new)}, "
+            f"identical output {old == new}"
+        )
+
+
+def _report_text(findings: str, impression: str, accession: int) -> str:
+    return (
+        f"STUDY: CT CHEST ABDOMEN PELVIS W IV CONTRAST INDICATION: staging "
+        f"ACCESSION NUMBER(S): {accession} TECHNIQUE: Axial images were obtained. "
+        f"FINDINGS: {findings} IMPRESSION: {impression}"
+    )
+
+
+def _synthetic_batch(pairs: int) -> list:
+    """Parsed [resident, attending] pairs with FINDINGS of realistic length, as preprocess_json returns them"""
+    raw = []
+    for index in range(pairs):
+        resident, attending = _findings_pair(40, 4, seed=index)
+        raw.append({"resident": _report_text(resident, "No acute findings.", index)})
+        raw.append({"attending": _report_text(attending, "No acute abnormality.", index)})
+    return preprocess_json(raw)
+
+
+def bench_diff_scaling(args: argparse.Namespace) -> None:
+    data = _synthetic_batch(args.pairs)
+    max_workers = args.max_workers or os.cpu_count() or 1
+    workers = sorted({1, *(2 ** i for i in range(1, max_workers.bit_length()) if 2 ** i <= max_workers), max_workers})
+    serial = None
+    for count in workers:
+        timing = time_call(lambda: diff_pairs(data, workers=count, chunk_size=args.chunk_size), max(args.repeat // 5, 1))
+        serial = serial or timing
+        print(
+            f"{f'{args.pairs} pairs, {count} workers':<40} {timing['median_ms']:9.1f} ms | "
+            f"x{serial['median_ms'] / timing['median_ms']:.2f} vs 1 worker"
+        )
+
+
+def _legacy_parse_one_json_item(json_item):
+    """The original parse_one_json_item, kept as the benchmark baseline."""
+    output = {}
+    res_or_attending_key = list(json_item.keys())[0]
+
+    text = json_item[res_or_attending_key]
+    text = text.replace('\\r\\n', '\n').replace('\\n', '\n')
+    text = text.replace('[', '').replace(']', '')
+    # Remove excessive newlines
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    # Clean up whitespace
+    # text = text.replace('.', '. ')
+    text = re.sub(r'([a-zA-Z]):([a-zA-Z])', r'\1: \2', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = text.strip()
+
+    relkeys = [key for key in KEYS if key in text]
+    for idx, key in enumerate(relkeys):
+        end_report_section_idx = text.index(relkeys[idx + 1]) if idx < len(relkeys)-1 else len(text)
+        try:
+            report_section = text[text.index(key) + len(key):end_report_section_idx].strip(": ").strip()
+            output[key] = report_section
+        except ValueError:
+            output[key] = ""
+
+    # Process the findings section into subsections based on the anatomy in particular
+    findings_sections = re.split(r"([A-Z][A-Z\s]{2,}:)", output["FINDINGS"])
+    findings_dict = {}
+    current_subsection_header = None
+
+    for subsection in findings_sections:  # skip first element which will be 'FINDINGS'
+        # Case where the element is a header
+        if re.match(r"^[A-Z][A-Z\s]+:$", subsection):
+            current_subsection_header = subsection.strip(": ").upper()
+            continue
+        # Case where the element is some content belonging to a header
+        if current_subsection_header is not None:
+            findings_dict[current_subsection_header] = subsection.strip(": ").replace("\n", " ").strip()
+            continue
+        # Case where the text is the first text preceding any of the section headers
+        findings_dict["GENERAL"] = subsection.strip(": ").replace("\n", " ").strip()
+
+    output["FINDINGS"] = findings_dict
+    return output
+
+
+def _raw_report(index: int) -> str:
+    """A well formed report as copied from the report window, with escaped newlines and [placeholders]"""
+    resident, _ = _findings_pair(30, 0, seed=index)
+    sentences = resident.split(". ")
+    findings = (
+        f"{'. '.join(sentences[:5])}.\\n\\nLUNGS: {'. '.join(sentences[5:15])}.\\r\\n"
+        f"HEART AND VESSELS:{'. '.join(sentences[15:22])}.\n\n\nBONES: [{'. '.join(sentences[22:])}]"
+    )
+    return (
+        f"STUDY: CT CHEST W IV CONTRAST\\nINDICATION: Cough, r/o pneumonia\\n"
+        f"COMPARISON: CT 1/2/2024\\nACCESSION NUMBER(S): {index}\\nORDERING CLINICIAN: Dr. Smith\\n"
+        f"TECHNIQUE: Axial images.\\nFINDINGS:{findings}\\nIMPRESSION:\\n1. No acute findings.\\n"
+        f"MACRO: none"
+    )
+
+
+def bench_sections(args: argparse.Namespace) -> None:
+    reports = [{"resident": _raw_report(index)} for index in range(200)]
+    baseline = time_call(lambda: [_legacy_parse_one_json_item(r) for r in reports], args.repeat)
+    candidate = time_call(lambda: [parse_one_json_item(r) for r in reports], args.repeat)
+    report(f"parse {len(reports)} reports", baseline, candidate)
+    print(
+        f"{'':<40} {len(reports) / baseline['median_ms'] * 1000:,.0f} -> "
+        f"{len(reports) / candidate['median_ms'] * 1000:,.0f} reports/s, identical output "
+        f"{all(_legacy_parse_one_json_item(r) == parse_one_json_item(r) for r in reports)}"
+    )
+
+
+def bench_diff_cache(args: argparse.Namespace) -> None:
+    """Regenerating after 20 new reports: full rediff against a warm cache"""
+    data = _synthetic_batch(args.pairs + 20)
+    old, new = data[: args.pairs], data
+    with tempfile.TemporaryDirectory() as directory:
+        with DiffCache(Path(directory) / "cache.sqlite") as cache:
+            diff_pairs(old, workers=1, cache=cache)
+
+        start = time.perf_counter()
+        uncached = diff_pairs(new, workers=1)
+        uncached_ms = (time.perf_counter() - start) * 1000
+
+        with DiffCache(Path(directory) / "cache.sqlite") as cache:
+            start = time.perf_counter()
+            cached = diff_pairs(new, workers=1, cache=cache)
+            cached_ms = (time.perf_counter() - start) * 1000
+            stats = cache.stats()
+
+    report(f"{args.pairs} cached + 20 new pairs", {"median_ms": uncached_ms}, {"median_ms": cached_ms})
+    print(f"{'':<40} hits {stats['hits']}, misses {stats['misses']}, identical output {cached == uncached}")
+
+
+def bench_docx_writer(args: argparse.Namespace) -> None:
+    pair_diffs = diff_pairs(_synthetic_batch(args.pairs), workers=1)
+    with tempfile.TemporaryDirectory() as directory:
+        output = Path(directory) / "report_comparisons.docx"
+        repeat = max(args.repeat // 5, 1)
+        baseline = time_call(lambda: assemble_document(pair_diffs, output), repeat)
+        candidate = time_call(lambda: write_ooxml_document(pair_diffs, output), repeat)
+    report(f"{args.pairs} pairs, python-docx -> ooxml", baseline, candidate)
+
+
+def _run_pipeline(data: list, output: Path, workers: int | None) -> dict[str, float]:
+    """generate_diff_doc's stages on an in-memory corpus, returning each stage's time in milliseconds"""
+    timings = {}
+    start = time.perf_counter()
+    pairs = preprocess_json(data)
+    timings["preprocess"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    pair_diffs = diff_pairs(pairs, workers=workers)
+    timings["diff"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    write_document(pair_diffs, output)
+    timings["write"] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def bench_pipeline(args: argparse.Namespace) -> None:
+    """
+    Full diff document pipeline on generated corpora of each size. Peak memory is measured in a
+    second, traced run since tracemalloc slows allocation heavy code down. It only sees Python
+    allocations in this process, not diff workers or lxml's own document tree.
+    """
+    config = CorpusConfig(edit_rate=args.edit_rate)
+    print(f"{'pairs':>8} {'preprocess':>12} {'diff':>12} {'write':>12} {'total':>12} {'pairs/s':>9} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        output = Path(directory) / "report_comparisons.docx"
+        for size in (int(size) for size in args.sizes.split(",")):
+            data = generate_corpus(size, config, seed=size)
+            timings = _run_pipeline(data, output, args.max_workers)
+
+            tracemalloc.start()
+            _run_pipeline(data, output, args.max_workers)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            total = sum(timings.values())
+            print(
+                f"{size:>8} {timings['preprocess']:>9.1f} ms {timings['diff']:>9.1f} ms {timings['write']:>9.1f} ms "
+                f"{total:>9.1f} ms {size / total * 1000:>9,.0f} {peak / 2 ** 20:>9.1f}"
+            )
+
+
+BENCHMARKS = {
+    "peaks": bench_peaks,
+    "changes": bench_changes,
+    "diff": bench_diff,
+    "diff_scaling": bench_diff_scaling,
+    "sections": bench_sections,
+    "diff_cache": bench_diff_cache,
+    "docx_writer": bench_docx_writer,
+    "pipeline": bench_pipeline,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=[*BENCHMARKS, "all"])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--pairs", type=int, default=1000, help="synthetic report pairs for scaling benchmarks")
+    parser.add_argument("--max-workers", type=int, default=None, help="largest worker count, default all cores")
+    parser.add_argument("--chunk-size", type=int, default=16, help="report pairs per worker task")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="comma separated corpus sizes for pipeline")
+    parser.add_argument("--edit-rate", type=float, default=0.1, help="attending edit rate for generated corpora")
+    args = parser.parse_args()
+
+    names = list(BENCHMARKS) if args.benchmark == "all" else [args.benchmark]
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+capture.py
+Exposes CaptureSession which keeps a single capture backend open for the life of the run and
+grabs either the whole monitor or a named sub-rectangle of it as a Frame.
+"""
+
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+import cv2
+import numpy as np
+from mss import mss
+
+from constants import FRAME_ROIS
+from frame import Frame
+from profiling import region_key, vision_profile
+
+Bounds = tuple[int, int, int, int]
+
+
+class MssBackend:
+    """
+    Live screen capture through one long lived mss instance. mss keeps per-thread device
+    handles, so the backend must be used from the thread that created it.
+    """
+
+    def __init__(self):
+        self._sct = mss()
+
+    @property
+    def monitors(self) -> list[dict[str, int]]:
+        return self._sct.monitors
+
+    def grab(self, rect: dict[str, int]) -> np.ndarray:
+        """Returns a (height, width, 4) BGRA view over the screenshot buffer, no copy is made."""
+        screenshot = self._sct.grab(rect)
+        return np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(screenshot.height, screenshot.width, 4)
+
+    def close(self):
+        self._sct.close()
+
+
+class PngBackend:
+    """
+    Headless stand-in for MssBackend which serves screenshots loaded from PNG files. Every grab
+    returns the current image until `advance` moves on to the next one, the last image repeats.
+    """
+
+    def __init__(self, paths: list[str | Path], monitor: dict[str, int] | None = None):
+        self.images = []
+        for path in paths:
+            image = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+            if image is None:
+                raise ValueError(f"Fake capture image {path} could not be read")
+            if image.ndim == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+            elif image.shape[2] == 3:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+            self.images.append(image)
+        if not self.images:
+            raise ValueError("PngBackend needs at least one image")
+
+        height, width = self.images[0].shape[:2]
+        self.monitor = monitor or {"left": 0, "top": 0, "width": width, "height": height}
+        self.index = 0
+
+    @property
+    def monitors(self) -> list[dict[str, int]]:
+        return [self.monitor, self.monitor]
+
+    def advance(self, steps=1):
+        self.index = min(self.index + steps, len(self.images) - 1)
+
+    def grab(self, rect: dict[str, int]) -> np.ndarray:
+        x = rect["left"] - self.monitor["left"]
+        y = rect["top"] - self.monitor["top"]
+        return self.images[self.index][y : y + rect["height"], x : x + rect["width"]]
+
+    def close(self):
+        pass
+
+
+class CaptureSession:
+    """
+    Grabs frames from one monitor through a persistent backend, either the whole monitor or a
+    sub-rectangle given as a name from constants.FRAME_ROIS or an (x, y, width, height) tuple in
+    monitor array coordinates.
+    """
+
+    def __init__(self, monitor: dict[str, int], backend: MssBackend | PngBackend | None = None):
+        self.monitor = monitor
+        self.backend = backend or MssBackend()
+
+    @classmethod
+    def from_pngs(cls, paths: list[str | Path]) -> "CaptureSession":
+        backend = PngBackend(paths)
+        return cls(backend.monitor, backend)
+
+    def resolve(self, region: str | Bounds | None) -> Bounds:
+        if region is None:
+            return 0, 0, self.monitor["width"], self.monitor["height"]
+        if isinstance(region, str):
+            return FRAME_ROIS[region]
+        return region
+
+    def grab(self, region: str | Bounds | None = None) -> Frame:
+        x, y, w, h = self.resolve(region)
+        rect = {"left": self.monitor["left"] + x, "top": self.monitor["top"] + y, "width": w, "height": h}
+        timestamp = time.monotonic()
+        if not vision_profile.enabled:
+            return Frame(self.backend.grab(rect), x, y, timestamp)
+        with vision_profile.measure("capture", region_key(region)) as sample:
+            raw = self.backend.grab(rect)
+            sample.bytes, sample.pixels = raw.nbytes, w * h
+        return Frame(raw, x, y, timestamp)
+
+    def close(self):
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameGrabber:
+    """
+    Opt-in background thread which captures the monitor at a fixed rate into a preallocated ring
+    buffer of timestamped frames. Wait loops block on "next frame after T" or "first frame
+    matching a predicate" instead of sleeping, so they react within one frame interval.
+
+    Capture writes straight into the ring slots, so no memory is allocated per captured frame.
+    wait_for runs its predicate on read-only views of the slots and only copies the frame it
+    returns; the ring gives the predicate `capacity` - 1 frame intervals before its slot is
+    reused, after which the check is discarded and later frames are checked on copies. latest and
+    wait_for_frame always return copies (one full frame, about 8 MB at 1080p), since the caller
+    may hold on to them indefinitely.
+    """
+
+    def __init__(
+        self,
+        monitor: dict[str, int],
+        backend_factory: Callable[[], MssBackend | PngBackend] = MssBackend,
+        fps=20.0,
+        capacity=8,
+    ):
+        self.monitor = monitor
+        self.interval = 1.0 / fps
+        self.capacity = capacity
+        self.error: BaseException | None = None
+
+        # The backend is created on the grabber thread since mss handles are per-thread
+        self._backend_factory = backend_factory
+        self._buffers = np.empty((capacity, monitor["height"], monitor["width"], 4), dtype=np.uint8)
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._count = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+
+    def start(self) -> "FrameGrabber":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def frames_captured(self) -> int:
+        return self._count
+
+    def _run(self):
+        rect = {k: self.monitor[k] for k in ("left", "top", "width", "height")}
+        backend = None
+        try:
+            backend = self._backend_factory()
+            while not self._stop.is_set():
+                start = time.monotonic()
+                if not vision_profile.enabled:
+                    raw = backend.grab(rect)
+                else:
+                    with vision_profile.measure("capture", "grabber") as sample:
+                        raw = backend.grab(rect)
+                        sample.bytes, sample.pixels = raw.nbytes, rect["width"] * rect["height"]
+                with self._cond:
+                    slot = self._count % self.capacity
+                    np.copyto(self._buffers[slot], raw)
+                    self._timestamps[slot] = start
+                    self._count += 1
+                    self._cond.notify_all()
+                self._stop.wait(max(0.0, self.interval - (time.monotonic() - start)))
+        except BaseException as e:
+            self.error = e
+        finally:
+            if backend is not None:
+                backend.close()
+            with self._cond:
+                self._cond.notify_all()
+
+    def _snapshot(self, generation: int) -> Frame:
+        """Copies out the frame of `generation`, caller must hold the lock."""
+        slot = generation % self.capacity
+        return Frame(self._buffers[slot].copy(), timestamp=float(self._timestamps[slot]))
+
+    def _view(self, generation: int) -> Frame:
+        """Read-only frame over the slot of `generation`, valid until _is_current says otherwise."""
+        slot = generation % self.capacity
+        raw = self._buffers[slot].view()
+        raw.flags.writeable = False
+        return Frame(raw, timestamp=float(self._timestamps[slot]))
+
+    def _is_current(self, generation: int) -> bool:
+        """Whether the slot of `generation` has not started being overwritten, caller must hold the lock."""
+        return self._count <= generation + self.capacity
+
+    def latest(self) -> Frame | None:
+        with self._cond:
+            return self._snapshot(self._count - 1) if self._count else None
+
+    def _wait_for_generation(self, after: float, timeout: float | None) -> int:
+        """Blocks until a frame captured after `after` is available, returns its generation. Caller must hold the lock."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self._count and self._timestamps[(self._count - 1) % self.capacity] >= after:
+                return self._count - 1
+            if self.error is not None or not self._thread.is_alive():
+                raise RuntimeError("Frame grabber is not running") from self.error
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"No frame captured within {timeout} seconds")
+            self._cond.wait(remaining)
+
+    def wait_for_frame(self, after: float, timeout: float | None = None) -> Frame:
+        """
+        Blocks until a frame whose capture started after `after` (a time.monotonic() value) is
+        available and returns a copy of it.
+
+        Raises:
+            TimeoutError: If no such frame arrives within `timeout` seconds.
+            RuntimeError: If the capture thread died.
+        """
+        with self._cond:
+            return self._snapshot(self._wait_for_generation(after, timeout))
+
+    def wait_for(
+        self, predicate: Callable[[Frame], bool], timeout: float | None = None, after: float | None = None
+    ) -> Frame:
+        """
+        Returns a copy of the first new frame for which `predicate` holds. Only the newest frame
+        is checked each time, so a slow predicate skips frames rather than falling further behind.
+
+        Raises:
+            TimeoutError: If no frame satisfies the predicate within `timeout` seconds.
+        """
+        after = time.monotonic() if after is None else after
+        deadline = None if timeout is None else time.monotonic() + timeout
+        copy = False
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"No frame satisfied the condition within {timeout} seconds")
+            with self._cond:
+                generation = self._wait_for_generation(after, remaining)
+                frame = self._snapshot(generation) if copy else self._view(generation)
+            if copy:
+                if predicate(frame):
+                    return frame
+            else:
+                matched = predicate(frame)
+                with self._cond:
+                    if not self._is_current(generation):
+                        # The slot was reused while the predicate ran, so its verdict may be about a mix
+                        # of two frames. A predicate this slow is run on a copy from now on.
+                        copy = True
+                        continue
+                    if matched:
+                        return self._snapshot(generation)
+            after = frame.timestamp + 1e-9
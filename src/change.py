@@ -0,0 +1,211 @@
+"""
+change.py
+Tile based change detection between two captures. Frames are fingerprinted as a grid of
+per-tile mean intensities, which is far cheaper than comparing every pixel of two full frames.
+"""
+
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from frame import Frame, to_gray
+from profiling import region_key, vision_profile
+
+Bounds = tuple[int, int, int, int]
+
+DEFAULT_TILE = 16
+
+
+@dataclass(frozen=True)
+class TileFingerprint:
+    """
+    Per-tile mean intensity of a grayscale region, can be kept as a cheap reference to compare
+    later frames against.
+
+    Attributes:
+        means (np.ndarray): (rows, cols) float32 grid of tile means.
+        tile (int): Tile edge length in pixels.
+        roi (Bounds | None): Region the fingerprint was taken from, None for the whole frame.
+    """
+    means: np.ndarray
+    tile: int
+    roi: Bounds | None = None
+
+
+@dataclass(frozen=True)
+class ChangeReport:
+    """
+    Result of comparing two captures tile by tile.
+
+    Attributes:
+        deltas (np.ndarray): (rows, cols) absolute difference of tile means, NaN for tiles that
+            were never compared because the comparison exited early.
+        changed (int): Number of tiles whose delta exceeded the threshold.
+        total (int): Number of tiles in the grid.
+        complete (bool): False if the comparison stopped early once the tolerance could no
+            longer be met.
+        tile (int): Tile edge length in pixels.
+    """
+    deltas: np.ndarray
+    changed: int
+    total: int
+    complete: bool
+    tile: int
+
+    @property
+    def unchanged_fraction(self) -> float:
+        """Fraction of unchanged tiles, an upper bound when the comparison exited early"""
+        return (self.total - self.changed) / self.total if self.total else 1.0
+
+    @property
+    def any_changed(self) -> bool:
+        return self.changed > 0
+
+    def changed_tiles(self, min_delta=0.0) -> list[tuple[int, int]]:
+        """(row, col) of every compared tile whose delta exceeds `min_delta`"""
+        rows, cols = np.nonzero(np.nan_to_num(self.deltas, nan=0.0) > min_delta)
+        return list(zip(rows.tolist(), cols.tolist()))
+
+
+def _region(screen: Frame | np.ndarray, roi: Bounds | None) -> np.ndarray:
+    if isinstance(screen, Frame):
+        return screen.gray if roi is None else screen.crop(roi)
+    gray = to_gray(screen)
+    if roi is None:
+        return gray
+    x, y, w, h = roi
+    return gray[y : y + h, x : x + w]
+
+
+def _edges(length: int, tile: int) -> np.ndarray:
+    """Tile boundaries along one axis, the last tile is partial if length is not a multiple"""
+    return np.append(np.arange(0, length, tile), length)
+
+
+def _band_means(band: np.ndarray, col_edges: np.ndarray) -> np.ndarray:
+    """Means of every tile in a band of rows, computed from a single integral image"""
+    integral = cv2.integral(band, sdepth=cv2.CV_32S)
+    sums = np.diff(integral[-1, col_edges]).astype(np.float32)
+    return sums / (band.shape[0] * np.diff(col_edges))
+
+
+def _ignored_tiles(
+    ignore: list[Bounds], origin: tuple[int, int], row_edges: np.ndarray, col_edges: np.ndarray, tile: int
+) -> np.ndarray:
+    """Boolean (rows, cols) grid of tiles overlapping any of the ignored regions"""
+    ignored = np.zeros((len(row_edges) - 1, len(col_edges) - 1), dtype=bool)
+    ox, oy = origin
+    for x, y, w, h in ignore:
+        r0, r1 = max((y - oy) // tile, 0), max(-(-(y + h - oy) // tile), 0)
+        c0, c1 = max((x - ox) // tile, 0), max(-(-(x + w - ox) // tile), 0)
+        ignored[r0:r1, c0:c1] = True
+    return ignored
+
+
+def fingerprint(screen: Frame | np.ndarray, tile=DEFAULT_TILE, roi: Bounds | None = None) -> TileFingerprint:
+    """Fingerprints `screen` (optionally only `roi`, in the frame's array coordinates)."""
+    gray = _region(screen, roi)
+    row_edges = _edges(gray.shape[0], tile)
+    col_edges = _edges(gray.shape[1], tile)
+    means = np.stack([_band_means(gray[y0:y1], col_edges) for y0, y1 in zip(row_edges[:-1], row_edges[1:])])
+    return TileFingerprint(means, tile, roi)
+
+
+def detect_changes(
+    reference: Frame | np.ndarray | TileFingerprint,
+    current: Frame | np.ndarray,
+    tolerance=0.0,
+    min_delta=0.0,
+    tile=DEFAULT_TILE,
+    roi: Bounds | None = None,
+    ignore: list[Bounds] | None = None,
+) -> ChangeReport:
+    """
+    Compares two captures tile by tile, one band of tile rows at a time.
+
+    Args:
+        reference (Frame | np.ndarray | TileFingerprint): Earlier capture or its fingerprint. A
+            fingerprint's own tile size and roi take precedence over `tile` and `roi`.
+        current (Frame | np.ndarray): Capture to compare against the reference.
+        tolerance (float): Fraction of tiles that must stay unchanged. Once more tiles have
+            changed than this allows, the comparison stops early. 0 always compares every tile.
+        min_delta (float): Mean intensity difference above which a tile counts as changed,
+            raise it to ignore antialiasing noise.
+        tile (int): Tile edge length in pixels.
+        roi (Bounds | None): (x, y, width, height) in array coordinates to restrict the comparison to.
+        ignore (list[Bounds] | None): Regions in array coordinates, such as a blinking caret or a
+            clock, whose tiles are left out of the comparison entirely.
+
+    Returns:
+        ChangeReport: Which tiles changed and by how much.
+    """
+    if not vision_profile.enabled:
+        return _detect_changes(reference, current, tolerance, min_delta, tile, roi, ignore)
+
+    region = reference.roi if isinstance(reference, TileFingerprint) else roi
+    height, width = (region[3], region[2]) if region is not None else current.shape[:2]
+    with vision_profile.measure("compare", region_key(region)) as sample:
+        report = _detect_changes(reference, current, tolerance, min_delta, tile, roi, ignore)
+        # Only the bands compared before an early exit were read, from both captures unless fingerprinted
+        bands = int(np.count_nonzero(~np.isnan(report.deltas[:, 0]))) if report.deltas.size else 0
+        sample.pixels = min(height, bands * report.tile) * width
+        sample.bytes = sample.pixels * (1 if isinstance(reference, TileFingerprint) else 2)
+    return report
+
+
+def _detect_changes(
+    reference: Frame | np.ndarray | TileFingerprint,
+    current: Frame | np.ndarray,
+    tolerance: float,
+    min_delta: float,
+    tile: int,
+    roi: Bounds | None,
+    ignore: list[Bounds] | None,
+) -> ChangeReport:
+    if isinstance(reference, TileFingerprint):
+        tile, roi = reference.tile, reference.roi
+        reference_gray = None
+    else:
+        reference_gray = _region(reference, roi)
+
+    current_gray = _region(current, roi)
+    if reference_gray is not None and reference_gray.shape != current_gray.shape:
+        raise ValueError(f"Cannot compare captures of shape {reference_gray.shape} and {current_gray.shape}")
+
+    row_edges = _edges(current_gray.shape[0], tile)
+    col_edges = _edges(current_gray.shape[1], tile)
+    rows, cols = len(row_edges) - 1, len(col_edges) - 1
+    if isinstance(reference, TileFingerprint) and reference.means.shape != (rows, cols):
+        raise ValueError(f"Fingerprint grid {reference.means.shape} does not match capture grid {(rows, cols)}")
+
+    ignored = None
+    if ignore:
+        if roi is not None:
+            origin = roi[:2]
+        elif isinstance(current, Frame):
+            origin = (current.left, current.top)
+        else:
+            origin = (0, 0)
+        ignored = _ignored_tiles(ignore, origin, row_edges, col_edges, tile)
+
+    total = rows * cols - (int(ignored.sum()) if ignored is not None else 0)
+    allowed = int(np.floor((1.0 - tolerance) * total + 1e-9))
+    deltas = np.full((rows, cols), np.nan, dtype=np.float32)
+    changed = 0
+
+    for r, (y0, y1) in enumerate(zip(row_edges[:-1], row_edges[1:])):
+        current_means = _band_means(current_gray[y0:y1], col_edges)
+        if reference_gray is None:
+            reference_means = reference.means[r]
+        else:
+            reference_means = _band_means(reference_gray[y0:y1], col_edges)
+
+        deltas[r] = np.abs(current_means - reference_means)
+        if ignored is not None:
+            deltas[r][ignored[r]] = 0.0
+        changed += int(np.count_nonzero(deltas[r] > min_delta))
+        if tolerance > 0 and changed > allowed:
+            return ChangeReport(deltas, changed, total, False, tile)
+
+    return ChangeReport(deltas, changed, total, True, tile)
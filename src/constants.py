@@ -6,6 +6,7 @@ EXPECTED_WIDTH = 1920
 SCROLL_BOUNDS_TOP_LEFT = RelativeCoordinate(x=14, y=210)
 SCROLL_BOUNDS_WIDTH = 1870
 SCROLL_BOUNDS_HEIGHT = 827
+WORKLIST_ROW_HEIGHT = 55
 
 HEADER_BOUNDS_TOP_LEFT = RelativeCoordinate(x=14, y=190)
 HEADER_BOUNDS_WIDTH = 1887
@@ -16,4 +17,13 @@ REPORT_WINDOW_WIDTH = 1002
 REPORT_WINDOW_HEIGHT = 827
 
 HIGHLIGHT_START_POINT = RelativeCoordinate(x=810, y=220)
-NEUTRAL_CLICK_ZONE = RelativeCoordinate(x=760, y=430)
\ No newline at end of file
+NEUTRAL_CLICK_ZONE = RelativeCoordinate(x=760, y=430)
+
+TEMPLATE_DIR = "template"
+
+# Named regions of interest in array coordinates (relative to the monitor's top-left corner)
+FRAME_ROIS = {
+    "scroll": (*SCROLL_BOUNDS_TOP_LEFT, SCROLL_BOUNDS_WIDTH, SCROLL_BOUNDS_HEIGHT),
+    "header": (*HEADER_BOUNDS_TOP_LEFT, HEADER_BOUNDS_WIDTH, HEADER_BOUNDS_HEIGHT),
+    "report_window": (*REPORT_WINDOW_TOP_LEFT, REPORT_WINDOW_WIDTH, REPORT_WINDOW_HEIGHT),
+}
@@ -0,0 +1,207 @@
+"""
+corpus.py
+Generates fake resident/attending report pairs in the [{"resident": text}, {"attending": text}, ...]
+shape UiState.data pickles, so the post-processing path can be exercised and benchmarked without
+real captures. Reports are written the way they come off the clipboard, with escaped newlines
+and [placeholders], and the attending version is the resident one with random sentence edits.
+
+Usage (from the repository root):
+    python src/corpus.py --pairs 1000
+
+The default output, synthetic_report_data.pkl, never overwrites a real capture. To feed the
+document generation, which reads report_data.pkl, pass --output report_data.pkl in a scratch
+directory.
+"""
+
+import argparse
+import pickle
+import random
+from dataclasses import dataclass
+
+# Always present, in the order the report window lists them
+REQUIRED_SECTIONS = ["STUDY", "INDICATION", "ACCESSION NUMBER(S)", "FINDINGS", "IMPRESSION"]
+
+OPTIONAL_SECTIONS = {
+    "COMPARISON": ["None.", "CT 1/2/2024.", "Radiograph from prior day.", "MRI 3/14/2023."],
+    "ORDERING CLINICIAN": ["Dr. Smith", "Dr. Patel", "Dr. Nguyen", "Dr. Garcia"],
+    "TECHNIQUE": [
+        "Axial images were obtained from the lung apices through the pubic symphysis.",
+        "Multiplanar multisequence images were obtained without contrast.",
+        "Axial images with coronal and sagittal reformats.",
+    ],
+    "MACRO": ["none", "CT ABDOMEN PELVIS", "CT CHEST"],
+}
+
+STUDIES = [
+    "CT CHEST ABDOMEN PELVIS W IV CONTRAST", "CT HEAD WO CONTRAST", "CT CHEST W IV CONTRAST",
+    "MRI BRAIN W WO CONTRAST", "CT ABDOMEN PELVIS WO CONTRAST", "CTA CHEST PE PROTOCOL",
+]
+
+INDICATIONS = [
+    "staging", "Cough, r/o pneumonia", "Abdominal pain", "Headache", "Trauma", "Shortness of breath",
+]
+
+# FINDINGS subsection headers and the sentences each is written from
+ANATOMY = {
+    "LUNGS": [
+        "No suspicious pulmonary nodule or mass.", "Stable 4 mm nodule in the right lower lobe.",
+        "Mild dependent atelectasis.", "No focal consolidation.", "[No] emphysema.",
+    ],
+    "PLEURA": ["No pleural effusion or pneumothorax.", "Small right pleural effusion.", "No pleural thickening."],
+    "HEART AND VESSELS": [
+        "The heart is normal in size. No pericardial effusion.", "Mild coronary artery calcifications.",
+        "The thoracic aorta is normal in caliber.",
+    ],
+    "LIVER": [
+        "The liver is normal in size and attenuation.", "Subcentimeter hypodensity, too small to characterize.",
+        "No intrahepatic biliary ductal dilatation.",
+    ],
+    "KIDNEYS": ["No hydronephrosis. No renal calculi.", "Simple cyst in the left kidney.", "Symmetric enhancement."],
+    "BOWEL": [
+        "No bowel obstruction.", "No free fluid or free air.", "Normal appendix.",
+        "Scattered colonic diverticula without diverticulitis.",
+    ],
+    "BRAIN": [
+        "No acute intracranial hemorrhage, mass effect or midline shift.",
+        "The ventricles and sulci are normal in size and configuration.",
+        "There is mild periventricular white matter hypoattenuation, likely chronic small vessel ischemic change.",
+    ],
+    "BONES": [
+        "Degenerative changes of the lower lumbar spine.", "No acute fracture.",
+        "No suspicious osseous lesion.", "[Mild] multilevel degenerative disc disease.",
+    ],
+}
+
+IMPRESSIONS = [
+    "No acute findings.", "No acute abnormality.", "Stable pulmonary nodule, no follow-up needed.",
+    "Small right pleural effusion.", "Findings concerning for pneumonia.", "No evidence of metastatic disease.",
+]
+
+# Words an attending swaps in when rewording a sentence
+REWORDS = ["mild", "moderate", "small", "unchanged", "minimal", "likely", "possibly", "new"]
+
+
+@dataclass(frozen=True)
+class CorpusConfig:
+    """
+    Attributes:
+        sections (int): Optional sections (COMPARISON, ORDERING CLINICIAN, ...) in each report.
+        subsections (int): FINDINGS anatomy subsections, 0 for a single free text paragraph.
+        sentences (int): Sentences per FINDINGS subsection, or in the paragraph, controlling report length.
+        impressions (int): Numbered IMPRESSION items.
+        edit_rate (float): Chance each resident sentence is deleted, reworded or has one inserted
+            after it in the attending version. 0 gives pairs with no corrections.
+    """
+    sections: int = 3
+    subsections: int = 5
+    sentences: int = 3
+    impressions: int = 2
+    edit_rate: float = 0.1
+
+    def __post_init__(self):
+        if not 0 <= self.sections <= len(OPTIONAL_SECTIONS):
+            raise ValueError(f"sections must be between 0 and {len(OPTIONAL_SECTIONS)}, got {self.sections}")
+        if not 0 <= self.subsections <= len(ANATOMY):
+            raise ValueError(f"subsections must be between 0 and {len(ANATOMY)}, got {self.subsections}")
+        if not 0 <= self.edit_rate <= 1:
+            raise ValueError(f"edit_rate must be between 0 and 1, got {self.edit_rate}")
+
+
+def _edit(sentences: list[str], pool: list[str], rate: float, rng: random.Random) -> list[str]:
+    edited = []
+    for sentence in sentences:
+        if rng.random() >= rate:
+            edited.append(sentence)
+            continue
+        action = rng.choice(("delete", "insert", "reword"))
+        if action == "insert":
+            edited += [sentence, rng.choice(pool)]
+        elif action == "reword":
+            words = sentence.split()
+            words[rng.randrange(len(words))] = rng.choice(REWORDS)
+            edited.append(" ".join(words))
+    return edited
+
+
+def _report_text(header: list[tuple[str, str]], findings: list[tuple[str, list[str]]], impressions: list[str]) -> str:
+    """Report text as copied from the report window"""
+    lines = [f"{key}: {value}" for key, value in header]
+    lines.append("FINDINGS:")
+    for subsection, sentences in findings:
+        body = " ".join(sentences)
+        lines.append(f"{subsection}: {body}" if subsection else body)
+    lines.append("IMPRESSION:")
+    lines += [f"{index}. {impression}" for index, impression in enumerate(impressions, start=1)]
+    return "\\n".join(lines)
+
+
+def generate_pair(config: CorpusConfig, rng: random.Random, accession: int) -> tuple[str, str]:
+    """One (resident, attending) report text pair"""
+    optional = set(rng.sample(list(OPTIONAL_SECTIONS), config.sections))
+    header = [
+        ("STUDY", rng.choice(STUDIES)),
+        ("INDICATION", rng.choice(INDICATIONS)),
+        *((key, rng.choice(OPTIONAL_SECTIONS[key])) for key in ("COMPARISON",) if key in optional),
+        ("ACCESSION NUMBER(S)", str(accession)),
+        *((key, rng.choice(OPTIONAL_SECTIONS[key])) for key in ("ORDERING CLINICIAN", "TECHNIQUE") if key in optional),
+    ]
+
+    if config.subsections:
+        anatomy = rng.sample(list(ANATOMY), config.subsections)
+        anatomy.sort(key=list(ANATOMY).index)
+        findings = [(name, [rng.choice(ANATOMY[name]) for _ in range(config.sentences)]) for name in anatomy]
+    else:
+        pool = [sentence for sentences in ANATOMY.values() for sentence in sentences]
+        findings = [("", [rng.choice(pool) for _ in range(config.sentences)])]
+    impressions = [rng.choice(IMPRESSIONS) for _ in range(config.impressions)]
+
+    attending_findings = []
+    for name, sentences in findings:
+        pool = ANATOMY.get(name) or [sentence for sentences in ANATOMY.values() for sentence in sentences]
+        attending_findings.append((name, _edit(sentences, pool, config.edit_rate, rng) or sentences[:1]))
+    attending_impressions = _edit(impressions, IMPRESSIONS, config.edit_rate, rng) or impressions[:1]
+
+    resident = _report_text(header, findings, impressions)
+    attending = _report_text(header, attending_findings, attending_impressions)
+    if "MACRO" in optional:
+        macro = f"\\nMACRO: {rng.choice(OPTIONAL_SECTIONS['MACRO'])}"
+        resident, attending = resident + macro, attending + macro
+    return resident, attending
+
+
+def generate_corpus(pairs: int, config: CorpusConfig | None = None, seed=0) -> list[dict[str, str]]:
+    """
+    `pairs` report pairs as the flat list UiState.data holds, the same seed always giving the
+    same corpus.
+    """
+    config = config or CorpusConfig()
+    rng = random.Random(seed)
+    data = []
+    for index in range(pairs):
+        resident, attending = generate_pair(config, rng, accession=10_000_000 + index)
+        data.append({"resident": resident})
+        data.append({"attending": attending})
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=100)
+    parser.add_argument("--output", default="synthetic_report_data.pkl")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sections", type=int, default=CorpusConfig.sections)
+    parser.add_argument("--subsections", type=int, default=CorpusConfig.subsections)
+    parser.add_argument("--sentences", type=int, default=CorpusConfig.sentences)
+    parser.add_argument("--impressions", type=int, default=CorpusConfig.impressions)
+    parser.add_argument("--edit-rate", type=float, default=CorpusConfig.edit_rate)
+    args = parser.parse_args()
+
+    config = CorpusConfig(args.sections, args.subsections, args.sentences, args.impressions, args.edit_rate)
+    data = generate_corpus(args.pairs, config, args.seed)
+    with open(args.output, "wb") as f:
+        pickle.dump(data, f)
+    print(f"Wrote {args.pairs} report pairs to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+devices.py
+Exposes Devices, the mouse, keyboard and clipboard the automation drives. The live devices are the
+`mouse`, `keyboard` and `pyperclip` modules themselves; anything with the same methods can stand
+in for them, e.g. the headless simulator in simulator.py.
+"""
+
+from dataclasses import dataclass
+from typing import Protocol
+
+
+class Mouse(Protocol):
+    def move(self, x: int, y: int, absolute: bool = True, duration: float = 0) -> None: ...
+
+    def click(self, button: str = "left") -> None: ...
+
+    def press(self, button: str = "left") -> None: ...
+
+    def release(self, button: str = "left") -> None: ...
+
+
+class Keyboard(Protocol):
+    def send(self, hotkey: str) -> None: ...
+
+    def press(self, hotkey: str) -> None: ...
+
+    def release(self, hotkey: str) -> None: ...
+
+
+class Clipboard(Protocol):
+    def copy(self, text: str) -> None: ...
+
+    def paste(self) -> str: ...
+
+
+@dataclass(frozen=True)
+class Devices:
+    mouse: Mouse
+    keyboard: Keyboard
+    clipboard: Clipboard
+
+    @classmethod
+    def live(cls) -> "Devices":
+        """The workstation's real input devices, imported here so headless runs never load them"""
+        import keyboard
+        import mouse
+        import pyperclip
+
+        return cls(mouse, keyboard, pyperclip)
@@ -1,17 +1,20 @@
+import os
 import re
 import json
-import difflib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
 from docx import Document
-from docx.shared import Pt, RGBColor
+from docx.shared import RGBColor
 from docx.enum.text import WD_COLOR_INDEX, WD_ALIGN_PARAGRAPH
-import pdb
 import pickle
 import traceback
 
-KEYS = [
-    "STUDY", "INDICATION", "COMPARISON", "ACCESSION NUMBER(S)", "ORDERING CLINICIAN",
-    "TECHNIQUE", "FINDINGS", "IMPRESSION", "MACRO"
-]
+from diff_cache import DiffCache
+from diff_engine import get_opcodes
+from sections import tokenize_report
+from ooxml import write_ooxml_document
+from journal import DEFAULT_JOURNAL, iter_completed_pairs, journal_to_report_data, load_journal
 
 def load_json_data(file_path):
     """Load and parse the JSON data from a file."""
@@ -38,60 +41,25 @@ def load_json_data(file_path):
     return data
 
 def parse_one_json_item(json_item):
-    output = {}
+    """Splits one {reader: text} report into its sections, see sections.tokenize_report."""
     res_or_attending_key = list(json_item.keys())[0]
+    return tokenize_report(json_item[res_or_attending_key]).to_dict()
 
-    text = json_item[res_or_attending_key]
-    text = text.replace('\\r\\n', '\n').replace('\\n', '\n')
-    text = text.replace('[', '').replace(']', '')
-    # Remove excessive newlines
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    # Clean up whitespace
-    # text = text.replace('.', '. ')
-    text = re.sub(r'([a-zA-Z]):([a-zA-Z])', r'\1: \2', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = text.strip()
-
-    relkeys = [key for key in KEYS if key in text]
-    for idx, key in enumerate(relkeys):
-        end_report_section_idx = text.index(relkeys[idx + 1]) if idx < len(relkeys)-1 else len(text)
-        try:
-            report_section = text[text.index(key) + len(key):end_report_section_idx].strip(": ").strip()
-            output[key] = report_section
-        except ValueError:
-            output[key] = ""
-
-    # Process the findings section into subsections based on the anatomy in particular
-    findings_sections = re.split(r"([A-Z][A-Z\s]{2,}:)", output["FINDINGS"])
-    findings_dict = {}
-    current_subsection_header = None
-
-    for subsection in findings_sections:  # skip first element which will be 'FINDINGS'
-        # Case where the element is a header
-        if re.match(r"^[A-Z][A-Z\s]+:$", subsection):
-            current_subsection_header = subsection.strip(": ").upper()
-            continue
-        # Case where the element is some content belonging to a header
-        if current_subsection_header is not None:
-            findings_dict[current_subsection_header] = subsection.strip(": ").replace("\n", " ").strip()
-            continue
-        # Case where the text is the first text preceding any of the section headers
-        findings_dict["GENERAL"] = subsection.strip(": ").replace("\n", " ").strip()
-
-    output["FINDINGS"] = findings_dict
-    return output
+def preprocess_pair(item1, item2):
+    """Parses one resident/attending pair of raw report items into [resident, attending] dicts."""
+    reader_keys = [list(item1.keys())[0], list(item2.keys())[0]]
+    return [
+        {"reader": reader_keys[0], **parse_one_json_item(item1)},
+        {"reader": reader_keys[1], **parse_one_json_item(item2)}
+    ]
 
 def preprocess_json(input_json):
     out = []
     for idx in range(0, len(input_json), 2):  # have to assume this goes by 2
         item1 = input_json[idx]
         item2 = input_json[idx+1]
-        reader_keys = [list(item1.keys())[0], list(item2.keys())[0]]
         try:
-            out.append([
-                {"reader": reader_keys[0], **parse_one_json_item(item1)},
-                {"reader": reader_keys[1], **parse_one_json_item(item2)}
-            ])
+            out.append(preprocess_pair(item1, item2))
         except KeyError as e:
             print("KeyError with JSON preprocessing")
             print(f"Resident read: {item1}")
@@ -113,10 +81,11 @@ def preprocess_text(text):
     text = text.replace('. ', '.\n')
     return text
 
-def improve_diff_quality(text1, text2):
+def improve_diff_quality(text1, text2, engine=None):
     """
     Improve diff quality by tokenizing and normalizing text.
     This is an alternative approach that can provide better results in some cases.
+    `engine` names one of diff_engine.ENGINES, by default DIFF_ENGINE or "myers".
     """
     # Normalize whitespace and split into sentences
     def normalize_and_split(text):
@@ -163,11 +132,9 @@ def improve_diff_quality(text1, text2):
     sentences1 = normalize_and_split(text1)
     sentences2 = normalize_and_split(text2)
 
-    # Use SequenceMatcher for sentence-level diffing
-    matcher = difflib.SequenceMatcher(None, sentences1, sentences2)
-
+    # Sentence-level diffing
     result = []
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    for tag, i1, i2, j1, j2 in get_opcodes(sentences1, sentences2, engine):
         if tag == 'equal':
             result.append((" ".join(sentences1[i1:i2]), "normal"))
         elif tag == 'delete':
@@ -189,9 +156,7 @@ def improve_diff_quality(text1, text2):
                 words1 = re.findall(r'\S+|\s+', deleted_text)
                 words2 = re.findall(r'\S+|\s+', inserted_text)
 
-                word_matcher = difflib.SequenceMatcher(None, words1, words2)
-
-                for w_tag, w_i1, w_i2, w_j1, w_j2 in word_matcher.get_opcodes():
+                for w_tag, w_i1, w_i2, w_j1, w_j2 in get_opcodes(words1, words2, engine):
                     if w_tag == 'equal':
                         result.append(("".join(words1[w_i1:w_i2]), "normal"))
                     elif w_tag == 'delete':
@@ -284,8 +249,82 @@ def reorder_diff_results(diff_results):
     
     return reordered_results
 
-def process_report_pair(resident, attending, doc):
-    """Process a single resident-attending report pair and add to document."""
+@dataclass(frozen=True)
+class PairDiff:
+    """
+    Everything needed to render one report pair, so the diffing can run in a worker process
+    and only the rendering happens where the document is assembled.
+
+    Attributes:
+        pair (list[dict]): Parsed [resident, attending] reports, as preprocess_json outputs them.
+        findings (list[tuple[str, str]]): Grouped and reordered (text, format) FINDINGS diff.
+        impression (list[tuple[str, str]]): Grouped and reordered (text, format) IMPRESSION diff.
+    """
+    pair: list
+    findings: list
+    impression: list
+
+def join_findings(report):
+    """FINDINGS of a parsed report as one string, subsections joined in order."""
+    if 'FINDINGS' not in report:
+        return ""
+    if isinstance(report['FINDINGS'], dict):
+        return "".join(f"{text} " for text in report['FINDINGS'].values())
+    return report['FINDINGS']
+
+def diff_report_pair(resident, attending):
+    """Diffs the FINDINGS and IMPRESSION of a parsed resident-attending pair."""
+    findings_diff = improve_diff_quality(join_findings(resident), join_findings(attending))
+    impression_diff = improve_diff_quality(resident.get('IMPRESSION', ''), attending.get('IMPRESSION', ''))
+
+    # Group and reorder diff results
+    findings_diff = reorder_diff_results(group_diff_results(findings_diff))
+    impression_diff = reorder_diff_results(group_diff_results(impression_diff))
+    return PairDiff([resident, attending], findings_diff, impression_diff)
+
+def pair_cache_key(resident, attending):
+    """DiffCache key of exactly the text diff_report_pair diffs."""
+    return DiffCache.key(
+        join_findings(resident), resident.get('IMPRESSION', ''),
+        join_findings(attending), attending.get('IMPRESSION', ''),
+    )
+
+def cached_diff_report_pair(resident, attending, cache=None):
+    """diff_report_pair, served from and stored to `cache` when one is given."""
+    if cache is None:
+        return diff_report_pair(resident, attending)
+    key = pair_cache_key(resident, attending)
+    hit = cache.get(key)
+    if hit is not None:
+        return PairDiff([resident, attending], *hit)
+    pair_diff = diff_report_pair(resident, attending)
+    cache.put(key, pair_diff.findings, pair_diff.impression)
+    return pair_diff
+
+def diff_texts(resident_text, attending_text):
+    """Parses and diffs a pair of raw report texts, the unit of work for the post-processing pool."""
+    resident, attending = preprocess_pair({"resident": resident_text}, {"attending": attending_text})
+    return diff_report_pair(resident, attending)
+
+def add_diff_paragraph(doc, diff):
+    """Adds a diff as a single paragraph, deletions struck through in red and insertions in green."""
+    p = doc.add_paragraph()
+    if diff == [("(NO CORRECTIONS MADE)", "normal")]:
+        p.add_run("(NO CORRECTIONS MADE)")
+        return
+    for text, format_type in diff:
+        run = p.add_run(text)
+        if format_type == "delete":
+            run.font.color.rgb = RGBColor(255, 0, 0)  # Red
+            run.font.strike = True
+        elif format_type == "insert":
+            run.font.color.rgb = RGBColor(0, 128, 0)  # Green
+            run.font.highlight_color = WD_COLOR_INDEX.BRIGHT_GREEN
+
+def render_pair_diff(pair_diff, doc):
+    """Adds an already diffed report pair to the document."""
+    resident = pair_diff.pair[0]
+
     # Add header
     header_text = f"STUDY: {resident.get('STUDY', '')}\n"
     header_text += f"INDICATION: {resident.get('INDICATION', '')}\n"
@@ -296,134 +335,231 @@ def process_report_pair(resident, attending, doc):
     header_run = header.add_run(header_text)
     header_run.bold = True
 
-    # Process FINDINGS section
     doc.add_heading("FINDINGS", level=2)
+    add_diff_paragraph(doc, pair_diff.findings)
 
-    # Extract and process FINDINGS content
-    resident_findings = ""
-    attending_findings = ""
-
-    if 'FINDINGS' in resident:
-        if isinstance(resident['FINDINGS'], dict):
-            for section, text in resident['FINDINGS'].items():
-                resident_findings += f"{text} "
-        else:
-            resident_findings = resident['FINDINGS']
-
-    if 'FINDINGS' in attending:
-        if isinstance(attending['FINDINGS'], dict):
-            for section, text in attending['FINDINGS'].items():
-                attending_findings += f"{text} "
-        else:
-            attending_findings = attending['FINDINGS']
-
-    # Generate diff for FINDINGS
-    findings_diff = improve_diff_quality(resident_findings, attending_findings)
-    
-    # Group and reorder diff results
-    findings_diff = group_diff_results(findings_diff)
-    findings_diff = reorder_diff_results(findings_diff)
-
-    # Add FINDINGS diff to document
-    if findings_diff == [("(NO CORRECTIONS MADE)", "normal")]:
-        p = doc.add_paragraph()
-        p.add_run("(NO CORRECTIONS MADE)")
-    else:
-        p = doc.add_paragraph()
-        for text, format_type in findings_diff:
-            run = p.add_run(text)
-            if format_type == "delete":
-                run.font.color.rgb = RGBColor(255, 0, 0)  # Red
-                run.font.strike = True
-            elif format_type == "insert":
-                run.font.color.rgb = RGBColor(0, 128, 0)  # Green
-                run.font.highlight_color = WD_COLOR_INDEX.BRIGHT_GREEN
-
-    # Process IMPRESSION section
     doc.add_heading("IMPRESSION", level=2)
+    add_diff_paragraph(doc, pair_diff.impression)
 
-    # Extract and process IMPRESSION content
-    resident_impression = resident.get('IMPRESSION', '')
-    attending_impression = attending.get('IMPRESSION', '')
+def process_report_pair(resident, attending, doc):
+    """Process a single resident-attending report pair and add to document."""
+    render_pair_diff(diff_report_pair(resident, attending), doc)
 
-    # Generate diff for IMPRESSION
-    impression_diff = improve_diff_quality(resident_impression, attending_impression)
-    
-    # Group and reorder diff results
-    impression_diff = group_diff_results(impression_diff)
-    impression_diff = reorder_diff_results(impression_diff)
+# Parallel diff build switches: worker processes (1 diffs in this process) and pairs per task
+DIFF_WORKERS = int(os.getenv("DIFF_WORKERS", str(os.cpu_count() or 1)))
+DIFF_CHUNK_SIZE = int(os.getenv("DIFF_CHUNK_SIZE", "16"))
 
-    # Add IMPRESSION diff to document
-    if impression_diff == [("(NO CORRECTIONS MADE)", "normal")]:
-        p = doc.add_paragraph()
-        p.add_run("(NO CORRECTIONS MADE)")
-    else:
-        p = doc.add_paragraph()
-        for text, format_type in impression_diff:
-            run = p.add_run(text)
-            if format_type == "delete":
-                run.font.color.rgb = RGBColor(255, 0, 0)  # Red
-                run.font.strike = True
-            elif format_type == "insert":
-                run.font.color.rgb = RGBColor(0, 128, 0)  # Green
-                run.font.highlight_color = WD_COLOR_INDEX.BRIGHT_GREEN
-
-def create_comparison_document_improved(data, output_file):
+def diff_pairs(data, workers=None, chunk_size=None, cache=None):
     """
-    Create a Word document comparing resident and attending reads,
-    using the improved diffing algorithm.
+    Diffs parsed [resident, attending] pairs, fanned out over a process pool when there is more
+    than one worker and more than one chunk of work. Results keep the order of `data`; pairs
+    that are not a resident and attending pair are left out. With a DiffCache only the pairs
+    missing from it are diffed, and their results are added to it.
     """
-    doc = Document()
+    workers = DIFF_WORKERS if workers is None else workers
+    chunk_size = DIFF_CHUNK_SIZE if chunk_size is None else chunk_size
 
-    # Process each pair
-    for i, pair in enumerate(data):
+    residents, attendings = [], []
+    for pair in data:
         # Make sure we have a resident and attending pair
         if len(pair) != 2:
             continue
 
         # Determine which is resident and which is attending
         resident_idx = 0 if pair[0].get('reader', '') == 'resident' else 1
-        attending_idx = 1 - resident_idx
-
-        if resident_idx >= len(pair) or attending_idx >= len(pair):
-            continue
+        residents.append(pair[resident_idx])
+        attendings.append(pair[1 - resident_idx])
+
+    results = [None] * len(residents)
+    keys = [None] * len(residents)
+    if cache is not None:
+        for index, (resident, attending) in enumerate(zip(residents, attendings)):
+            keys[index] = pair_cache_key(resident, attending)
+            hit = cache.get(keys[index])
+            if hit is not None:
+                results[index] = PairDiff([resident, attending], *hit)
+    missing = [index for index, result in enumerate(results) if result is None]
+
+    if workers <= 1 or len(missing) <= chunk_size:
+        computed = [diff_report_pair(residents[index], attendings[index]) for index in missing]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            computed = list(pool.map(
+                diff_report_pair,
+                [residents[index] for index in missing],
+                [attendings[index] for index in missing],
+                chunksize=chunk_size,
+            ))
+
+    for index, pair_diff in zip(missing, computed):
+        results[index] = pair_diff
+        if cache is not None:
+            cache.put(keys[index], pair_diff.findings, pair_diff.impression)
+    return results
+
+def create_comparison_document_improved(data, output_file, workers=None, chunk_size=None, cache=None, writer=None):
+    """
+    Create a Word document comparing resident and attending reads,
+    using the improved diffing algorithm. The diffs are computed in parallel
+    (see diff_pairs) and written into the document serially, in order.
+    """
+    write_document(diff_pairs(data, workers, chunk_size, cache), output_file, writer)
+
+# Document writer: "python-docx" builds the document tree in memory, "ooxml" streams the XML
+DOCX_WRITER = os.getenv("DOCX_WRITER", "python-docx")
+
+def write_document(pair_diffs, output_file, writer=None):
+    """Writes diffed pairs with the chosen writer, both produce the same document."""
+    writer = writer or DOCX_WRITER
+    if writer == "ooxml":
+        write_ooxml_document(pair_diffs, output_file)
+    elif writer == "python-docx":
+        assemble_document(pair_diffs, output_file)
+    else:
+        raise ValueError(f"Unknown document writer '{writer}', expected 'python-docx' or 'ooxml'")
 
-        resident = pair[resident_idx]
-        attending = pair[attending_idx]
+def assemble_document(pair_diffs, output_file):
+    """Renders already diffed report pairs into a Word document, one pair per page."""
+    doc = Document()
 
-        # Process this report pair
-        process_report_pair(resident, attending, doc)
+    for i, pair_diff in enumerate(pair_diffs):
+        render_pair_diff(pair_diff, doc)
 
         # Add page break after each pair except the last one
-        if i < len(data) - 1:
+        if i < len(pair_diffs) - 1:
             doc.add_page_break()
 
     # Save the document
     doc.save(output_file)
     print(f"Document saved to {output_file}")
 
-def generate_diff_doc():
-    """Main function to run the program."""
+class StreamingDocumentWriter:
+    """
+    Renders report pairs as they arrive into a series of Word documents of at most `chunk_size`
+    pairs each, so only one chunk is ever held in memory. The chunk being filled is saved every
+    `checkpoint_every` pairs, so the files on disk are usable if the run stops early. The
+    preprocessed JSON is streamed alongside as a list.
+    """
+
+    def __init__(self, output_file="report_comparisons.docx", chunk_size=50, checkpoint_every=5,
+                 json_file="output_preprocessed.json"):
+        self.output_file = Path(output_file)
+        self.chunk_size = chunk_size
+        self.checkpoint_every = checkpoint_every
+        self.paths = []
+        self.count = 0
+        self.doc = None
+        self.in_chunk = 0
+        self.json_fp = open(json_file, "w", encoding="utf-8")
+        self.json_fp.write("[")
+
+        # Chunks left over from an earlier, longer run would read as part of this one
+        for stale in self.output_file.parent.glob(f"{self.output_file.stem}_part[0-9][0-9][0-9]{self.output_file.suffix}"):
+            stale.unlink()
+
+    def chunk_path(self, index):
+        return self.output_file.with_name(f"{self.output_file.stem}_part{index:03d}{self.output_file.suffix}")
+
+    def add(self, pair_diff):
+        if self.doc is None:
+            self.doc = Document()
+            self.paths.append(self.chunk_path(len(self.paths) + 1))
+        elif self.in_chunk:
+            self.doc.add_page_break()
+
+        render_pair_diff(pair_diff, self.doc)
+        self.json_fp.write(("," if self.count else "") + json.dumps(pair_diff.pair))
+        self.json_fp.flush()
+        self.count += 1
+        self.in_chunk += 1
+
+        if self.in_chunk >= self.chunk_size:
+            self.flush()
+        elif self.in_chunk % self.checkpoint_every == 0:
+            self.doc.save(self.paths[-1])
+
+    def flush(self):
+        """Saves the chunk being filled and starts a new one with the next pair."""
+        if self.doc is None:
+            return
+        self.doc.save(self.paths[-1])
+        print(f"Document saved to {self.paths[-1]}")
+        self.doc = None
+        self.in_chunk = 0
+
+    def close(self):
+        self.flush()
+        self.json_fp.write("]")
+        self.json_fp.close()
+
+def stream_diff_doc(output_file="report_comparisons.docx", chunk_size=50, cache=None):
+    """Streams the journal through the diff and into chunked documents one pair at a time."""
+    writer = StreamingDocumentWriter(output_file, chunk_size)
+    try:
+        for resident, attending in iter_completed_pairs(DEFAULT_JOURNAL):
+            try:
+                pair = preprocess_pair({"resident": resident.text}, {"attending": attending.text})
+                writer.add(cached_diff_report_pair(*pair, cache))
+            except KeyError:
+                print(f"KeyError with JSON preprocessing, report {resident.key} will be skipped")
+                print(traceback.format_exc())
+    finally:
+        writer.close()
+    return writer.paths
+
+def generate_diff_doc(pair_diffs=None, chunk_size=None, writer=None):
+    """
+    Main function to run the program.
+
+    Args:
+        pair_diffs (list[PairDiff] | None): Pairs already diffed by the post-processing pool
+            during the run, in which case the document only needs assembling. Otherwise the
+            captured reports are loaded and diffed here.
+        chunk_size (int | None): Stream the journal into documents of at most this many pairs
+            instead of building one document in memory.
+        writer (str | None): "python-docx" or "ooxml", by default DOCX_WRITER or "python-docx".
+
+    Diffs are cached in diff_cache.sqlite across runs, so regenerating the document only
+    diffs new or changed pairs. Set DIFF_CACHE=0 to disable the cache.
+    """
     input_file = "report_data.pkl"
     output_file = "report_comparisons.docx"
 
+    cache = DiffCache() if os.getenv("DIFF_CACHE", "1") != "0" else None
     try:
-        # Load data
-        with open(input_file, "rb") as f:
-            data = pickle.load(f)
-
-        data = preprocess_json(data)
+        if chunk_size and pair_diffs is None and os.path.exists(DEFAULT_JOURNAL):
+            paths = stream_diff_doc(output_file, chunk_size, cache)
+            print(f"Successfully created comparison documents: {[str(path) for path in paths]}")
+            return
+
+        if pair_diffs is not None:
+            data = [pair_diff.pair for pair_diff in pair_diffs]
+        # Load data, preferring the crash-safe journal over the end-of-run pickle
+        elif os.path.exists(DEFAULT_JOURNAL):
+            data = preprocess_json(journal_to_report_data(load_journal(DEFAULT_JOURNAL)))
+        else:
+            with open(input_file, "rb") as f:
+                data = preprocess_json(pickle.load(f))
 
-        with open("output_preprocessed.json", "a") as j:
+        with open("output_preprocessed.json", "w") as j:
             json.dump(data, j)
 
         # Create comparison document using improved algorithm
-        create_comparison_document_improved(data, output_file)
+        if pair_diffs is not None:
+            if cache is not None:
+                for pair_diff in pair_diffs:
+                    cache.put(pair_cache_key(*pair_diff.pair), pair_diff.findings, pair_diff.impression)
+            write_document(pair_diffs, output_file, writer)
+        else:
+            create_comparison_document_improved(data, output_file, cache=cache, writer=writer)
 
         print(f"Successfully created comparison document: {output_file}")
 
     except Exception as e:
         print(f"Error with outputting to diff doc--: \n{traceback.format_exc()}")
+    finally:
+        if cache is not None:
+            cache.close()
 
 if __name__ == "__main__":
     generate_diff_doc()
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+diff_cache.py
+Content addressed on-disk cache of report pair diffs, so regenerating the comparison document
+only diffs the pairs whose text changed since the last run. Entries are keyed by a hash of the
+exact text that is diffed plus the diff engine and its version.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from diff_engine import DEFAULT_ENGINE, ENGINE_VERSION
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_CACHE = "diff_cache.sqlite"
+
+Runs = list[tuple[str, str]]
+
+
+class DiffCache:
+    """
+    SQLite backed store of grouped and reordered (text, format) diff runs. Once the stored
+    values exceed `max_bytes`, the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_CACHE, max_bytes=256 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS diffs (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS diffs_last_used ON diffs (last_used)")
+
+    @staticmethod
+    def key(resident_findings: str, resident_impression: str, attending_findings: str,
+            attending_impression: str, engine: str | None = None) -> str:
+        digest = hashlib.sha256(f"{engine or DEFAULT_ENGINE}:{ENGINE_VERSION}".encode())
+        for text in (resident_findings, resident_impression, attending_findings, attending_impression):
+            encoded = text.encode("utf-8")
+            # Length prefix so text moving between fields cannot produce the same digest
+            digest.update(len(encoded).to_bytes(8, "little"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> tuple[Runs, Runs] | None:
+        """(findings runs, impression runs) stored under `key`, None on a miss"""
+        row = self._db.execute("SELECT value FROM diffs WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._db.execute("UPDATE diffs SET last_used = ? WHERE key = ?", (time.time(), key))
+        findings, impression = json.loads(row[0])
+        return [tuple(run) for run in findings], [tuple(run) for run in impression]
+
+    def put(self, key: str, findings: Runs, impression: Runs):
+        value = json.dumps([findings, impression])
+        self._db.execute(
+            "INSERT OR REPLACE INTO diffs (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, value, len(value), time.time()),
+        )
+
+    def evict(self):
+        """Drops least recently used entries until the cache fits in `max_bytes`"""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM diffs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM diffs ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM diffs WHERE key = ?", doomed)
+        self.evicted += len(doomed)
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM diffs").fetchone()[0]
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evicted": self.evicted, "entries": len(self)}
+
+    def close(self):
+        self.evict()
+        self._db.commit()
+        logger.info(f"Diff cache {self.path}: {self.stats()}")
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
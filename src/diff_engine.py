@@ -0,0 +1,153 @@
+"""
+diff_engine.py
+Pluggable sequence diff engines for improve_diff_quality. Every engine returns opcodes in the
+same (tag, i1, i2, j1, j2) form as difflib.SequenceMatcher.get_opcodes, with tags "equal",
+"delete", "insert" and "replace", so engines can be swapped without touching the callers.
+"""
+
+import difflib
+import os
+from typing import Callable, Hashable, Sequence
+
+Opcode = tuple[str, int, int, int, int]
+
+
+def intern_tokens(a: Sequence[Hashable], b: Sequence[Hashable]) -> tuple[list[int], list[int]]:
+    """Maps both token sequences to small integer IDs so comparisons are integer compares"""
+    table: dict[Hashable, int] = {}
+    return [table.setdefault(t, len(table)) for t in a], [table.setdefault(t, len(table)) for t in b]
+
+
+def difflib_opcodes(a: Sequence[Hashable], b: Sequence[Hashable]) -> list[Opcode]:
+    """The original engine, difflib.SequenceMatcher with its default autojunk heuristic"""
+    return difflib.SequenceMatcher(None, a, b).get_opcodes()
+
+
+def _myers_path(a: list[int], b: list[int]) -> list[str]:
+    """
+    Shortest edit script between `a` and `b` as a list of "=", "-" and "+" steps, using Myers'
+    O((N+M)D) greedy algorithm. V is indexed by diagonal k, negative k wrapping around the end
+    of the list.
+    """
+    n, m = len(a), len(b)
+    max_d = n + m
+    v = [0] * (2 * max_d + 2)
+    trace = []
+    for d in range(max_d + 1):
+        trace.append(v[:])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return []
+
+
+def _backtrack(trace: list[list[int]], n: int, m: int) -> list[str]:
+    steps = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1] < v[k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            steps.append("=")
+            x -= 1
+            y -= 1
+        if d > 0:
+            steps.append("+" if x == prev_x else "-")
+        x, y = prev_x, prev_y
+    steps.reverse()
+    return steps
+
+
+def _steps_to_opcodes(steps: list[str], offset: int) -> list[Opcode]:
+    """Groups edit steps into SequenceMatcher style opcodes, a deletion next to an insertion being a replace"""
+    opcodes = []
+    i = j = offset
+    index = 0
+    while index < len(steps):
+        i1, j1 = i, j
+        if steps[index] == "=":
+            while index < len(steps) and steps[index] == "=":
+                i += 1
+                j += 1
+                index += 1
+            opcodes.append(("equal", i1, i, j1, j))
+            continue
+        while index < len(steps) and steps[index] != "=":
+            if steps[index] == "-":
+                i += 1
+            else:
+                j += 1
+            index += 1
+        tag = "replace" if i > i1 and j > j1 else ("delete" if i > i1 else "insert")
+        opcodes.append((tag, i1, i, j1, j))
+    return opcodes
+
+
+def myers_opcodes(a: Sequence[Hashable], b: Sequence[Hashable]) -> list[Opcode]:
+    """
+    Minimal diff over interned token IDs. The common prefix and suffix are trimmed first, so
+    the quadratic part of the algorithm only ever sees the region that actually changed.
+    """
+    ids_a, ids_b = intern_tokens(a, b)
+    prefix = 0
+    while prefix < len(ids_a) and prefix < len(ids_b) and ids_a[prefix] == ids_b[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < len(ids_a) - prefix and suffix < len(ids_b) - prefix
+           and ids_a[-1 - suffix] == ids_b[-1 - suffix]):
+        suffix += 1
+
+    middle_a = ids_a[prefix : len(ids_a) - suffix]
+    middle_b = ids_b[prefix : len(ids_b) - suffix]
+    steps = ["="] * prefix
+    steps += _myers_path(middle_a, middle_b)
+    steps += ["="] * suffix
+    return _steps_to_opcodes(steps, 0)
+
+
+ENGINES: dict[str, Callable[[Sequence[Hashable], Sequence[Hashable]], list[Opcode]]] = {
+    "difflib": difflib_opcodes,
+    "myers": myers_opcodes,
+}
+
+
+def validate_engine(name: str) -> str:
+    """
+    Raises:
+        ValueError: If `name` is not one of ENGINES.
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown diff engine '{name}', available: {', '.join(ENGINES)}")
+    return name
+
+
+# Engine used when improve_diff_quality is not given one, DIFF_ENGINE=difflib restores the original.
+# Checked on import so a typo fails the run at start, not as a failed diff of every report
+DEFAULT_ENGINE = validate_engine(os.getenv("DIFF_ENGINE", "myers"))
+
+# Part of every diff cache key, bump it whenever an engine or the grouping/reordering of its
+# output changes so stale cached diffs are never reused
+ENGINE_VERSION = 1
+
+
+def get_opcodes(a: Sequence[Hashable], b: Sequence[Hashable], engine: str | None = None) -> list[Opcode]:
+    """
+    Raises:
+        ValueError: If `engine` is not one of ENGINES.
+    """
+    return ENGINES[validate_engine(engine or DEFAULT_ENGINE)](a, b)
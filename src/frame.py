@@ -0,0 +1,110 @@
+"""
+frame.py
+Exposes the Frame class which wraps a single screen capture and lazily derives the views
+(grayscale, downscaled pyramid levels, ROI crops) that the detectors need.
+"""
+
+import time
+from functools import cached_property
+
+import cv2
+import numpy as np
+
+from constants import FRAME_ROIS
+
+
+class Frame:
+    """
+    A single BGRA screen capture. Derived views are computed on first access and cached for
+    the lifetime of the frame, so a frame is converted once no matter how many detectors look
+    at it. UiState.refresh replaces the frame, which drops every cached view with it.
+
+    Attributes:
+        raw (np.ndarray): (height, width, 4) BGRA buffer, shared with the capture backend.
+        left (int): Array x coordinate of the frame's top-left corner on the monitor.
+        top (int): Array y coordinate of the frame's top-left corner on the monitor.
+        timestamp (float): time.monotonic() at which the capture started.
+    """
+
+    def __init__(self, raw: np.ndarray, left: int = 0, top: int = 0, timestamp: float | None = None):
+        if raw.ndim != 3 or raw.shape[2] != 4:
+            raise ValueError(f"Expected a BGRA buffer, got shape {raw.shape}")
+        self.raw = raw
+        self.left = left
+        self.top = top
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self._rois: dict[tuple[str, bool], np.ndarray] = {}
+
+    @classmethod
+    def from_screenshot(cls, screenshot, left: int = 0, top: int = 0) -> "Frame":
+        """Wraps an mss ScreenShot without copying its pixel buffer."""
+        raw = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(screenshot.height, screenshot.width, 4)
+        return cls(raw, left, top)
+
+    @classmethod
+    def from_bgr(cls, image: np.ndarray, left: int = 0, top: int = 0) -> "Frame":
+        """Builds a frame from a BGR image such as a screenshot loaded with cv2.imread."""
+        return cls(cv2.cvtColor(image, cv2.COLOR_BGR2BGRA), left, top)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.raw.shape[:2]
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """Non-contiguous BGR view of the capture, the layout UiState.screen always had."""
+        return self.raw[:, :, :3]
+
+    @cached_property
+    def gray(self) -> np.ndarray:
+        return cv2.cvtColor(self.raw, cv2.COLOR_BGRA2GRAY)
+
+    @cached_property
+    def half(self) -> np.ndarray:
+        """Grayscale at half resolution."""
+        return cv2.pyrDown(self.gray)
+
+    @cached_property
+    def quarter(self) -> np.ndarray:
+        """Grayscale at quarter resolution."""
+        return cv2.pyrDown(self.half)
+
+    def crop(self, bounds: tuple[int, int, int, int], gray=True) -> np.ndarray:
+        """
+        Crops (x, y, width, height) given in monitor array coordinates. Returns a view, parts of
+        the bounds outside of this frame are clipped.
+        """
+        x, y, w, h = bounds
+        x0, y0 = max(x - self.left, 0), max(y - self.top, 0)
+        x1, y1 = max(x + w - self.left, 0), max(y + h - self.top, 0)
+        source = self.gray if gray else self.bgr
+        return source[y0:y1, x0:x1]
+
+    def sub(self, bounds: tuple[int, int, int, int]) -> "Frame":
+        """
+        A Frame over (x, y, width, height) of this one, sharing its buffer and timestamp. Parts of
+        the bounds outside of this frame are clipped, as in `crop`.
+        """
+        x, y, w, h = bounds
+        x0, y0 = max(x - self.left, 0), max(y - self.top, 0)
+        x1, y1 = max(x + w - self.left, 0), max(y + h - self.top, 0)
+        raw = self.raw[y0:y1, x0:x1]
+        return Frame(raw, self.left + x0, self.top + y0, self.timestamp)
+
+    def roi(self, name: str, gray=True) -> np.ndarray:
+        """Returns the named region from constants.FRAME_ROIS, cached until the next refresh."""
+        key = (name, gray)
+        if key not in self._rois:
+            self._rois[key] = self.crop(FRAME_ROIS[name], gray)
+        return self._rois[key]
+
+
+def to_gray(screen: Frame | np.ndarray) -> np.ndarray:
+    """Returns a grayscale image for either a Frame (cached) or a raw BGR/BGRA/gray array."""
+    if isinstance(screen, Frame):
+        return screen.gray
+    if screen.ndim == 2:
+        return screen
+    if screen.shape[2] == 4:
+        return cv2.cvtColor(screen, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
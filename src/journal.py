@@ -0,0 +1,179 @@
+"""
+journal.py
+Append-only, crash-safe journal of captured report text. Every resident/attending capture is
+written and fsynced as one JSON line the moment it is copied, so a crash loses at most the
+report in flight and a restarted run can skip everything already captured.
+"""
+
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_JOURNAL = "report_journal.jsonl"
+
+ACCESSION_PATTERN = re.compile(r"ACCESSION NUMBER\(S\)\s*:?\s*([A-Za-z0-9-]+)")
+
+
+@dataclass(frozen=True)
+class JournalEntry:
+    """
+    Attributes:
+        page (int): Worklist page the report was opened from, starting at 0.
+        ordinal (int): Position of the report among the reports opened on that page.
+        reader (str): "resident" or "attending".
+        text (str): Report text exactly as copied from the report window.
+        accession (str | None): Accession number from the worklist row, or parsed from the text.
+        captured_at (str): ISO timestamp of the capture.
+    """
+    page: int
+    ordinal: int
+    reader: str
+    text: str
+    accession: str | None
+    captured_at: str
+
+    @property
+    def key(self) -> tuple[int, int]:
+        return self.page, self.ordinal
+
+
+def extract_accession(text: str) -> str | None:
+    match = ACCESSION_PATTERN.search(text)
+    return match.group(1) if match else None
+
+
+def iter_journal(path: str | Path = DEFAULT_JOURNAL) -> Iterator[JournalEntry]:
+    """Yields every complete line of the journal, a torn final line from a crash is skipped."""
+    with open(path, "r", encoding="utf-8") as fp:
+        for line_number, line in enumerate(fp, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield JournalEntry(**json.loads(line))
+            except (json.JSONDecodeError, TypeError):
+                logger.warning(f"Skipping unreadable journal line {line_number} in {path}")
+
+
+def load_journal(path: str | Path = DEFAULT_JOURNAL) -> list[JournalEntry]:
+    return list(iter_journal(path))
+
+
+def completed_pairs(entries: list[JournalEntry]) -> dict[tuple[int, int], tuple[JournalEntry, JournalEntry]]:
+    """
+    Latest resident/attending pair for every report key that has both. A resident capture
+    starts a new attempt, so a report retried after a crash pairs with its newest attempt.
+    """
+    pending: dict[tuple[int, int], JournalEntry] = {}
+    pairs = {}
+    for entry in entries:
+        if entry.reader == "resident":
+            pending[entry.key] = entry
+        elif entry.reader == "attending" and entry.key in pending:
+            pairs[entry.key] = (pending.pop(entry.key), entry)
+    return pairs
+
+
+def _latest_attempts(entries: Iterable[JournalEntry]) -> dict[tuple[int, int], int]:
+    """Position in the journal of the resident entry of every report key's latest completed pair"""
+    pending: dict[tuple[int, int], int] = {}
+    latest = {}
+    for index, entry in enumerate(entries):
+        if entry.reader == "resident":
+            pending[entry.key] = index
+        elif entry.reader == "attending" and entry.key in pending:
+            latest[entry.key] = pending.pop(entry.key)
+    return latest
+
+
+def iter_completed_pairs(path: str | Path = DEFAULT_JOURNAL) -> Iterator[tuple[JournalEntry, JournalEntry]]:
+    """
+    Yields the same latest resident/attending pair per report key as `completed_pairs`, as each
+    one completes, holding only unpaired residents in memory. The journal is read twice, first
+    for the positions of the latest attempts, so an earlier attempt of a retried report is
+    never yielded.
+    """
+    latest = _latest_attempts(iter_journal(path))
+    pending: dict[tuple[int, int], tuple[int, JournalEntry]] = {}
+    for index, entry in enumerate(iter_journal(path)):
+        if entry.reader == "resident":
+            pending[entry.key] = index, entry
+        elif entry.reader == "attending" and entry.key in pending:
+            resident_index, resident = pending.pop(entry.key)
+            if latest.get(entry.key) == resident_index:
+                yield resident, entry
+
+
+def journal_to_report_data(entries: list[JournalEntry]) -> list[dict[str, str]]:
+    """Flattens completed pairs into the [{"resident": text}, {"attending": text}, ...] shape UiState.data has."""
+    data = []
+    for resident, attending in completed_pairs(entries).values():
+        data.append({"resident": resident.text})
+        data.append({"attending": attending.text})
+    return data
+
+
+class CaptureJournal:
+    """
+    Open journal for the current run. Starting a fresh run moves an existing journal aside
+    rather than truncating it; resuming appends to it and reports which reports to skip.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_JOURNAL, resume=False):
+        self.path = Path(path)
+        entries = []
+        if self.path.exists():
+            if resume:
+                entries = load_journal(self.path)
+            else:
+                rotated = self.path.with_suffix(f".{datetime.now().strftime('%m-%d_%H-%M-%S')}.jsonl")
+                self.path.rename(rotated)
+                logger.info(f"Moved previous journal aside to {rotated}")
+
+        pairs = completed_pairs(entries)
+        self.resumed_pairs = list(pairs.values())
+        self.completed = set(pairs)
+        self.completed_accessions = {resident.accession for resident, _ in pairs.values() if resident.accession}
+        if resume:
+            logger.info(f"Resuming from {self.path}: {len(self.completed)} reports already captured")
+        self._fp = open(self.path, "a", encoding="utf-8")
+        if resume and self._fp.tell() > 0:
+            # Terminate a line torn by a crash so the next entry starts on a line of its own
+            with open(self.path, "rb") as raw:
+                raw.seek(-1, os.SEEK_END)
+                if raw.read(1) != b"\n":
+                    self._fp.write("\n")
+
+    def is_completed(self, page: int, ordinal: int, accession: str | None = None) -> bool:
+        """Checks by accession when it is known, positions shift if the worklist changed between runs"""
+        if accession:
+            return accession in self.completed_accessions
+        return (page, ordinal) in self.completed
+
+    def append(self, page: int, ordinal: int, reader: str, text: str, accession: str | None = None) -> JournalEntry:
+        entry = JournalEntry(
+            page=page,
+            ordinal=ordinal,
+            reader=reader,
+            text=text,
+            accession=accession or extract_accession(text),
+            captured_at=datetime.now().isoformat(timespec="seconds"),
+        )
+        self._fp.write(json.dumps(asdict(entry)) + "\n")
+        self._fp.flush()
+        os.fsync(self._fp.fileno())
+        if reader == "attending":
+            self.completed.add(entry.key)
+            if entry.accession:
+                self.completed_accessions.add(entry.accession)
+        return entry
+
+    def close(self):
+        self._fp.close()
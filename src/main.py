@@ -36,7 +36,9 @@ def main():
     # scroll_bounds = (5216, 209, 1870, 827)
     # header_bounds = (5215, 188, 1887, 20)
 
-    run()
+    # Set RESUME=1 (e.g. in .env) to continue an interrupted run from report_journal.jsonl
+    resume = os.getenv("RESUME", "").lower() in ("1", "true", "yes")
+    run(resume=resume)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+"""
+ooxml.py
+Writes the comparison document by streaming word/document.xml straight into the .docx zip, a fast
+alternative to building a python-docx object tree. Every other part (styles, theme, settings) is
+copied from python-docx's own default template, and paragraphs are emitted with the same XML
+python-docx generates, so the result opens identically in Word.
+"""
+
+import os
+import re
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import docx
+
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+TEMPLATE = os.path.join(os.path.dirname(docx.__file__), "templates", "default.docx")
+
+# Run properties for each diff format, as python-docx serializes them
+RUN_PROPERTIES = {
+    "normal": "",
+    "delete": '<w:rPr><w:strike/><w:color w:val="FF0000"/></w:rPr>',
+    "insert": '<w:rPr><w:color w:val="008000"/><w:highlight w:val="green"/></w:rPr>',
+}
+
+PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+
+# Characters XML 1.0 cannot represent, which lxml would refuse
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+# Tabs and line breaks become their own elements, like python-docx's Run.text setter
+_RUN_CONTENT = re.compile(r"(\t|\r\n|\r|\n)")
+
+
+def _text(text: str) -> str:
+    if not text:
+        return ""
+    preserve = ' xml:space="preserve"' if text.strip() != text else ""
+    return f"<w:t{preserve}>{escape(text)}</w:t>"
+
+
+def run_xml(text: str, run_properties="") -> str:
+    parts = []
+    for piece in _RUN_CONTENT.split(_INVALID_XML.sub("", text)):
+        if piece == "\t":
+            parts.append("<w:tab/>")
+        elif piece in ("\r\n", "\r", "\n"):
+            parts.append("<w:br/>" * (2 if piece == "\r\n" else 1))
+        else:
+            parts.append(_text(piece))
+    content = run_properties + "".join(parts)
+    return f"<w:r>{content}</w:r>" if content else "<w:r/>"
+
+
+def heading_xml(text: str, level: int) -> str:
+    return f'<w:p><w:pPr><w:pStyle w:val="Heading{level}"/></w:pPr>{run_xml(text)}</w:p>'
+
+
+def diff_paragraph_xml(diff: list[tuple[str, str]]) -> str:
+    if diff == [("(NO CORRECTIONS MADE)", "normal")]:
+        return f"<w:p>{run_xml('(NO CORRECTIONS MADE)')}</w:p>"
+    return "<w:p>" + "".join(run_xml(text, RUN_PROPERTIES[kind]) for text, kind in diff) + "</w:p>"
+
+
+def pair_diff_xml(pair_diff) -> str:
+    """The same paragraphs diff.render_pair_diff adds, as document.xml markup"""
+    resident = pair_diff.pair[0]
+    header_text = f"STUDY: {resident.get('STUDY', '')}\n"
+    header_text += f"INDICATION: {resident.get('INDICATION', '')}\n"
+    header_text += f"ACCESSION NUMBER(S): {resident.get('ACCESSION NUMBER(S)', '')}"
+    return (
+        f'<w:p><w:pPr><w:pStyle w:val="Heading1"/><w:jc w:val="left"/></w:pPr>'
+        f'{run_xml(header_text, "<w:rPr><w:b/></w:rPr>")}</w:p>'
+        + heading_xml("FINDINGS", 2)
+        + diff_paragraph_xml(pair_diff.findings)
+        + heading_xml("IMPRESSION", 2)
+        + diff_paragraph_xml(pair_diff.impression)
+    )
+
+
+class OoxmlDocumentWriter:
+    """
+    Streams report pairs into a .docx one at a time, holding nothing but the zip entry being
+    written. The document is only valid once `close` has written the closing markup.
+    """
+
+    def __init__(self, output_file="report_comparisons.docx"):
+        self.output_file = Path(output_file)
+        self.paths = [self.output_file]
+        self.count = 0
+        self._zip = zipfile.ZipFile(self.output_file, "w", zipfile.ZIP_DEFLATED)
+
+        with zipfile.ZipFile(TEMPLATE) as template:
+            for item in template.infolist():
+                if item.filename != "word/document.xml":
+                    self._zip.writestr(item.filename, template.read(item.filename))
+            document = template.read("word/document.xml").decode("utf-8")
+
+        body = document.index("<w:body>") + len("<w:body>")
+        section = document.index("<w:sectPr", body)
+        self._tail = re.sub(r">\s+<", "><", document[section:]).strip()
+        self._document = self._zip.open("word/document.xml", "w")
+        self._write(re.sub(r">\s+<", "><", document[:body]).strip())
+
+    def _write(self, xml: str):
+        self._document.write(xml.encode("utf-8"))
+
+    def add(self, pair_diff):
+        if self.count:
+            self._write(PAGE_BREAK)
+        self._write(pair_diff_xml(pair_diff))
+        self.count += 1
+
+    def close(self):
+        self._write(self._tail)
+        self._document.close()
+        self._zip.close()
+        print(f"Document saved to {self.output_file}")
+
+
+def write_ooxml_document(pair_diffs, output_file="report_comparisons.docx"):
+    """assemble_document's output, written with OoxmlDocumentWriter"""
+    writer = OoxmlDocumentWriter(output_file)
+    try:
+        for pair_diff in pair_diffs:
+            writer.add(pair_diff)
+    finally:
+        writer.close()
@@ -0,0 +1,89 @@
+"""
+pipeline.py
+Post-processes captured report pairs on a worker pool while the automation loop keeps driving
+the GUI, so that by the end of a run the diff document only needs assembling.
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, wait
+from typing import Callable
+
+from diff import PairDiff, diff_texts
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class PostProcessor:
+    """
+    Parses and diffs every submitted resident/attending pair in the background. Results are
+    returned, or handed to `sink`, in submission order, which is the order the reports were
+    captured in.
+    """
+
+    def __init__(self, workers=2, executor: Executor | None = None, sink: Callable[[PairDiff], None] | None = None):
+        """
+        Args:
+            workers (int): Worker processes to start, the GUI loop itself needs almost no CPU.
+            executor (Executor | None): Pool to submit to instead, e.g. a ThreadPoolExecutor.
+            sink (Callable[[PairDiff], None] | None): Receives each pair once it and every pair
+                before it are done, after which the result is dropped. Finished pairs are queued
+                and handed over on the caller's thread, the next time `submit` or `finish` is
+                called. Without a sink the results are kept until `results` is called.
+        """
+        self.executor = executor if executor is not None else ProcessPoolExecutor(max_workers=workers)
+        self.sink = sink
+        self.futures: deque[Future] = deque()
+        self.delivered = 0
+        self._lock = threading.Lock()
+
+    def submit(self, resident_text: str, attending_text: str) -> Future:
+        future = self.executor.submit(diff_texts, resident_text, attending_text)
+        with self._lock:
+            self.futures.append(future)
+        if self.sink is not None:
+            self._deliver()
+        return future
+
+    def _deliver(self):
+        """Hands finished pairs at the head of the queue to the sink, keeping capture order. Only called from the submitting thread."""
+        with self._lock:
+            while self.futures and self.futures[0].done():
+                future = self.futures.popleft()
+                index = self.delivered
+                self.delivered += 1
+                try:
+                    self.sink(future.result())
+                except KeyError as e:
+                    logger.error(f"Report pair {index} is missing section {e} and will be skipped")
+                except Exception:
+                    logger.exception(f"Report pair {index} could not be written")
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return sum(not future.done() for future in self.futures)
+
+    def finish(self):
+        """Waits for every submitted pair and, with a sink, delivers the ones still queued."""
+        with self._lock:
+            futures = list(self.futures)
+        wait(futures)
+        if self.sink is not None:
+            self._deliver()
+
+    def results(self) -> list[PairDiff]:
+        """Waits for every submitted pair, reports that failed to parse are logged and left out."""
+        pair_diffs = []
+        for index, future in enumerate(self.futures):
+            try:
+                pair_diffs.append(future.result())
+            except KeyError as e:
+                logger.error(f"Report pair {index} is missing section {e} and will be skipped")
+            except Exception:
+                logger.exception(f"Report pair {index} could not be diffed and will be skipped")
+        return pair_diffs
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=False)
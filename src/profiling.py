@@ -0,0 +1,181 @@
+"""
+profiling.py
+Cost counters for the vision primitives: template matching, screen captures and frame comparisons.
+With VISION_PROFILE=1 every call is aggregated by template (or region) and by the automation
+function it was made from, counting calls, wall time, bytes read and pixels worked on. With
+VISION_PROFILE=sample the stacks of every thread are also sampled every few milliseconds and
+written in the collapsed "frame;frame;frame count" format flamegraph.pl, speedscope and inferno read.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+# Modules that only pass vision calls through, skipped when attributing a call to its call site
+PASS_THROUGH_MODULES = {"util", "wait", "state", "capture", "change", "frame", "profiling", "contextlib", "threading"}
+
+# Seconds between stack samples in sampling mode
+SAMPLE_INTERVAL = 0.005
+
+
+@dataclass
+class OpStats:
+    """
+    Attributes:
+        calls (int): Number of calls.
+        seconds (float): Wall time spent in them.
+        bytes (int): Bytes of image data read.
+        pixels (int): Work done: pixel multiplies for a template match, pixels for a capture or comparison.
+    """
+    calls: int = 0
+    seconds: float = 0.0
+    bytes: int = 0
+    pixels: int = 0
+
+
+@dataclass
+class Sample:
+    """Cost of a single call, filled in by the code being measured"""
+    bytes: int = 0
+    pixels: int = 0
+
+
+def call_site() -> str:
+    """module.function of the innermost caller outside the vision layer, "background" for the grabber thread"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "?")
+        if module not in PASS_THROUGH_MODULES:
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "background"
+
+
+class StackSampler:
+    """Counts the stacks of every other thread, sampled every `interval` seconds from a daemon thread"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self._thread.ident:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path: str | Path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class VisionProfile:
+    """Calls, time, bytes and pixels per vision operation, keyed by template/region and by call site"""
+
+    def __init__(self, mode=""):
+        self.mode = mode
+        self.enabled = mode in ("1", "counters", "sample")
+        self.by_key: dict[tuple[str, str], OpStats] = defaultdict(OpStats)
+        self.by_site: dict[tuple[str, str], OpStats] = defaultdict(OpStats)
+        self.sampler: StackSampler | None = None
+        # The background grabber captures from its own thread
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, op: str, key: str) -> Iterator[Sample]:
+        """
+        Times the block as one `op` call on `key`, the block sets the bytes and pixels on the yielded
+        Sample. Call sites check `enabled` first and skip the block entirely when profiling is off,
+        so an unprofiled run never allocates the Sample or the generator.
+        """
+        sample = Sample()
+        if not self.enabled:
+            yield sample
+            return
+        start = time.perf_counter()
+        try:
+            yield sample
+        finally:
+            elapsed = time.perf_counter() - start
+            site = call_site()
+            with self._lock:
+                for stats in (self.by_key[op, key], self.by_site[op, site]):
+                    stats.calls += 1
+                    stats.seconds += elapsed
+                    stats.bytes += sample.bytes
+                    stats.pixels += sample.pixels
+
+    def start(self):
+        """Starts the stack sampler in sampling mode"""
+        if self.mode == "sample" and self.sampler is None:
+            self.sampler = StackSampler().start()
+
+    def stop(self, folded_path: str | Path = "vision_profile.folded") -> Path | None:
+        """Stops the stack sampler and writes its stacks, returns the path written if any"""
+        if self.sampler is None:
+            return None
+        self.sampler.stop()
+        self.sampler.write(folded_path)
+        self.sampler = None
+        return Path(folded_path)
+
+    @staticmethod
+    def _summarise(table: dict[tuple[str, str], OpStats], per: int) -> dict[str, dict[str, float]]:
+        per = max(per, 1)
+        return {
+            f"{op} {name}": {
+                "calls": stats.calls,
+                "seconds": stats.seconds,
+                "mb": stats.bytes / 1e6,
+                "mpixels": stats.pixels / 1e6,
+                "calls_per_report": stats.calls / per,
+                "ms_per_report": stats.seconds * 1000 / per,
+            }
+            for (op, name), stats in sorted(table.items(), key=lambda item: -item[1].seconds)
+        }
+
+    def summary(self, reports=1) -> dict[str, dict[str, float]]:
+        """Totals per operation and template/region, plus their average over `reports` reports"""
+        return self._summarise(self.by_key, reports)
+
+    def site_summary(self, reports=1) -> dict[str, dict[str, float]]:
+        """Totals per operation and call site, plus their average over `reports` reports"""
+        return self._summarise(self.by_site, reports)
+
+
+def region_key(region) -> str:
+    """How a capture or comparison region is named in the counters"""
+    if region is None:
+        return "full"
+    if isinstance(region, str):
+        return region
+    return f"{region[2]}x{region[3]}"
+
+
+vision_profile = VisionProfile(os.getenv("VISION_PROFILE", "").lower())
@@ -0,0 +1,196 @@
+"""
+scroll.py
+Worklist navigation. Measures how far the worklist scrolled by aligning the scroll area before
+and after a scroll, so the automation knows exactly which rows came into view instead of
+sleeping and guessing, and detects page transitions from the worklist's tile fingerprint.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+import cv2
+import numpy as np
+
+from change import fingerprint
+from constants import WORKLIST_ROW_HEIGHT
+from frame import Frame
+from state import UiState
+from util import is_ui_settled
+from wait import WaitCondition, WaitResult, capture_region, changed, wait_until
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+# Tile mean difference that counts as a real change of worklist rows rather than capture noise
+PAGE_MIN_DELTA = 1.0
+
+# Strips with less contrast than this (blank space below the last row) cannot be aligned
+MIN_STRIP_STD = 2.0
+
+
+@dataclass(frozen=True)
+class ScrollOffset:
+    """
+    Attributes:
+        pixels (int | None): How far the content moved up, negative if it moved down. None if
+            the two views no longer overlap and the offset could not be measured.
+        score (float): Correlation of the best alignment, 1.0 for an exact match.
+    """
+    pixels: int | None
+    score: float
+
+    @property
+    def moved(self) -> bool:
+        return self.pixels != 0
+
+    def rows(self, row_height=WORKLIST_ROW_HEIGHT) -> int | None:
+        return None if self.pixels is None else round(self.pixels / row_height)
+
+
+def _strip_starts(height: int, strip_height: int) -> list[int]:
+    """
+    Candidate strip tops, the top strip first since it is still in view after scrolling down,
+    then the bottom strip for scrolling up, then the ones in between
+    """
+    starts = list(range(0, height - strip_height + 1, strip_height))
+    if not starts:
+        return []
+    bottom = height - strip_height
+    return [starts[0], bottom] + [y for y in starts[1:] if y != bottom]
+
+
+def _align(before: np.ndarray, strip: np.ndarray) -> tuple[int, float]:
+    result = cv2.matchTemplate(before, strip, cv2.TM_CCOEFF_NORMED)[:, 0]
+    result = np.nan_to_num(result, nan=-1.0)
+    y = int(np.argmax(result))
+    return y, float(result[y])
+
+
+def estimate_scroll_offset(
+    before: Frame | np.ndarray, after: Frame | np.ndarray, strip_height=2 * WORKLIST_ROW_HEIGHT, min_score=0.98
+) -> ScrollOffset:
+    """
+    Finds a strip of `after` in `before`. Each strip is located on half resolution images first
+    and then refined at full resolution within a couple of pixels. Rows look alike, so only a
+    near exact correlation is accepted; otherwise the next candidate strip is tried.
+
+    Args:
+        before (Frame | np.ndarray): Scroll area captured before scrolling, grayscale if an array.
+        after (Frame | np.ndarray): Scroll area captured after scrolling, same shape as `before`.
+        strip_height (int): Height of the strip of `after` that is aligned.
+        min_score (float): Lowest correlation accepted as an alignment.
+
+    Returns:
+        ScrollOffset: Exact pixel offset, or pixels=None if no alignment reached `min_score`.
+    """
+    before_gray = before.gray if isinstance(before, Frame) else before
+    after_gray = after.gray if isinstance(after, Frame) else after
+    if before_gray.shape != after_gray.shape:
+        raise ValueError(f"Cannot align captures of shape {before_gray.shape} and {after_gray.shape}")
+
+    if np.array_equal(before_gray, after_gray):
+        return ScrollOffset(0, 1.0)
+
+    before_half, after_half = cv2.pyrDown(before_gray), cv2.pyrDown(after_gray)
+    best_score = 0.0
+    for strip_start in _strip_starts(after_gray.shape[0], strip_height):
+        strip = after_gray[strip_start : strip_start + strip_height]
+        if strip.std() < MIN_STRIP_STD:
+            continue
+
+        half_start, half_height = strip_start // 2, strip_height // 2
+        coarse_y, _ = _align(before_half, after_half[half_start : half_start + half_height])
+
+        # Refine around the coarse estimate at full resolution
+        low = max(coarse_y * 2 - 2, 0)
+        high = min(coarse_y * 2 + 2 + strip_height, before_gray.shape[0])
+        y, score = _align(before_gray[low:high], strip)
+        if score >= min_score:
+            return ScrollOffset(low + y - strip_start, score)
+        best_score = max(best_score, score)
+
+    return ScrollOffset(None, best_score)
+
+
+def scroll_page_down(state: UiState, timeout=2.0) -> ScrollOffset:
+    """
+    Sends page down to the worklist and measures how far it scrolled. If the scroll area has not
+    changed within `timeout` the list is at the bottom and the offset is zero. A scroll that did
+    happen is seen as soon as it repaints, so only the bottom of the list waits the full timeout,
+    which is kept at the 2 s the fixed sleep used to give a slow repaint.
+    """
+    before = capture_region(state, "scroll")
+    state.keyboard.send("page down")
+    result = wait_until(state, WaitCondition(
+        name="page down", predicate=changed(before), region="scroll", timeout=timeout, legacy_delay=2.0, settle=True
+    ))
+    state.refresh()
+    if not result.met:
+        return ScrollOffset(0, 1.0)
+
+    offset = estimate_scroll_offset(before, state.frame.sub(state.capture.resolve("scroll")))
+    logger.debug(f"Page down moved the worklist {offset.pixels}px ({offset.rows()} rows, score {offset.score:.3f})")
+    return offset
+
+
+def turn_page(state: UiState, action: Callable[[], None], timeout=10.0, retries=1, grace=1.0) -> WaitResult:
+    """
+    Performs `action` (e.g. clicking Next) and waits for the worklist rows to change, repeating
+    the action up to `retries` more times if the page has not changed within `timeout`. Before
+    each repeat the grid is watched for another `grace` seconds: if it changes after all (a slow
+    page turn landing just after the timeout) the turn is counted once it settles, since acting
+    again would skip a whole page. The action is only repeated if the grid stayed identical.
+
+    Raises:
+        TimeoutError: If the worklist did not change after every attempt.
+    """
+    # Let hover highlights fade first so they are not mistaken for the new page
+    is_ui_settled(state, roi="scroll", stable_frames=2, timeout=2, label="before page turn")
+    reference = fingerprint(capture_region(state, "scroll"))
+    page_changed = changed(reference, min_delta=PAGE_MIN_DELTA)
+    for attempt in range(retries + 1):
+        action()
+        result = wait_until(state, WaitCondition(
+            name="page turn", predicate=page_changed, region="scroll",
+            timeout=timeout, settle=True, required=attempt == retries
+        ))
+        if result.met:
+            state.refresh()
+            return result
+        late = wait_until(state, WaitCondition(
+            name="late page turn", predicate=page_changed, region="scroll", timeout=grace, settle=True
+        ))
+        if late.met:
+            logger.warning(f"Worklist only changed after {timeout + late.elapsed:.1f}s, counting it instead of turning again")
+            state.refresh()
+            return WaitResult(result.name, True, result.elapsed + late.elapsed, result.legacy_delay)
+        logger.warning(f"Worklist stayed identical for {timeout + grace}s, repeating the page turn ({attempt + 1}/{retries})")
+
+
+def _at_top(state: UiState) -> bool:
+    """A single page up that must leave the rows unchanged"""
+    reference = fingerprint(capture_region(state, "scroll"))
+    state.keyboard.send("page up")
+    moved = wait_until(state, WaitCondition(
+        name="top check", predicate=changed(reference, min_delta=PAGE_MIN_DELTA), region="scroll", timeout=0.3
+    ))
+    state.refresh()
+    return not moved.met
+
+
+def jump_to_top(state: UiState, timeout=0.5) -> bool:
+    """
+    Makes sure the focused worklist is at the top. A freshly turned page usually already is, so a
+    page up that leaves the rows unchanged is checked first; only if the list moved is ctrl+home
+    sent and the check repeated. Returns False if the list was still not at the top.
+    """
+    if _at_top(state):
+        return True
+
+    before = capture_region(state, "scroll")
+    state.keyboard.send("ctrl+home")
+    wait_until(state, WaitCondition(
+        name="jump to top", predicate=changed(before, min_delta=PAGE_MIN_DELTA), region="scroll",
+        timeout=timeout, legacy_delay=0.5, settle=True
+    ))
+    return _at_top(state)
@@ -0,0 +1,99 @@
+"""
+sections.py
+Single pass tokenizer splitting copied report text into its sections. Header positions are found
+in one sweep of a precompiled pattern and sections are kept as spans of the normalized text,
+only sliced into strings when they are asked for.
+"""
+
+import re
+from dataclasses import dataclass
+
+KEYS = [
+    "STUDY", "INDICATION", "COMPARISON", "ACCESSION NUMBER(S)", "ORDERING CLINICIAN",
+    "TECHNIQUE", "FINDINGS", "IMPRESSION", "MACRO"
+]
+
+_KEY_ALTERNATION = "|".join(re.escape(key) for key in sorted(KEYS, key=len, reverse=True))
+
+# A key starting a line without a colon, e.g. "IMPRESSION" on a line of its own, is a header too.
+# Line starts are only known before whitespace is collapsed, so these get their colon added first
+_BARE_HEADER = re.compile(r"^[ \t]*(?P<key>" + _KEY_ALTERNATION + r")(?![ \t]*:)(?![A-Za-z])", re.MULTILINE)
+
+# "word:word" gets a space after the colon
+_COLON = re.compile(r"([a-zA-Z]):([a-zA-Z])")
+
+# A header is a key followed by a colon and not preceded by a letter (checked on the few matches
+# rather than with a lookbehind at every position), so "impression" or "FINDINGS" used inside a
+# sentence do not start a section
+_HEADER = re.compile(r"(?P<key>" + _KEY_ALTERNATION + r")\s*:")
+
+_SUBSECTION = re.compile(r"([A-Z][A-Z\s]{2,}:)")
+
+
+def normalize(text: str) -> str:
+    """Escapes and brackets removed, bare headers and colons spaced, then every whitespace run collapsed to one space"""
+    text = text.replace("\\r\\n", "\n").replace("\\n", "\n").replace("[", "").replace("]", "")
+    text = _BARE_HEADER.sub(r"\g<key>:", text)
+    return " ".join(_COLON.sub(r"\1: \2", text).split())
+
+
+def _clean(text: str, start: int, end: int) -> str:
+    return text[start:end].strip(": ").strip()
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedReport:
+    """
+    Attributes:
+        text (str): Normalized report text.
+        spans (dict[str, tuple[int, int]]): Content span of each section found, by header, in
+            report order. The first occurrence of a repeated header wins.
+    """
+    text: str
+    spans: dict[str, tuple[int, int]]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.spans
+
+    def section(self, key: str) -> str:
+        """
+        Raises:
+            KeyError: If the report has no such section.
+        """
+        start, end = self.spans[key]
+        return _clean(self.text, start, end)
+
+    def findings(self) -> dict[str, str]:
+        """
+        FINDINGS split into anatomy subsections such as "LUNGS:". Text before the first
+        subsection header is kept under "GENERAL".
+
+        Raises:
+            KeyError: If the report has no FINDINGS section.
+        """
+        findings = self.section("FINDINGS")
+        subsections = {}
+        header = "GENERAL"
+        position = 0
+        for match in _SUBSECTION.finditer(findings):
+            subsections[header] = _clean(findings, position, match.start())
+            header = match.group(1).strip(": ").upper()
+            position = match.end()
+        subsections[header] = _clean(findings, position, len(findings))
+        return subsections
+
+    def to_dict(self) -> dict:
+        """The {section: text} dict parse_one_json_item returns, with FINDINGS as subsections"""
+        output = {key: self.section(key) for key in self.spans}
+        output["FINDINGS"] = self.findings()
+        return output
+
+
+def tokenize_report(text: str) -> ParsedReport:
+    text = normalize(text)
+    headers = [match for match in _HEADER.finditer(text) if match.start() == 0 or not text[match.start() - 1].isalpha()]
+    spans = {}
+    for index, match in enumerate(headers):
+        end = headers[index + 1].start() if index + 1 < len(headers) else len(text)
+        spans.setdefault(match.group("key"), (match.end(), end))
+    return ParsedReport(text, spans)
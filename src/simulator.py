@@ -0,0 +1,703 @@
+"""
+simulator.py
+Headless stand-in for the reading room workstation. SimulatedWorkstation composes worklist and
+report window frames from the mock/ and template/ screenshots, reacts to clicks, page up/down,
+ctrl+a/c, alt+f4 and esc after configurable latencies and serves report text to the clipboard. It is
+both the capture backend and the input devices of a UiState, so the whole automation loop can
+run on a machine without a display to measure reports/minute, wait overhead and error recovery.
+
+Usage (from the repository root):
+    python src/simulator.py --pairs 30 --page-size 20
+    python src/simulator.py --pairs 30 --open-failure-rate 0.1 --load-failure-rate 0.1
+    python src/simulator.py --pairs 30 --addendum-rate 0.1 --error-dialog-rate 0.1
+"""
+
+import argparse
+import csv
+import heapq
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+import cv2
+import numpy as np
+
+from auto import run
+from capture import CaptureSession
+from constants import (
+    EXPECTED_HEIGHT,
+    EXPECTED_WIDTH,
+    FRAME_ROIS,
+    REPORT_WINDOW_HEIGHT,
+    REPORT_WINDOW_TOP_LEFT,
+    REPORT_WINDOW_WIDTH,
+    SCROLL_BOUNDS_TOP_LEFT,
+    SCROLL_BOUNDS_WIDTH,
+    TEMPLATE_DIR,
+    WORKLIST_ROW_HEIGHT,
+)
+from corpus import CorpusConfig, generate_corpus
+from devices import Devices
+from state import UiState
+from telemetry import telemetry
+from templates import Template, TemplateRegistry
+from triage import ERROR_DIALOG_PREFIX, SKIP, triage_ledger
+from util import find_first_match, find_matches_multi, settle_stats
+from wait import wait_ledger
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+ROOT = Path(__file__).resolve().parent.parent
+WORKLIST_SCREENSHOT = ROOT / "mock" / "sectra_reportlist.png"
+REPORT_SCREENSHOT = ROOT / TEMPLATE_DIR / "report_interface.png"
+
+# Worklist screenshot layout, 15 grid rows starting at y=211 with an empty Accession column at x=888
+FIRST_ROW_TOP = 211
+VISIBLE_ROWS = 15
+ACCESSION_X = 888
+
+# Report window screenshot layout, in window coordinates
+TEXT_AREA = (328, 54, 671, 769)
+TEXT_PAGE = (343, 100, 626, 720)  # the white page below the STUDY header, where the report text goes
+VERSIONS_WIDTH = 320
+VERSION_ROWS = {"attending": 79, "resident": 169}  # tops of the two checked version rows
+VERSION_ROW_HEIGHT = 30
+CHECKBOX = (12, 8, 11, 11)  # inside of the checkbox, relative to its version row
+ADDENDUM_LABEL = (4, 2)  # where an addendum's label is drawn on the text page
+
+# Modal error dialog some reports open instead of their window, in monitor coordinates
+DIALOG = (760, 440, 400, 150)
+DIALOG_TEXT = ["Error", "The report could not be opened.", "It is locked by another user."]
+
+GRID_HEADER = [
+    "Action", "Patient", "Exam", "Accession", "RIS Status", "Job State", "Prev. Author(s)", "Signing Author", "Score"
+]
+READERS = ["Smith, Jordan", "Patel, Ravi", "Nguyen, Linh", "Garcia, Maria"]
+MODIFIERS = {"ctrl", "alt", "shift"}
+
+
+@dataclass(frozen=True)
+class SimulatorConfig:
+    """
+    Attributes:
+        page_size (int): Worklist rows per page.
+        page_rows (int): Rows one page down scrolls, less at the bottom of the list.
+        open_latency (float): Seconds from clicking a score button to the report window appearing.
+        load_latency (float): Seconds from the window appearing to the report text being shown.
+        toggle_latency (float): Seconds from ticking a version checkbox to the text repainting.
+        copy_latency (float): Seconds from ctrl+c to the selected report text being on the clipboard.
+        close_latency (float): Seconds from alt+f4 to the report window closing.
+        scroll_latency (float): Seconds from page up/down or ctrl+home to the worklist moving.
+        page_latency (float): Seconds from clicking Next to the next page being shown.
+        open_failure_rate (float): Chance a score button click never opens its report.
+        load_failure_rate (float): Chance an opened report never finishes loading.
+        error_dialog_rate (float): Chance a click opens an error dialog, dismissed with esc, instead of the report.
+        addendum_rate (float): Chance a report is an addendum, labelled as such once loaded.
+        seed (int): Seed for the injected failures.
+    """
+    page_size: int = 25
+    page_rows: int = VISIBLE_ROWS - 2
+    open_latency: float = 0.4
+    load_latency: float = 0.6
+    toggle_latency: float = 0.2
+    copy_latency: float = 0.1
+    close_latency: float = 0.2
+    scroll_latency: float = 0.1
+    page_latency: float = 0.8
+    open_failure_rate: float = 0.0
+    load_failure_rate: float = 0.0
+    error_dialog_rate: float = 0.0
+    addendum_rate: float = 0.0
+    seed: int = 0
+
+
+def _bgra(path: Path) -> np.ndarray:
+    image = cv2.imread(str(path))
+    if image is None:
+        raise ValueError(f"Simulator screenshot {path} could not be read")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+
+
+def _tint(image: np.ndarray, color: tuple[int, int, int], alpha: float):
+    """Blends `color` over a BGRA view in place"""
+    image[..., :3] = (image[..., :3] * (1 - alpha) + np.array(color) * alpha).astype(np.uint8)
+
+
+def _field(text: str, key: str) -> str:
+    match = re.search(re.escape(key) + r":\s*(.*?)\s*(?:\\n|\n|$)", text)
+    return match.group(1) if match else ""
+
+
+class SimulatedMouse:
+    def __init__(self, workstation: "SimulatedWorkstation"):
+        self.workstation = workstation
+
+    def move(self, x: int, y: int, absolute: bool = True, duration: float = 0):
+        # The mouse module glides over `duration` and blocks meanwhile
+        if duration:
+            time.sleep(duration)
+        self.workstation.on_move(x, y, absolute)
+
+    def click(self, button: str = "left"):
+        self.workstation.on_press(button)
+        self.workstation.on_release(button)
+
+    def press(self, button: str = "left"):
+        self.workstation.on_press(button)
+
+    def release(self, button: str = "left"):
+        self.workstation.on_release(button)
+
+
+class SimulatedKeyboard:
+    def __init__(self, workstation: "SimulatedWorkstation"):
+        self.workstation = workstation
+        self.held: list[str] = []
+
+    def send(self, hotkey: str):
+        self.workstation.on_key(hotkey.lower())
+
+    def press(self, hotkey: str):
+        key = hotkey.lower()
+        if key in MODIFIERS:
+            self.held.append(key)
+        else:
+            self.workstation.on_key("+".join([*self.held, key]))
+
+    def release(self, hotkey: str):
+        if hotkey.lower() in self.held:
+            self.held.remove(hotkey.lower())
+
+
+class SimulatedClipboard:
+    def __init__(self, workstation: "SimulatedWorkstation"):
+        self.workstation = workstation
+
+    def copy(self, text: str):
+        self.workstation.set_clipboard(text)
+
+    def paste(self) -> str:
+        return self.workstation.get_clipboard()
+
+
+class SimulatedWorkstation:
+    """
+    A worklist with one row per report pair of `data` (in the shape UiState.data holds) and the
+    report window each row opens. Implements the capture backend interface (monitors, grab,
+    close) and, through `devices`, the mouse, keyboard and clipboard. Reactions are scheduled on
+    the wall clock and applied when the screen is next grabbed or input arrives, so the
+    automation's waits see the screen change exactly as late as the latencies say.
+
+    Attributes:
+        pairs (list[tuple[str, str]]): (resident, attending) text of every worklist row.
+        failed (set[int]): Rows whose report was made to fail to open or load, or opened an error dialog.
+        addenda (set[int]): Rows whose report is an addendum.
+        templates (TemplateRegistry): The templates, plus one of the simulated error dialog.
+        stats (Counter): Clicks, keys, copies and reports opened, failed and closed.
+    """
+
+    def __init__(
+        self, data: list[dict[str, str]], config: SimulatorConfig | None = None, templates: TemplateRegistry | None = None
+    ):
+        self.config = config or SimulatorConfig()
+        self.templates = templates if templates is not None else TemplateRegistry.load(ROOT / TEMPLATE_DIR)
+        self.pairs = [(data[i]["resident"], data[i + 1]["attending"]) for i in range(0, len(data) - 1, 2)]
+        self.monitor = {"left": 0, "top": 0, "width": EXPECTED_WIDTH, "height": EXPECTED_HEIGHT}
+        self.devices = Devices(SimulatedMouse(self), SimulatedKeyboard(self), SimulatedClipboard(self))
+        self.failed: set[int] = set()
+        self.addenda: set[int] = set()
+        self.stats: Counter = Counter()
+
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.RLock()
+        self._events: list[tuple[float, int, Callable[[], None]]] = []
+        self._sequence = 0
+        self._frame: np.ndarray | None = None
+        self._rows: dict[int, np.ndarray] = {}
+        self._load_screenshots()
+
+        self.page = 0
+        self.scroll = 0
+        self.position = (0, 0)
+        self.pressed = False
+        self.dragged = False
+        self.focused_row: int | None = None
+        self.grid_selected = False
+        self.report: int | None = None
+        self.loaded = False
+        self.checked = {"attending": True, "resident": True}
+        self.shown: str | None = None
+        self.text_selected = False
+        self.dialog = False
+        self.clipboard = ""
+
+    def _load_screenshots(self):
+        worklist = _bgra(WORKLIST_SCREENSHOT)
+        if worklist.shape[:2] != (EXPECTED_HEIGHT, EXPECTED_WIDTH):
+            raise ValueError(f"{WORKLIST_SCREENSHOT} is not {EXPECTED_WIDTH}x{EXPECTED_HEIGHT}")
+        self._background = worklist
+        left = SCROLL_BOUNDS_TOP_LEFT.x
+        tops = [FIRST_ROW_TOP + i * WORKLIST_ROW_HEIGHT for i in range(VISIBLE_ROWS)]
+        self._row_images = [worklist[top : top + WORKLIST_ROW_HEIGHT, left : left + SCROLL_BOUNDS_WIDTH] for top in tops]
+        self._empty_row = np.empty_like(self._row_images[0])
+        self._empty_row[:] = self._row_images[1][2, 200]
+
+        # Score buttons in the screenshot, as (x, y, width, height) relative to their row
+        self._buttons: dict[int, tuple[int, int, int, int]] = {}
+        self._scores: dict[int, str] = {}
+        matches = find_matches_multi(worklist, self.templates.matching("score_button"), region=FRAME_ROIS["scroll"])
+        for match in matches:
+            row = (match.y - FIRST_ROW_TOP) // WORKLIST_ROW_HEIGHT
+            self._buttons[row] = (match.x - left, match.y - tops[row], match.width, match.height)
+            self._scores[row] = "4 - Totally Agree" if match.template.startswith("score_button_4") else "No Score"
+
+        next_button = self.templates["next_button"]
+        x, y = find_first_match(worklist, next_button, threshold=0.9)
+        self._next_button = (x, y, next_button.width, next_button.height)
+        self._next_cover = worklist[y : y + next_button.height, x - 4 : x - 3].copy()
+
+        window = _bgra(REPORT_SCREENSHOT)
+        if window.shape[:2] != (REPORT_WINDOW_HEIGHT, REPORT_WINDOW_WIDTH):
+            raise ValueError(f"{REPORT_SCREENSHOT} is not {REPORT_WINDOW_WIDTH}x{REPORT_WINDOW_HEIGHT}")
+        self._window = window
+        # While loading the text area is blank, apart from its top edge which the open indicator overlaps
+        self._window_loading = window.copy()
+        x, y, w, h = TEXT_AREA
+        self._window_loading[y + 6 : y + h, x : x + w] = window[y + 6, x + 4]
+
+        label = cv2.imread(str(ROOT / TEMPLATE_DIR / "report_addendum_label.png"), cv2.IMREAD_UNCHANGED)
+        alpha = label[..., 3:] / 255.0
+        self._addendum_label = np.dstack([(label[..., :3] * alpha + 255 * (1 - alpha)).astype(np.uint8), label[..., 3]])
+
+        x, y, w, h = DIALOG
+        dialog = np.full((h, w, 4), 240, np.uint8)
+        dialog[:30] = (215, 120, 0, 255)
+        cv2.rectangle(dialog, (0, 0), (w - 1, h - 1), (90, 90, 90, 255), 1)
+        for number, line in enumerate(DIALOG_TEXT):
+            color = (255, 255, 255, 255) if number == 0 else (30, 30, 30, 255)
+            cv2.putText(dialog, line, (12, 20 + number * 40), cv2.FONT_HERSHEY_SIMPLEX, 0.55, color, 1, cv2.LINE_AA)
+        self._dialog = dialog
+        # No real error dialog is in TEMPLATE_DIR, so triage is taught this one
+        gray = np.ascontiguousarray(cv2.cvtColor(dialog, cv2.COLOR_BGRA2GRAY))
+        template = Template(f"{ERROR_DIALOG_PREFIX}_simulated", Path("<simulated>"), gray, w, h)
+        self.templates = TemplateRegistry({**{t.name: t for t in self.templates}, template.name: template})
+
+    # Clock
+
+    def _schedule(self, delay: float, action: Callable[[], None]):
+        heapq.heappush(self._events, (time.monotonic() + delay, self._sequence, action))
+        self._sequence += 1
+
+    def _advance(self):
+        now = time.monotonic()
+        while self._events and self._events[0][0] <= now:
+            _, _, action = heapq.heappop(self._events)
+            action()
+            self._frame = None
+
+    # Worklist
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-len(self.pairs) // self.config.page_size))
+
+    def page_rows(self) -> range:
+        start = self.page * self.config.page_size
+        return range(start, min(start + self.config.page_size, len(self.pairs)))
+
+    def _max_scroll(self) -> int:
+        return max(0, (len(self.page_rows()) - VISIBLE_ROWS) * WORKLIST_ROW_HEIGHT)
+
+    def accession(self, index: int) -> str:
+        return _field(self.pairs[index][0], "ACCESSION NUMBER(S)") or str(index)
+
+    def grid_text(self) -> str:
+        """The current page as the grid copies it, tab separated with multi-line cells quoted"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter="\t", lineterminator="\r\n")
+        writer.writerow(GRID_HEADER)
+        signed = datetime(2024, 7, 18, 16, 44)
+        for index in self.page_rows():
+            date = signed - timedelta(minutes=7 * index)
+            date_text = f"{date.month}/{date.day}/{date.year} {date.hour % 12 or 12}:{date.minute:02d} {'pm' if date.hour >= 12 else 'am'}"
+            study = _field(self.pairs[index][0], "STUDY")
+            writer.writerow([
+                "", "", f"{study}\n{study.split()[0] if study else ''}", self.accession(index), "Final\nNormal",
+                f"{date_text}\nSigned", "Lee, Casey", READERS[index % len(READERS)],
+                self._scores.get(index % VISIBLE_ROWS, "No Score"),
+            ])
+        return buffer.getvalue()
+
+    def _row_image(self, index: int) -> np.ndarray:
+        if index not in self._rows:
+            row = self._row_images[index % VISIBLE_ROWS].copy()
+            cv2.putText(
+                row, self.accession(index), (ACCESSION_X - SCROLL_BOUNDS_TOP_LEFT.x, 17),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.42, (230, 230, 230, 255), 1, cv2.LINE_AA,
+            )
+            self._rows[index] = row
+        return self._rows[index]
+
+    def _row_at(self, x: int, y: int) -> int | None:
+        """Index of the worklist row under a screen point"""
+        left = SCROLL_BOUNDS_TOP_LEFT.x
+        if not (left <= x < left + SCROLL_BOUNDS_WIDTH and FIRST_ROW_TOP <= y < FIRST_ROW_TOP + VISIBLE_ROWS * WORKLIST_ROW_HEIGHT):
+            return None
+        offset = (y - FIRST_ROW_TOP + self.scroll) // WORKLIST_ROW_HEIGHT
+        rows = self.page_rows()
+        return rows[offset] if offset < len(rows) else None
+
+    def _button_at(self, x: int, y: int) -> int | None:
+        """Index of the row whose score button is under a screen point"""
+        index = self._row_at(x, y)
+        if index is None or index % VISIBLE_ROWS not in self._buttons:
+            return None
+        bx, by, bw, bh = self._buttons[index % VISIBLE_ROWS]
+        row_top = FIRST_ROW_TOP + (index - self.page_rows()[0]) * WORKLIST_ROW_HEIGHT - self.scroll
+        bx += SCROLL_BOUNDS_TOP_LEFT.x
+        by += row_top
+        return index if bx <= x < bx + bw and by <= y < by + bh else None
+
+    # Report window
+
+    def _view(self) -> str | None:
+        if self.checked["attending"]:
+            return "both" if self.checked["resident"] else "attending"
+        return "resident" if self.checked["resident"] else None
+
+    def report_text(self) -> str:
+        """Text of the version on screen, the attending version when both are"""
+        resident, attending = self.pairs[self.report]
+        return resident if self.shown == "resident" else attending
+
+    def _open(self, index: int):
+        self.stats["opened"] += 1
+        open_fails = self._rng.random() < self.config.open_failure_rate
+        load_fails = self._rng.random() < self.config.load_failure_rate
+        dialog = self._rng.random() < self.config.error_dialog_rate
+        addendum = self._rng.random() < self.config.addendum_rate
+        if open_fails:
+            self.failed.add(index)
+            self.stats["open failures"] += 1
+            logger.info(f"Simulating report {self.accession(index)} never opening")
+            return
+        if dialog:
+            self.failed.add(index)
+            self.stats["error dialogs"] += 1
+            logger.info(f"Simulating report {self.accession(index)} opening an error dialog")
+            self._schedule(self.config.open_latency, lambda: setattr(self, "dialog", True))
+            return
+        if addendum:
+            self.addenda.add(index)
+            self.stats["addenda"] += 1
+
+        def show():
+            self.report, self.loaded, self.text_selected = index, False, False
+            self.checked = {"attending": True, "resident": True}
+            self.shown = "both"
+
+        def load():
+            if self.report == index:
+                self.loaded = True
+
+        self._schedule(self.config.open_latency, show)
+        if load_fails:
+            self.failed.add(index)
+            self.stats["load failures"] += 1
+            logger.info(f"Simulating report {self.accession(index)} never loading")
+        else:
+            self._schedule(self.config.open_latency + self.config.load_latency, load)
+
+    def _close(self):
+        if self.report is not None:
+            self.stats["closed"] += 1
+        self.report, self.loaded, self.text_selected, self.shown = None, False, False, None
+
+    def _toggle(self, version: str):
+        report = self.report
+        self.checked[version] = not self.checked[version]
+        self.text_selected = False
+
+        def repaint():
+            if self.report == report:
+                self.shown = self._view()
+
+        self._schedule(self.config.toggle_latency, repaint)
+
+    def _window_point(self, x: int, y: int) -> tuple[int, int] | None:
+        wx, wy = x - REPORT_WINDOW_TOP_LEFT.x, y - REPORT_WINDOW_TOP_LEFT.y
+        return (wx, wy) if 0 <= wx < REPORT_WINDOW_WIDTH and 0 <= wy < REPORT_WINDOW_HEIGHT else None
+
+    # Input
+
+    def on_move(self, x: int, y: int, absolute: bool):
+        with self._lock:
+            self._advance()
+            if not absolute:
+                x, y = self.position[0] + x, self.position[1] + y
+            self.position = (int(x), int(y))
+            self.dragged = self.dragged or self.pressed
+            self._frame = None
+
+    def on_press(self, button: str):
+        with self._lock:
+            self._advance()
+            if button == "left":
+                self.pressed, self.dragged = True, False
+
+    def on_release(self, button: str):
+        with self._lock:
+            self._advance()
+            if button != "left" or not self.pressed:
+                return
+            self.pressed = False
+            if self.dragged:
+                if self.report is not None and self.loaded:
+                    self.text_selected = True
+            else:
+                self.stats["clicks"] += 1
+                self._click(*self.position)
+            self._frame = None
+
+    def _click(self, x: int, y: int):
+        if self.dialog:
+            return
+        if self.report is not None:
+            point = self._window_point(x, y)
+            if point is None:
+                return
+            wx, wy = point
+            self.text_selected = False
+            if self.loaded and wx < VERSIONS_WIDTH:
+                for version, top in VERSION_ROWS.items():
+                    if top <= wy < top + VERSION_ROW_HEIGHT:
+                        self._toggle(version)
+            return
+
+        self.grid_selected = False
+        nx, ny, nw, nh = self._next_button
+        if nx <= x < nx + nw and ny <= y < ny + nh and self.page < self.pages - 1:
+            self._schedule(self.config.page_latency, self._next_page)
+            return
+        self.focused_row = self._row_at(x, y)
+        index = self._button_at(x, y)
+        if index is not None:
+            self._open(index)
+
+    def _next_page(self):
+        if self.page < self.pages - 1:
+            self.page += 1
+            self.scroll, self.focused_row, self.grid_selected = 0, None, False
+
+    def _scroll_to(self, target: Callable[[], int]):
+        def scroll():
+            self.scroll = min(max(target(), 0), self._max_scroll())
+
+        self._schedule(self.config.scroll_latency, scroll)
+
+    def on_key(self, hotkey: str):
+        with self._lock:
+            self._advance()
+            self.stats["keys"] += 1
+            page = self.config.page_rows * WORKLIST_ROW_HEIGHT
+            if self.dialog:
+                if hotkey in ("esc", "enter"):
+                    self._schedule(self.config.close_latency, lambda: setattr(self, "dialog", False))
+            elif self.report is not None:
+                if hotkey == "ctrl+c" and self.loaded and self.text_selected and self.shown is not None:
+                    text = self.report_text()
+                    self.stats["copies"] += 1
+                    self._schedule(self.config.copy_latency, lambda: setattr(self, "clipboard", text))
+                elif hotkey == "alt+f4":
+                    self._schedule(self.config.close_latency, self._close)
+            elif hotkey == "page down":
+                self._scroll_to(lambda: self.scroll + page)
+            elif hotkey == "page up":
+                self._scroll_to(lambda: self.scroll - page)
+            elif hotkey == "ctrl+home":
+                self._scroll_to(lambda: 0)
+            elif hotkey == "ctrl+a":
+                self.grid_selected = True
+            elif hotkey == "ctrl+c" and self.grid_selected:
+                self.clipboard = self.grid_text()
+            self._frame = None
+
+    def set_clipboard(self, text: str):
+        with self._lock:
+            self.clipboard = text
+
+    def get_clipboard(self) -> str:
+        with self._lock:
+            self._advance()
+            return self.clipboard
+
+    # Rendering
+
+    def _render_worklist(self, frame: np.ndarray):
+        rows = self.page_rows()
+        first = self.scroll // WORKLIST_ROW_HEIGHT
+        images = [
+            self._row_image(rows[i]) if i < len(rows) else self._empty_row
+            for i in range(first, first + VISIBLE_ROWS + 1)
+        ]
+        offset = self.scroll - first * WORKLIST_ROW_HEIGHT
+        view = np.vstack(images)[offset : offset + VISIBLE_ROWS * WORKLIST_ROW_HEIGHT]
+
+        left = SCROLL_BOUNDS_TOP_LEFT.x
+        target = frame[FIRST_ROW_TOP : FIRST_ROW_TOP + view.shape[0], left : left + SCROLL_BOUNDS_WIDTH]
+        target[:] = view
+        if self.grid_selected:
+            visible = min(len(rows) * WORKLIST_ROW_HEIGHT - self.scroll, target.shape[0])
+            _tint(target[:visible], (215, 120, 0), 0.35)
+        if self.focused_row is not None and self.focused_row in rows:
+            top = (self.focused_row - rows[0]) * WORKLIST_ROW_HEIGHT - self.scroll
+            if 0 <= top < target.shape[0]:
+                cv2.rectangle(target, (0, top), (target.shape[1] - 1, top + WORKLIST_ROW_HEIGHT - 1), (200, 200, 200, 255), 1)
+
+        hovered = None if self.report is not None else self._button_at(*self.position)
+        if hovered is not None:
+            bx, by, bw, bh = self._buttons[hovered % VISIBLE_ROWS]
+            top = (hovered - rows[0]) * WORKLIST_ROW_HEIGHT - self.scroll + by
+            _tint(target[max(top, 0) : top + bh, bx : bx + bw], (255, 200, 150), 0.3)
+
+        if self.page == self.pages - 1:
+            x, y, w, h = self._next_button
+            frame[y : y + h, x : x + w] = self._next_cover
+
+    def _render_window(self) -> np.ndarray:
+        if not self.loaded:
+            return self._window_loading
+        window = self._window.copy()
+        for version, top in VERSION_ROWS.items():
+            if not self.checked[version]:
+                x, y, w, h = CHECKBOX
+                window[top + y : top + y + h, x : x + w] = 255
+
+        x, y, w, h = TEXT_PAGE
+        page = window[y : y + h, x : x + w]
+        page[:] = 255
+        if self.shown is not None:
+            label = {"both": "Comparing attending and resident versions"}.get(self.shown, f"Showing {self.shown} version")
+            lines = [label, ""]
+            for paragraph in self.report_text().replace("\\r\\n", "\n").replace("\\n", "\n").splitlines():
+                lines += textwrap.wrap(paragraph, 90) or [""]
+            for number, line in enumerate(lines[: h // 18 - 1]):
+                cv2.putText(page, line, (4, 18 + number * 18), cv2.FONT_HERSHEY_SIMPLEX, 0.42, (60, 60, 60, 255), 1, cv2.LINE_AA)
+        if self.report in self.addenda:
+            lx, ly = ADDENDUM_LABEL
+            lh, lw = self._addendum_label.shape[:2]
+            page[ly : ly + lh, lx : lx + lw] = self._addendum_label
+        if self.text_selected:
+            _tint(page, (255, 153, 51), 0.35)
+        return window
+
+    def _render(self) -> np.ndarray:
+        frame = self._background.copy()
+        self._render_worklist(frame)
+        if self.report is not None:
+            x, y = REPORT_WINDOW_TOP_LEFT
+            frame[y : y + REPORT_WINDOW_HEIGHT, x : x + REPORT_WINDOW_WIDTH] = self._render_window()
+        if self.dialog:
+            x, y, w, h = DIALOG
+            frame[y : y + h, x : x + w] = self._dialog
+        return frame
+
+    # Capture backend
+
+    @property
+    def monitors(self) -> list[dict[str, int]]:
+        return [self.monitor, self.monitor]
+
+    def grab(self, rect: dict[str, int]) -> np.ndarray:
+        with self._lock:
+            self._advance()
+            if self._frame is None:
+                self._frame = self._render()
+            frame = self._frame
+        x = rect["left"] - self.monitor["left"]
+        y = rect["top"] - self.monitor["top"]
+        return frame[y : y + rect["height"], x : x + rect["width"]]
+
+    def close(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=SimulatorConfig.page_size)
+    parser.add_argument("--edit-rate", type=float, default=CorpusConfig.edit_rate)
+    parser.add_argument("--open-failure-rate", type=float, default=0.0)
+    parser.add_argument("--load-failure-rate", type=float, default=0.0)
+    parser.add_argument("--error-dialog-rate", type=float, default=0.0)
+    parser.add_argument("--addendum-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="where the run writes its outputs, a new temp dir by default")
+    args = parser.parse_args()
+
+    data = generate_corpus(args.pairs, CorpusConfig(edit_rate=args.edit_rate), seed=args.seed)
+    workstation = SimulatedWorkstation(data, SimulatorConfig(
+        page_size=args.page_size, open_failure_rate=args.open_failure_rate,
+        load_failure_rate=args.load_failure_rate, error_dialog_rate=args.error_dialog_rate,
+        addendum_rate=args.addendum_rate, seed=args.seed,
+    ))
+
+    # The run writes its journal, pickle and documents to the working directory
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="simulated_run_"))
+    (workdir / "screen_text_grid").mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir)
+
+    ui_state = UiState(CaptureSession(workstation.monitor, workstation), workstation.devices, workstation.templates)
+    start = time.monotonic()
+    run(ui_state=ui_state)
+    elapsed = time.monotonic() - start
+
+    data = ui_state.data
+    captured = [
+        (data[i]["resident"], data[i + 1]["attending"])
+        for i in range(len(data) - 1)
+        if "resident" in data[i] and "attending" in data[i + 1]
+    ]
+    uncaptured = workstation.failed | workstation.addenda
+    expected = [pair for index, pair in enumerate(workstation.pairs) if index not in uncaptured]
+    waited = sum(result.elapsed for results in wait_ledger.results.values() for result in results)
+
+    print(f"Captured {len(captured)} of {len(workstation.pairs)} report pairs in {elapsed:.1f}s, "
+          f"{len(captured) / elapsed * 60:.1f} reports/min, outputs in {workdir}")
+    print(f"Condition waits {waited:.1f}s ({wait_ledger.total_saved:.1f}s saved over fixed sleeps)")
+    for name, summary in sorted(wait_ledger.summary().items(), key=lambda item: -item[1]["count"] * item[1]["mean_elapsed"]):
+        print(f"  {name:<24} {summary['count']:>4}x  mean {summary['mean_elapsed']:.2f}s  timeouts {summary['timeouts']}")
+    print("Phases:")
+    for name, summary in sorted(telemetry.summary().items(), key=lambda item: -item[1]["total"]):
+        print(f"  {name:<24} {summary['count']:>4}x  p50 {summary['p50']:.2f}s  p95 {summary['p95']:.2f}s  max {summary['max']:.2f}s")
+    print(f"UI settles: {settle_stats.summary()}")
+    print(f"Workstation: {dict(workstation.stats)}")
+    print(f"Triage: {triage_ledger.summary()}")
+
+    if captured != expected:
+        missing = [workstation.accession(i) for i, pair in enumerate(workstation.pairs) if i not in uncaptured and pair not in captured]
+        print(f"FAILED: expected {len(expected)} pairs without injected failures, missing {missing}")
+        return 1
+    addenda = sorted(workstation.accession(i) for i in workstation.addenda)
+    if sorted(triage_ledger.accessions(SKIP)) != addenda:
+        print(f"FAILED: skipped {triage_ledger.accessions(SKIP)} as addenda, expected {addenda}")
+        return 1
+    print(f"OK: every report without an injected failure was captured exactly "
+          f"({len(workstation.failed)} failures injected, {len(addenda)} addenda skipped)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,11 +3,12 @@ state.py
 Exposes UiState class which manages the table and scroll area state.
 """
 
-import pyautogui
 import mss.tools
 import numpy as np
 from mss import mss
 import pickle
+import time
+from typing import Callable
 
 from screen_parse import is_contained
 
@@ -20,6 +21,14 @@ from screen_types import (
 )
 
 from coordinate import AbsoluteCoordinate
+from templates import TemplateRegistry
+from frame import Frame
+from capture import CaptureSession, FrameGrabber, MssBackend
+from devices import Devices
+from profiling import vision_profile
+from journal import CaptureJournal
+from pipeline import PostProcessor
+from worklist import WorklistIndex, WorklistRow
 
 from constants import (
     EXPECTED_WIDTH,
@@ -36,6 +45,9 @@ from logging_config import setup_logger
 
 logger = setup_logger(__name__)
 
+# Longest a refresh waits on the background grabber before assuming capture has stalled
+GRABBER_STALL_TIMEOUT = 5
+
 # def get_current_monitor():
 #     """
 #     Identifies which monitor the mouse cursor is currently on and returns
@@ -80,12 +92,59 @@ def verify_monitor_dimensions(monitor_info):
 
 class UiState:
     def __init__(
-        self
+        self,
+        capture: CaptureSession | None = None,
+        devices: Devices | None = None,
+        templates: TemplateRegistry | None = None,
     ):
-        self.current_monitor = None
+        """
+        Args:
+            capture (CaptureSession | None): Session to capture from, e.g. one built with
+                CaptureSession.from_pngs for headless runs. By default the monitor under the
+                mouse cursor is located and a live session is opened on it.
+            devices (Devices | None): Mouse, keyboard and clipboard to drive, the real ones by default.
+            templates (TemplateRegistry | None): Templates to match, loaded from TEMPLATE_DIR by default.
+        """
+        # Fail fast on a missing/corrupt template
+        self.templates = templates if templates is not None else TemplateRegistry.load()
+        devices = devices if devices is not None else Devices.live()
+        self.mouse = devices.mouse
+        self.keyboard = devices.keyboard
+        self.clipboard = devices.clipboard
+        self.capture = capture if capture is not None else CaptureSession(self.locate_monitor())
+        self.current_monitor = self.capture.monitor
+        self.frame = self.capture.grab()
+        self.top_left = AbsoluteCoordinate(x=self.current_monitor["left"], y=self.current_monitor["top"])
+
+        scroll_top_left = SCROLL_BOUNDS_TOP_LEFT.to_absolute(self.top_left)
+        header_top_left = HEADER_BOUNDS_TOP_LEFT.to_absolute(self.top_left)
+        self.scroll_bounds = (*scroll_top_left, SCROLL_BOUNDS_WIDTH, SCROLL_BOUNDS_HEIGHT)
+        self.header_bounds = (*header_top_left, HEADER_BOUNDS_WIDTH, HEADER_BOUNDS_HEIGHT)
+        self.data = []
+        self.grabber: FrameGrabber | None = None
+
+        # Position of the report currently being captured, used to key the capture journal
+        self.journal: CaptureJournal | None = None
+        self.postprocessor: PostProcessor | None = None
+        self.page = 0
+        self.page_ordinal = 0
+
+        # Rows parsed from the worklist grid text, and the row whose report is currently open
+        self.worklist = WorklistIndex()
+        self.current_row: WorklistRow | None = None
+
+        # Screen y of the first row's score button at the top of the page, and how far the
+        # worklist has scrolled since (None once a scroll could not be measured)
+        self.row_origin_y: int | None = None
+        self.scroll_px: int | None = 0
+
+    @staticmethod
+    def locate_monitor() -> dict[str, int]:
+        """Finds the monitor which contains the mouse cursor"""
+        import pyautogui
+
         mouse_x, mouse_y = pyautogui.position()
 
-        # Find current monitor based on which screen contains the scroll bounds
         with mss() as sct:
             for i, monitor in enumerate(sct.monitors):
                 # sct.monitors[0] is the bounding box of all monitors
@@ -101,36 +160,93 @@ class UiState:
                     logger.info(f"  Monitor dimensions: {monitor['width']}x{monitor['height']}")
                     logger.info(f"  Monitor top-left: ({monitor['left']}, {monitor['top']})")
                     verify_monitor_dimensions(monitor)
-                    self.current_monitor = monitor
-                    break
-            else:
-                raise ValueError("Error: Mouse cursor not found on any defined monitor.")
+                    return dict(monitor)
 
+        raise ValueError("Error: Mouse cursor not found on any defined monitor.")
 
-            screenshot = sct.grab(
-                self.current_monitor
-            )  # exclude 0th "monitor" which is the entire screen
-            frame = np.array(screenshot)[:, :, :3]  # BGRA -> RGB
+    def refresh(self):
+        """Updates the internal table state based on new elements on screen"""
+        # Invariant: application always stays on the same screen
+        if not vision_profile.enabled:
+            self.frame = self._next_frame()
+            return
+        with vision_profile.measure("refresh", "grabber" if self.grabber is not None else "capture") as sample:
+            self.frame = self._next_frame()
+            sample.bytes, sample.pixels = self.frame.raw.nbytes, self.frame.shape[0] * self.frame.shape[1]
 
-        self.screen = frame
-        self.top_left = AbsoluteCoordinate(x=self.current_monitor["left"], y=self.current_monitor["top"])
+    def _next_frame(self) -> Frame:
+        if self.grabber is not None:
+            return self.grabber.wait_for_frame(time.monotonic(), timeout=GRABBER_STALL_TIMEOUT)
+        return self.capture.grab()  # drops every view derived from the old frame
 
-        scroll_top_left = SCROLL_BOUNDS_TOP_LEFT.to_absolute(self.top_left)
-        header_top_left = HEADER_BOUNDS_TOP_LEFT.to_absolute(self.top_left)
-        self.scroll_bounds = (*scroll_top_left, SCROLL_BOUNDS_WIDTH, SCROLL_BOUNDS_HEIGHT)
-        self.header_bounds = (*header_top_left, HEADER_BOUNDS_WIDTH, HEADER_BOUNDS_HEIGHT)
-        self.data = []
+    def grab(self, region: str | tuple[int, int, int, int]) -> Frame:
+        """Captures only a named (see constants.FRAME_ROIS) or explicit region, leaving self.frame untouched"""
+        return self.capture.grab(region)
 
-    def refresh(self):
-        """Updates the internal table state based on new elements on screen"""
-        with mss() as sct:
-            screenshot = sct.grab(
-                self.current_monitor
-            )  # Invariant: application always stays on the same screen
-            frame = np.array(screenshot)[:, :, :3]
-        self.screen = frame
+    def start_grabber(self, fps=20.0, capacity=8):
+        """Starts capturing frames in the background, refresh and wait_for then block on new frames instead of sleeping"""
+        if self.grabber is not None:
+            return
+        backend = self.capture.backend
+        factory = MssBackend if isinstance(backend, MssBackend) else (lambda: backend)
+        self.grabber = FrameGrabber(self.current_monitor, factory, fps=fps, capacity=capacity).start()
+        logger.info(f"Background frame grabber started at {fps} fps with {capacity} buffered frames")
+
+    def stop_grabber(self):
+        if self.grabber is not None:
+            self.grabber.stop()
+            logger.info(f"Background frame grabber stopped after {self.grabber.frames_captured} frames")
+            self.grabber = None
+
+    def wait_for(self, predicate: Callable[[Frame], bool], timeout: float | None = 10, poll_interval=0.5) -> Frame:
+        """
+        Blocks until predicate(frame) holds for a freshly captured frame and returns that frame.
+        With the grabber running every new frame is checked as soon as it arrives, otherwise the
+        screen is polled every `poll_interval` seconds.
+
+        Raises:
+            TimeoutError: If the predicate does not hold within `timeout` seconds (None waits forever).
+        """
+        if self.grabber is not None:
+            self.frame = self.grabber.wait_for(predicate, timeout)
+            return self.frame
+
+        start_time = time.monotonic()
+        while True:
+            self.refresh()
+            if predicate(self.frame):
+                return self.frame
+            if timeout is not None and time.monotonic() - start_time + poll_interval > timeout:
+                raise TimeoutError(f"Condition not met within {timeout} seconds")
+            time.sleep(poll_interval)
+
+    def close(self):
+        self.stop_grabber()
+        self.capture.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self.postprocessor is not None:
+            self.postprocessor.close()
+
+    @property
+    def screen(self) -> np.ndarray:
+        """BGR view of the latest capture"""
+        return self.frame.bgr
+
+    def record(self, reader: str, text: str):
+        """
+        Keeps a captured report in memory and appends it to the journal, if one is open. A
+        completed resident/attending pair is queued for post-processing straight away.
+        """
+        self.data.append({reader: text})
+        if self.journal is not None:
+            accession = self.current_row.accession if self.current_row is not None else None
+            self.journal.append(self.page, self.page_ordinal, reader, text, accession=accession or None)
+        if self.postprocessor is not None and reader == "attending" and len(self.data) >= 2 and "resident" in self.data[-2]:
+            self.postprocessor.submit(self.data[-2]["resident"], text)
 
     def save(self):
+        """Snapshot of everything captured this run; the journal is the crash-safe record, call this once at the end"""
         with open("report_data.pkl", "wb") as f:
             pickle.dump(self.data, f)
 
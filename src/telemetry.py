@@ -0,0 +1,127 @@
+"""
+telemetry.py
+Per-report phase timings. Each phase of the automation loop runs inside a span, which is kept as a
+latency sample for its phase and added to the report being captured, so a run ends with
+p50/p95/max per phase, a reports/min rate and a per-report breakdown dumped to JSON and CSV.
+"""
+
+import csv
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+
+def summarize(durations: list[float]) -> dict[str, float]:
+    """Count, p50, p95, max and total of a non-empty list of durations in seconds"""
+    ordered = sorted(durations)
+    return {
+        "count": len(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+        "total": sum(ordered),
+    }
+
+
+@dataclass
+class ReportTiming:
+    """
+    Attributes:
+        accession (str | None): Accession of the worklist row, None if it was not known.
+        page (int): Worklist page the report was opened from.
+        ordinal (int): Position of the report on its page.
+        status (str): "captured", or the step that failed, e.g. "open failed".
+        elapsed (float): Seconds from opening the report to finishing with it.
+        phases (dict[str, float]): Seconds spent in each phase, summed if a phase ran repeatedly.
+    """
+    accession: str | None
+    page: int
+    ordinal: int
+    status: str = "open"
+    elapsed: float = 0.0
+    phases: dict[str, float] = field(default_factory=dict)
+
+
+class Telemetry:
+    """Latency samples per phase and the timing of every report opened this run"""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.reports: list[ReportTiming] = []
+        self.current: ReportTiming | None = None
+        self.started: float | None = None
+        self._report_start = 0.0
+
+    @contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        """Times the block as one sample of `phase`, also counted towards the current report"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.samples[phase].append(elapsed)
+            if self.current is not None:
+                self.current.phases[phase] = self.current.phases.get(phase, 0.0) + elapsed
+
+    def start_report(self, accession: str | None, page: int, ordinal: int) -> ReportTiming:
+        if self.started is None:
+            self.started = time.monotonic()
+        self.current = ReportTiming(accession, page, ordinal)
+        self._report_start = time.perf_counter()
+        return self.current
+
+    def finish_report(self, status="captured") -> ReportTiming | None:
+        report = self.current
+        if report is None:
+            return None
+        report.status = status
+        report.elapsed = time.perf_counter() - self._report_start
+        self.reports.append(report)
+        self.current = None
+        return report
+
+    @property
+    def captured(self) -> int:
+        return sum(report.status == "captured" for report in self.reports)
+
+    @property
+    def rate(self) -> float:
+        """Captured reports per minute since the first report was opened"""
+        if self.started is None:
+            return 0.0
+        minutes = (time.monotonic() - self.started) / 60
+        return self.captured / minutes if minutes > 0 else 0.0
+
+    def progress(self, remaining: int) -> str:
+        """One line progress report, `remaining` being the reports still to open"""
+        line = f"{self.captured} reports captured ({len(self.reports) - self.captured} failed), {self.rate:.1f} reports/min"
+        if self.rate > 0:
+            eta = remaining / self.rate * 60
+            line += f", {remaining} seen rows left, ETA {int(eta // 60)}m{int(eta % 60):02d}s"
+        return line
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {phase: summarize(samples) for phase, samples in self.samples.items()}
+
+    def dump(self, json_path: str | Path = "report_timings.json", csv_path: str | Path = "report_timings.csv"):
+        """Writes the per-report timings, and the per-phase summary to the JSON file"""
+        with open(json_path, "w") as f:
+            json.dump({"phases": self.summary(), "reports": [asdict(report) for report in self.reports]}, f, indent=2)
+
+        phases = sorted({phase for report in self.reports for phase in report.phases})
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["accession", "page", "ordinal", "status", "elapsed", *phases])
+            for report in self.reports:
+                writer.writerow([
+                    report.accession or "", report.page, report.ordinal, report.status, f"{report.elapsed:.3f}",
+                    *(f"{report.phases[phase]:.3f}" if phase in report.phases else "" for phase in phases),
+                ])
+
+
+telemetry = Telemetry()
@@ -0,0 +1,149 @@
+"""
+templates.py
+Exposes the TemplateRegistry which loads every template image once at startup so that
+the matching functions never touch the disk on the hot path.
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from screen_types import ArrayPoint
+from constants import EXPECTED_WIDTH, EXPECTED_HEIGHT, TEMPLATE_DIR
+
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+
+@dataclass(frozen=True)
+class Template:
+    """
+    A template image preprocessed for cv2.matchTemplate.
+
+    Attributes:
+        name (str): File stem of the template, e.g. "next_button".
+        path (Path): Where the template was loaded from.
+        gray (np.ndarray): Contiguous single channel uint8 image.
+        width (int): Template width in pixels.
+        height (int): Template height in pixels.
+        mask (np.ndarray | None): Alpha derived mask, None if the template is fully opaque.
+    """
+    name: str
+    path: Path
+    gray: np.ndarray
+    width: int
+    height: int
+    mask: np.ndarray | None = None
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.height, self.width
+
+
+@dataclass(frozen=True)
+class Match:
+    """
+    A single template hit on a screenshot.
+
+    Attributes:
+        x (int): Array x coordinate of the match's top-left corner.
+        y (int): Array y coordinate of the match's top-left corner.
+        score (float): Correlation score of the match.
+        template (str): Name of the template variant that produced the match.
+        width (int): Width of the matched template.
+        height (int): Height of the matched template.
+    """
+    x: int
+    y: int
+    score: float
+    template: str
+    width: int
+    height: int
+
+    @property
+    def point(self) -> ArrayPoint:
+        return ArrayPoint((self.x, self.y))
+
+
+def load_template(path: str | Path) -> Template:
+    """
+    Reads, validates and grayscale-converts a single template image.
+
+    Raises:
+        ValueError: If the file cannot be decoded or is larger than the expected screen.
+    """
+    path = Path(path)
+    image = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"Template {path} could not be read")
+
+    mask = None
+    if image.ndim == 2:
+        gray = image
+    elif image.shape[2] == 4:
+        alpha = image[:, :, 3]
+        if alpha.min() < 255:
+            mask = np.ascontiguousarray(alpha)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    else:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    height, width = gray.shape
+    if width > EXPECTED_WIDTH or height > EXPECTED_HEIGHT:
+        raise ValueError(f"Template {path} ({width}x{height}) is larger than the screen")
+    if mask is not None and not mask.any():
+        raise ValueError(f"Template {path} is fully transparent")
+
+    return Template(
+        name=path.stem,
+        path=path,
+        gray=np.ascontiguousarray(gray),
+        width=width,
+        height=height,
+        mask=mask,
+    )
+
+
+class TemplateRegistry:
+    """In-memory collection of templates keyed by file stem."""
+
+    def __init__(self, templates: dict[str, Template] | None = None):
+        self._templates = dict(templates or {})
+
+    @classmethod
+    def load(cls, directory: str | Path = TEMPLATE_DIR) -> "TemplateRegistry":
+        """Loads every PNG under `directory`; fails fast on any unreadable template."""
+        directory = Path(directory)
+        templates = {}
+        for path in sorted(directory.glob("*.png")):
+            template = load_template(path)
+            templates[template.name] = template
+        if not templates:
+            raise ValueError(f"No templates found in {directory.resolve()}")
+        logger.info(f"Loaded {len(templates)} templates from {directory}")
+        return cls(templates)
+
+    def __getitem__(self, name: str) -> Template:
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise KeyError(f"Unknown template '{name}', available: {sorted(self._templates)}") from None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._templates
+
+    def __iter__(self):
+        return iter(self._templates.values())
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def names(self) -> list[str]:
+        return sorted(self._templates)
+
+    def matching(self, prefix: str) -> list[Template]:
+        """Returns all templates whose name starts with `prefix`, e.g. every score button variant."""
+        return [t for name, t in sorted(self._templates.items()) if name.startswith(prefix)]
@@ -0,0 +1,139 @@
+"""
+triage.py
+Decides what to do with a report as soon as the screen reacts to its score button being clicked,
+instead of waiting out the load timeout on anything that is not a normal report. Each frame is
+matched once against every candidate: known error dialogs (any template named error_dialog*)
+mean "recover", the addendum label means "skip", and the loaded report means "capture".
+"""
+
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+import cv2
+
+from frame import Frame
+from state import UiState
+from templates import Template
+from util import match_template
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+SKIP = "skip"
+CAPTURE = "capture"
+RECOVER = "recover"
+
+# Template name prefix of the error dialogs to recover from, drop a screenshot of a new one into TEMPLATE_DIR
+ERROR_DIALOG_PREFIX = "error_dialog"
+
+
+@dataclass(frozen=True)
+class Triage:
+    """
+    Attributes:
+        route (str): SKIP, CAPTURE or RECOVER.
+        reason (str): Template that decided the route, or "load timeout" if the report window
+            opened but never finished loading.
+        elapsed (float): Seconds from the start of triage to the decision.
+    """
+    route: str
+    reason: str
+    elapsed: float = 0.0
+
+
+@dataclass(frozen=True)
+class TriageTemplates:
+    """The templates triage looks for, in the order they take precedence"""
+    error_dialogs: list[Template]
+    addendum: Template
+    loaded: Template
+    window: Template
+
+    @classmethod
+    def from_state(cls, state: UiState) -> "TriageTemplates":
+        templates = state.templates
+        return cls(
+            error_dialogs=templates.matching(ERROR_DIALOG_PREFIX),
+            addendum=templates["report_addendum_label"],
+            loaded=templates["highlight_start_point"],
+            window=templates["report_window_open_indicator"],
+        )
+
+
+def _found(gray, template: Template, threshold: float) -> bool:
+    if template.height > gray.shape[0] or template.width > gray.shape[1]:
+        return False
+    _, score, _, _ = cv2.minMaxLoc(match_template(gray, template))
+    return score > threshold
+
+
+def classify(frame: Frame, templates: TriageTemplates, threshold=0.8) -> tuple[str, str] | None:
+    """
+    (route, template that decided it) for a single frame, None while it is still undecided
+    (nothing opened yet, or the report window is open but still loading). Error dialogs are
+    searched for on the whole frame, the addendum label and load indicator only inside the
+    report window.
+    """
+    for dialog in templates.error_dialogs:
+        if _found(frame.gray, dialog, threshold):
+            return RECOVER, dialog.name
+    window = frame.roi("report_window")
+    # An addendum loads like any other report, so the label has to win over the load indicator
+    if _found(window, templates.addendum, threshold):
+        return SKIP, templates.addendum.name
+    if _found(window, templates.loaded, threshold):
+        return CAPTURE, templates.loaded.name
+    return None
+
+
+def window_open(frame: Frame, templates: TriageTemplates, threshold=0.8) -> bool:
+    return _found(frame.gray, templates.window, threshold)
+
+
+def triage_report(state: UiState, timeout=10, poll_interval=0.25, threshold=0.8) -> Triage:
+    """
+    Waits for the first frame that decides the report's route.
+
+    Raises:
+        TimeoutError: If neither a report window nor a known dialog appeared within `timeout` seconds.
+    """
+    templates = TriageTemplates.from_state(state)
+    decided: list[tuple[str, str]] = []
+
+    def decides(frame: Frame) -> bool:
+        decision = classify(frame, templates, threshold)
+        if decision is not None:
+            decided.append(decision)
+        return decision is not None
+
+    start_time = time.monotonic()
+    try:
+        state.wait_for(decides, timeout=timeout, poll_interval=poll_interval)
+    except TimeoutError:
+        state.refresh()
+        if not window_open(state.frame, templates, threshold):
+            raise TimeoutError(f"Timeout of {timeout} exceeded waiting for the report window to open") from None
+        return Triage(RECOVER, "load timeout", time.monotonic() - start_time)
+
+    route, reason = decided[-1]
+    return Triage(route, reason, time.monotonic() - start_time)
+
+
+class TriageLedger:
+    """Every triage decision of the run, by accession, so skipped and recovered reports can be listed at the end"""
+
+    def __init__(self):
+        self.decisions: list[tuple[str | None, Triage]] = []
+
+    def record(self, accession: str | None, triage: Triage):
+        self.decisions.append((accession, triage))
+
+    def accessions(self, route: str) -> list[str]:
+        return [accession or "?" for accession, triage in self.decisions if triage.route == route]
+
+    def summary(self) -> dict[str, int]:
+        return dict(Counter(f"{triage.route} ({triage.reason})" for _, triage in self.decisions))
+
+
+triage_ledger = TriageLedger()
@@ -1,114 +1,346 @@
 import time
+from collections import defaultdict
+from dataclasses import dataclass
+
 import cv2
-import pyperclip
-import keyboard
 import numpy as np
 from screen_types import ArrayPoint
 from state import UiState
+from frame import Frame, to_gray
+from change import detect_changes
+from templates import Match, Template
+from profiling import vision_profile
+from telemetry import summarize
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+def _correlate(screenshot_gray: np.ndarray, template: Template) -> np.ndarray:
+    if template.mask is None:
+        return cv2.matchTemplate(screenshot_gray, template.gray, cv2.TM_CCOEFF_NORMED)
+    return cv2.matchTemplate(screenshot_gray, template.gray, cv2.TM_CCOEFF_NORMED, mask=template.mask)
+
+def match_template(screenshot_gray: np.ndarray, template: Template) -> np.ndarray:
+    """Runs normalised cross-correlation of a preloaded template over a grayscale screenshot."""
+    if not vision_profile.enabled:
+        result = _correlate(screenshot_gray, template)
+    else:
+        with vision_profile.measure("matchTemplate", template.name) as sample:
+            result = _correlate(screenshot_gray, template)
+            sample.bytes, sample.pixels = screenshot_gray.nbytes, result.size * template.gray.size
+    if template.mask is None:
+        return result
+    # Masked correlation is undefined over flat regions, treat those as non-matches
+    return np.nan_to_num(result, nan=-1.0, posinf=-1.0, neginf=-1.0)
+
+def find_first_match(screenshot_array: Frame | np.ndarray, template: Template, threshold: float = None) -> ArrayPoint | None:
+    screenshot_gray = to_gray(screenshot_array)
+    result = match_template(screenshot_gray, template)
+    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+
+    if threshold is not None and max_val < threshold:
+        return None
+
+    return ArrayPoint((max_loc[0], max_loc[1]))
 
-def find_first_match(screenshot_array: np.ndarray, template_path: str, threshold: float = None) -> ArrayPoint | None:
-   template = cv2.imread(template_path)
-   template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-   h, w = template_gray.shape
-   screenshot_gray = cv2.cvtColor(screenshot_array, cv2.COLOR_BGR2GRAY)
-   result = cv2.matchTemplate(screenshot_gray, template_gray, cv2.TM_CCOEFF_NORMED)
-   min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-   
-   if threshold is not None and max_val < threshold:
-       return None
-       
-   return ArrayPoint((max_loc[0], max_loc[1]))
-
-def find_first_match_arr(screenshot_array: np.ndarray, template: np.ndarray) -> ArrayPoint | None:
+def find_first_match_arr(screenshot_array: Frame | np.ndarray, template: np.ndarray) -> ArrayPoint | None:
     template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
     h, w = template_gray.shape
 
-    screenshot_gray = cv2.cvtColor(screenshot_array, cv2.COLOR_BGR2GRAY)
-    result = cv2.matchTemplate(screenshot_gray, template_gray, cv2.TM_CCOEFF_NORMED)
+    screenshot_gray = to_gray(screenshot_array)
+    if not vision_profile.enabled:
+        result = cv2.matchTemplate(screenshot_gray, template_gray, cv2.TM_CCOEFF_NORMED)
+    else:
+        with vision_profile.measure("matchTemplate", "unregistered") as sample:
+            result = cv2.matchTemplate(screenshot_gray, template_gray, cv2.TM_CCOEFF_NORMED)
+            sample.bytes, sample.pixels = screenshot_gray.nbytes, result.size * template_gray.size
 
     min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
     return ArrayPoint((max_loc[0], max_loc[1]))
 
-def find_all_matches(screenshot_array: np.ndarray, template_path: str, threshold=0.8) -> np.ndarray[ArrayPoint]:
-    template = cv2.imread(template_path)
-    template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-    
-    screenshot_gray = cv2.cvtColor(screenshot_array, cv2.COLOR_BGR2GRAY)
-    result = cv2.matchTemplate(screenshot_gray, template_gray, cv2.TM_CCOEFF_NORMED)
-    
+def find_all_matches(screenshot_array: Frame | np.ndarray, template: Template, threshold=0.8) -> np.ndarray[ArrayPoint]:
+    screenshot_gray = to_gray(screenshot_array)
+    result = match_template(screenshot_gray, template)
+
     locations = np.where(result >= threshold)
     matches = np.array([ArrayPoint((x, y)) for x, y in zip(*locations[::-1])])
     return matches
 
-def find_top_k_matches(screenshot_array: np.ndarray, template_path: str, k: int) -> np.ndarray[ArrayPoint]:
-   template = cv2.imread(template_path)
-   template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-   
-   screenshot_gray = cv2.cvtColor(screenshot_array, cv2.COLOR_BGR2GRAY)
-   result = cv2.matchTemplate(screenshot_gray, template_gray, cv2.TM_CCOEFF_NORMED)
-   
-   # Get indices of top k matches
-   flat_indices = np.argsort(result.flatten())[-k:]
-   rows, cols = np.unravel_index(flat_indices, result.shape)
-   matches = np.array([ArrayPoint((x, y)) for x, y in zip(cols, rows)])
-   return matches
-
-def compare_screens(arr1, arr2, tolerance=0.9):
-   # Convert to integers
-   arr1_int = arr1.astype(int)
-   arr2_int = arr2.astype(int)
-   
-   # Get total elements
-   total = arr1_int.size
-   
-   # Count matching elements
-   matches = (arr1_int == arr2_int).sum()
-   
-   # Check if match ratio meets tolerance
-   return (matches / total) >= tolerance
-
-def is_ui_settled(state: UiState, capture_interval=0.2, poll_interval=1):
+def find_peaks(
+    result: np.ndarray, k: int, threshold: float | None = None, min_distance=5
+) -> list[tuple[ArrayPoint, float]]:
+    """
+    Extracts up to k distinct peaks from a matchTemplate correlation map.
+
+    Local maxima are found with a single dilation pass, then only the strongest candidates are
+    selected with argpartition, so the map is never fully sorted. Returned peaks are at least
+    `min_distance` + 1 pixels apart (Chebyshev distance) so adjacent pixels of one peak are never
+    reported twice.
+
+    Args:
+        result (np.ndarray): Correlation map from cv2.matchTemplate.
+        k (int): Maximum number of peaks to return.
+        threshold (float | None): Minimum score for a peak, None to accept any score.
+        min_distance (int): Suppression radius around each accepted peak.
+
+    Returns:
+        list[tuple[ArrayPoint, float]]: (point, score) pairs sorted by descending score.
+    """
+    if k <= 0 or result.size == 0:
+        return []
+
+    size = 2 * min_distance + 1
+    dilated = cv2.dilate(result, np.ones((size, size), np.uint8))
+    is_peak = result >= dilated
+    if threshold is not None:
+        is_peak &= result >= threshold
+
+    ys, xs = np.nonzero(is_peak)
+    scores = result[ys, xs]
+
+    # Plateaus yield several equal maxima per window. Each accepted peak can suppress at most
+    # size**2 candidates, so the strongest k * size**2 are always enough to find k peaks.
+    limit = k * size * size
+    if scores.size > limit:
+        top = np.argpartition(scores, -limit)[-limit:]
+        ys, xs, scores = ys[top], xs[top], scores[top]
+
+    peaks = []
+    for i in np.argsort(-scores, kind="stable"):
+        x, y = int(xs[i]), int(ys[i])
+        if all(max(abs(x - px), abs(y - py)) > min_distance for (px, py), _ in peaks):
+            peaks.append((ArrayPoint((x, y)), float(scores[i])))
+            if len(peaks) == k:
+                break
+    return peaks
+
+def find_top_k_matches(
+    screenshot_array: Frame | np.ndarray, template: Template, k: int, threshold: float | None = None, min_distance: int | None = None
+) -> np.ndarray[ArrayPoint]:
+    screenshot_gray = to_gray(screenshot_array)
+    result = match_template(screenshot_gray, template)
+
+    # Default to half the template so two hits can never overlap the same element
+    if min_distance is None:
+        min_distance = min(template.width, template.height) // 2
+    peaks = find_peaks(result, k, threshold=threshold, min_distance=min_distance)
+    matches = np.array([point for point, _ in peaks])
+    return matches
+
+def non_max_suppression(matches: list[Match], overlap=0.5) -> list[Match]:
+    """
+    Greedily keeps the highest scoring match and drops every other match whose box overlaps it
+    by more than `overlap` of the smaller box, so each physical element yields exactly one match.
+    """
+    if not matches:
+        return []
+
+    boxes = np.array([(m.x, m.y, m.x + m.width, m.y + m.height) for m in matches], dtype=np.float32)
+    scores = np.array([m.score for m in matches], dtype=np.float32)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-scores, kind="stable")
+
+    keep = []
+    while order.size > 0:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        iw = np.minimum(boxes[best, 2], boxes[rest, 2]) - np.maximum(boxes[best, 0], boxes[rest, 0])
+        ih = np.minimum(boxes[best, 3], boxes[rest, 3]) - np.maximum(boxes[best, 1], boxes[rest, 1])
+        intersection = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+        ratio = intersection / np.minimum(areas[best], areas[rest])
+        order = rest[ratio <= overlap]
+
+    return [matches[i] for i in keep]
+
+def find_matches_multi(
+    screenshot_array: Frame | np.ndarray,
+    templates: list[Template],
+    threshold=0.9,
+    region: tuple[int, int, int, int] | None = None,
+    overlap=0.5,
+) -> list[Match]:
+    """
+    Scores every template variant against a single grayscale conversion of the screenshot and
+    merges the hits with non-maximum suppression.
+
+    Args:
+        screenshot_array (Frame | np.ndarray): Frame or BGR screenshot.
+        templates (list[Template]): Variants of the same UI element.
+        threshold (float): Minimum correlation score for a hit.
+        region (tuple | None): (x, y, width, height) in array coordinates to restrict the search to.
+        overlap (float): Overlap ratio above which two hits are considered the same element.
+
+    Returns:
+        list[Match]: One match per element in array coordinates, sorted top to bottom.
+    """
+    screenshot_gray = to_gray(screenshot_array)
+    ox, oy = 0, 0
+    if region is not None:
+        ox, oy, rw, rh = region
+        screenshot_gray = screenshot_gray[oy : oy + rh, ox : ox + rw]
+
+    candidates = []
+    sh, sw = screenshot_gray.shape
+    for template in templates:
+        if template.height > sh or template.width > sw:
+            continue
+        result = match_template(screenshot_gray, template)
+        ys, xs = np.nonzero(result >= threshold)
+        candidates.extend(
+            Match(int(x) + ox, int(y) + oy, float(score), template.name, template.width, template.height)
+            for x, y, score in zip(xs, ys, result[ys, xs])
+        )
+
+    return sorted(non_max_suppression(candidates, overlap), key=lambda m: (m.y, m.x))
+
+def _elements(screen: Frame | np.ndarray, roi: tuple[int, int, int, int] | None) -> np.ndarray:
+    if isinstance(screen, Frame):
+        return screen.bgr if roi is None else screen.crop(roi, gray=False)
+    if roi is None:
+        return screen
+    x, y, w, h = roi
+    return screen[y : y + h, x : x + w]
+
+def compare_screens(arr1: Frame | np.ndarray, arr2: Frame | np.ndarray, tolerance=0.9, roi=None, band=64) -> bool:
+    """
+    Returns True if at least `tolerance` of the elements (each channel of each pixel, BGR for a
+    Frame) are equal between the two captures, optionally only within `roi`. The captures are
+    compared `band` rows at a time and the comparison stops as soon as too many elements differ
+    for the tolerance to still be met, so a clearly changed screen costs a fraction of a full pass.
+
+    For a tile based comparison that ignores tiny changes (tolerance meaning the fraction of
+    16 px tiles whose mean intensity is unchanged) use change.detect_changes instead.
+    """
+    a, b = _elements(arr1, roi), _elements(arr2, roi)
+    if a.shape != b.shape:
+        raise ValueError(f"Cannot compare captures of shape {a.shape} and {b.shape}")
+    if a.size == 0:
+        return True
+    allowed = (1.0 - tolerance) * a.size
+    differing = 0
+    for y in range(0, a.shape[0], band):
+        differing += int(np.count_nonzero(a[y : y + band] != b[y : y + band]))
+        if differing > allowed:
+            return False
+    return True
+
+@dataclass(frozen=True)
+class SettleResult:
+    """
+    Outcome of a single wait for the UI to settle.
+
+    Attributes:
+        settled (bool): False if the hard timeout was hit first.
+        elapsed (float): Seconds spent waiting.
+        frames (int): Number of frames captured while waiting.
+    """
+    settled: bool
+    elapsed: float
+    frames: int
+
+
+class SettleStats:
+    """Records how long each settle took, per label, so the settle parameters can be tuned from data"""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.timeouts: dict[str, int] = defaultdict(int)
+
+    def record(self, label: str, result: SettleResult):
+        self.samples[label].append(result.elapsed)
+        if not result.settled:
+            self.timeouts[label] += 1
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {label: {**summarize(samples), "timeouts": self.timeouts[label]} for label, samples in self.samples.items()}
+
+
+settle_stats = SettleStats()
+
+
+def is_ui_settled(
+    state: UiState,
+    roi: str | tuple[int, int, int, int] | None = None,
+    stable_frames=3,
+    min_stable=0.0,
+    ignore: list[tuple[int, int, int, int]] | None = None,
+    min_interval=0.05,
+    max_interval=0.5,
+    backoff=2.0,
+    timeout=15,
+    label="settle",
+) -> SettleResult:
     """
     Checks the screen to see if UI has "settled" i.e: have things stopped loading, etc
+
+    The UI counts as settled once `stable_frames` consecutive captures of `roi` are unchanged,
+    spanning at least `min_stable` seconds, ignoring the tiles under `ignore` (e.g. a blinking
+    caret). Raise `min_stable` for UI that changes in steps with pauses in between, such as
+    the report window autoscrolling under a drag. While the screen keeps changing
+    the capture interval backs off from `min_interval` up to `max_interval`, and drops back as
+    soon as an unchanged capture is seen so stability is confirmed quickly. With the background
+    grabber running every grabbed frame is used instead of sleeping. Gives up after `timeout`
+    seconds; the result is recorded in settle_stats under `label`.
     """
-    while True:
-        time.sleep(poll_interval)
-        state.refresh() 
-        screen1 = state.screen
-        time.sleep(capture_interval)
-        state.refresh()
-        screen2 = state.screen
-        
-        if compare_screens(screen1, screen2, tolerance=1.0):
-            break
+    bounds = state.capture.resolve(roi) if roi is not None else None
+    start_time = time.monotonic()
 
-def wait_for_appearance(state: UiState, template_path: str, timeout=10, poll_interval=0.5, threshold=0.8):
-    template = cv2.imread(template_path)
-    template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-    while timeout > 0:
-        state.refresh()
-        screen = state.screen
-        screen_gray = cv2.cvtColor(screen, cv2.COLOR_BGR2GRAY)
-        result = cv2.matchTemplate(screen_gray, template_gray, cv2.TM_CCOEFF_NORMED)
-        _, conf, _, _ = cv2.minMaxLoc(result)
+    def capture() -> Frame:
+        if state.grabber is not None:
+            state.refresh()
+            return state.frame
+        return state.capture.grab(bounds)
+
+    previous = capture()
+    frames, stable, interval = 1, 0, min_interval
+    stable_since = time.monotonic()
+    settled = False
+    while time.monotonic() - start_time < timeout:
+        if state.grabber is None:
+            time.sleep(max(0.0, min(interval, timeout - (time.monotonic() - start_time))))
+        current = capture()
+        frames += 1
+
+        report = detect_changes(previous, current, tolerance=1.0, roi=bounds if state.grabber else None, ignore=ignore)
+        if report.any_changed:
+            stable = 0
+            stable_since = time.monotonic()
+            interval = min(interval * backoff, max_interval)
+        else:
+            stable += 1
+            interval = min_interval
+            if stable >= stable_frames and time.monotonic() - stable_since >= min_stable:
+                settled = True
+                break
+        previous = current
 
-        if conf > threshold:
-            return
+    result = SettleResult(settled, time.monotonic() - start_time, frames)
+    settle_stats.record(label, result)
+    if settled:
+        logger.debug(f"UI settled ({label}) after {result.elapsed:.2f}s and {frames} frames")
+    else:
+        logger.warning(f"UI did not settle ({label}) within {timeout}s, continuing anyway")
+    return result
 
-        time.sleep(poll_interval)
-        timeout -= poll_interval
+def wait_for_appearance(state: UiState, template: Template, timeout=10, poll_interval=0.5, threshold=0.8):
+    def appeared(frame: Frame) -> bool:
+        _, conf, _, _ = cv2.minMaxLoc(match_template(frame.gray, template))
+        return conf > threshold
 
-    raise TimeoutError(f"Timeout of {timeout} exceeded waiting for {template_path} to appear")
+    try:
+        state.wait_for(appeared, timeout=timeout, poll_interval=poll_interval)
+    except TimeoutError:
+        raise TimeoutError(f"Timeout of {timeout} exceeded waiting for {template.name} to appear") from None
 
 def validate_state(state: UiState, action: callable, isChanged=True, timeout=10, interval=0.5):
     start_time = time.time()
     while time.time() - start_time < timeout:
         state.refresh()
-        before_state = state.screen
+        before_state = state.frame
         action()
         time.sleep(interval)
         state.refresh()
-        after_state = state.screen
+        after_state = state.frame
         if isChanged:
             if not compare_screens(before_state, after_state):
                 return
@@ -118,15 +350,15 @@ def validate_state(state: UiState, action: callable, isChanged=True, timeout=10,
 
     raise TimeoutError(f"State did not achieve isChanged {isChanged} within {timeout} seconds")
 
-def wait_for_paste(timeout: int) -> str:
+def wait_for_paste(state: UiState, timeout: int) -> str:
     """
     Tries to copy text from screen over and over until timeout expires
     """
-    pyperclip.copy("")
+    state.clipboard.copy("")
     start_time = time.time()
     while True:
-        keyboard.send('ctrl+c')
-        report = pyperclip.paste()
+        state.keyboard.send('ctrl+c')
+        report = state.clipboard.paste()
         if report:
             return report
 
@@ -0,0 +1,156 @@
+"""
+wait.py
+Declarative waits: each fixed sleep in the automation loop is replaced by the visual condition it
+was waiting for, a timeout and a poll strategy. Every wait records how much time it saved
+compared with the fixed delay it replaced.
+"""
+
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable
+
+import cv2
+
+from change import detect_changes
+from frame import Frame
+from state import UiState
+from templates import Template
+from util import is_ui_settled, match_template
+from logging_config import setup_logger
+
+logger = setup_logger(__name__)
+
+Bounds = tuple[int, int, int, int]
+
+
+@dataclass(frozen=True)
+class PollStrategy:
+    """
+    How often a condition is polled when the background grabber is not running. Starts at
+    `interval` and grows by `backoff` after every miss, up to `max_interval`.
+    """
+    interval: float = 0.03
+    max_interval: float = 0.25
+    backoff: float = 1.5
+
+
+@dataclass(frozen=True)
+class WaitCondition:
+    """
+    Attributes:
+        name (str): Label used in logs and in the ledger.
+        predicate (Callable[[Frame], bool]): Evaluated on captures of `region`.
+        region (str | Bounds | None): Named ROI or bounds to capture, None for the whole monitor.
+        timeout (float): Seconds to wait before giving up.
+        legacy_delay (float | None): The fixed sleep this condition replaces, used to report savings.
+        settle (bool): Once the predicate holds, also wait for `region` to stop changing.
+        required (bool): Raise TimeoutError on timeout instead of carrying on.
+    """
+    name: str
+    predicate: Callable[[Frame], bool]
+    region: str | Bounds | None = None
+    timeout: float = 3.0
+    legacy_delay: float | None = None
+    settle: bool = False
+    required: bool = False
+
+
+@dataclass(frozen=True)
+class WaitResult:
+    name: str
+    met: bool
+    elapsed: float
+    legacy_delay: float | None
+
+    @property
+    def saved(self) -> float:
+        """Seconds saved compared with the fixed delay, negative if the wait took longer"""
+        return 0.0 if self.legacy_delay is None else self.legacy_delay - self.elapsed
+
+
+class WaitLedger:
+    """Accumulates wait results per condition name"""
+
+    def __init__(self):
+        self.results: dict[str, list[WaitResult]] = defaultdict(list)
+
+    def record(self, result: WaitResult):
+        self.results[result.name].append(result)
+
+    @property
+    def total_saved(self) -> float:
+        return sum(r.saved for results in self.results.values() for r in results)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {
+            name: {
+                "count": len(results),
+                "timeouts": sum(not r.met for r in results),
+                "mean_elapsed": sum(r.elapsed for r in results) / len(results),
+                "total_saved": sum(r.saved for r in results),
+            }
+            for name, results in self.results.items()
+        }
+
+
+wait_ledger = WaitLedger()
+
+
+def capture_region(state: UiState, region: str | Bounds | None) -> Frame:
+    """Fresh capture of `region`, taken from the background grabber when it is running"""
+    bounds = state.capture.resolve(region)
+    if state.grabber is not None:
+        state.refresh()
+        return state.frame.sub(bounds)
+    return state.capture.grab(bounds)
+
+
+def changed(reference: Frame, ignore: list[Bounds] | None = None, min_delta=0.0) -> Callable[[Frame], bool]:
+    """Predicate: the capture differs from `reference` outside of the `ignore` regions"""
+    return lambda frame: detect_changes(reference, frame, ignore=ignore, min_delta=min_delta).any_changed
+
+
+def visible(template: Template, threshold=0.8) -> Callable[[Frame], bool]:
+    """Predicate: `template` is found in the capture with at least `threshold` confidence"""
+    def predicate(frame: Frame) -> bool:
+        _, conf, _, _ = cv2.minMaxLoc(match_template(frame.gray, template))
+        return conf >= threshold
+    return predicate
+
+
+def wait_until(state: UiState, condition: WaitCondition, poll: PollStrategy = PollStrategy()) -> WaitResult:
+    """
+    Blocks until `condition` holds or its timeout expires, then records the result in wait_ledger.
+
+    Raises:
+        TimeoutError: If the condition is required and was not met in time.
+    """
+    start_time = time.monotonic()
+    deadline = start_time + condition.timeout
+    interval = poll.interval
+    met = False
+    while True:
+        if condition.predicate(capture_region(state, condition.region)):
+            met = True
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if state.grabber is None:
+            time.sleep(min(interval, remaining))
+            interval = min(interval * poll.backoff, poll.max_interval)
+
+    if met and condition.settle:
+        remaining = max(0.0, deadline - time.monotonic())
+        is_ui_settled(state, roi=condition.region, stable_frames=2, timeout=remaining, label=condition.name)
+
+    result = WaitResult(condition.name, met, time.monotonic() - start_time, condition.legacy_delay)
+    wait_ledger.record(result)
+    if met:
+        logger.debug(f"Wait '{condition.name}' met after {result.elapsed:.2f}s, saved {result.saved:.2f}s")
+    else:
+        logger.debug(f"Wait '{condition.name}' not met within {condition.timeout}s")
+        if condition.required:
+            raise TimeoutError(f"Timeout of {condition.timeout} exceeded waiting for {condition.name}")
+    return result
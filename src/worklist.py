@@ -0,0 +1,182 @@
+"""
+worklist.py
+Parses the Sectra worklist grid text that copy_screen copies (ctrl+a, ctrl+c) into typed rows, and
+keeps an index of every row seen across scrolls and pages so each report is opened exactly once.
+
+The grid layout is assumed, not yet checked against a real Sectra paste: one tab separated header
+row, then one row per study, with at least these (case-insensitive) headers
+
+    Accession       accession number, the row's identity (required)
+    Exam            exam description, first line of the cell
+    Job State       signing date and time, e.g. "3/14/2025 9:05 AM"; if it holds no date the
+                    date is searched for anywhere in the row
+    Signing Author  reader who signed the report
+    Score           score text, e.g. "No Score"
+
+and any other columns ignored. A paste without an Accession header, or whose Accession column
+is empty in every row, is rejected so the caller falls back to opening buttons by position.
+"""
+
+import csv
+import io
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+
+from constants import WORKLIST_ROW_HEIGHT
+from screen_types import ScreenPoint
+
+# Grid header -> WorklistRow field, see the module docstring for the assumed layout
+COLUMNS = {
+    "accession": "accession",
+    "exam": "study",
+    "job state": "date",
+    "signing author": "reader",
+    "score": "score",
+}
+
+# Headers without which a row cannot be told apart from the others
+REQUIRED_COLUMNS = ["accession"]
+
+DATE_PATTERN = re.compile(r"\d{1,2}/\d{1,2}/\d{4}\s+\d{1,2}:\d{2}\s*[ap]m", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class WorklistRow:
+    """
+    One study row of the worklist grid.
+
+    Attributes:
+        accession (str): Accession number, empty if the column was blank.
+        study (str): Exam description, e.g. "XR CHEST 1 VIEW".
+        date (datetime | None): When the job was signed, None if it could not be parsed.
+        reader (str): Signing author.
+        score (str): Current score text, e.g. "No Score".
+    """
+    accession: str
+    study: str
+    date: datetime | None
+    reader: str
+    score: str
+
+    @property
+    def key(self) -> str:
+        """Identity used for deduplication, the accession number when the grid has one"""
+        if self.accession:
+            return self.accession
+        return f"{self.study}|{self.date.isoformat() if self.date else ''}|{self.reader}"
+
+
+def parse_date(cell: str) -> datetime | None:
+    match = DATE_PATTERN.search(cell)
+    if match is None:
+        return None
+    return datetime.strptime(re.sub(r"\s+", " ", match.group(0)).lower(), "%m/%d/%Y %I:%M %p")
+
+
+def parse_worklist(text: str) -> list[WorklistRow]:
+    """
+    Parses tab separated grid text into rows, in on-screen order. Cells spanning several lines
+    (e.g. exam name and modality) are quoted by the grid and only their first line is kept,
+    except for the date which is searched for anywhere in its cell.
+
+    Raises:
+        ValueError: If no header row is found, the header has no Accession column, or the
+            Accession column is empty in every row, i.e. the grid does not have the assumed layout.
+    """
+    header: dict[str, int] | None = None
+    rows = []
+    for fields in csv.reader(io.StringIO(text), delimiter="\t"):
+        cells = [field.strip() for field in fields]
+        if header is None:
+            lowered = [cell.lower() for cell in cells]
+            if any(name in lowered for name in COLUMNS):
+                missing = [name for name in REQUIRED_COLUMNS if name not in lowered]
+                if missing:
+                    raise ValueError(f"Worklist header {cells} has no {', '.join(missing)} column")
+                header = {COLUMNS[name]: lowered.index(name) for name in COLUMNS if name in lowered}
+            continue
+        if not any(cells):
+            continue
+
+        def cell(field: str) -> str:
+            index = header.get(field)
+            return cells[index] if index is not None and index < len(cells) else ""
+
+        first_line = lambda value: value.splitlines()[0].strip() if value else ""
+        rows.append(WorklistRow(
+            accession=first_line(cell("accession")),
+            study=first_line(cell("study")),
+            date=parse_date(cell("date")) or parse_date(" ".join(cells)),
+            reader=first_line(cell("reader")),
+            score=first_line(cell("score")),
+        ))
+
+    if header is None:
+        raise ValueError("No worklist header row found in grid text")
+    if rows and not any(row.accession for row in rows):
+        raise ValueError(f"Accession column is empty in all {len(rows)} rows, the grid layout does not match COLUMNS")
+    return rows
+
+
+class WorklistIndex:
+    """Every worklist row seen this run, and which of them have already been opened"""
+
+    def __init__(self):
+        self.rows: dict[str, WorklistRow] = {}
+        self.opened: set[str] = set()
+
+    def update(self, rows: list[WorklistRow]) -> int:
+        """Adds newly seen rows, returns how many were new"""
+        new = [row for row in rows if row.key not in self.rows]
+        self.rows.update((row.key, row) for row in new)
+        return len(new)
+
+    def assign(
+        self, rows: list[WorklistRow], button_locs: np.ndarray, first_visible: int = 0
+    ) -> list[tuple[WorklistRow, ScreenPoint]]:
+        """
+        Pairs visible score buttons (sorted top to bottom) with the grid rows they belong to.
+
+        Args:
+            rows (list[WorklistRow]): Every row of the current page, in grid order.
+            button_locs (np.ndarray): Score button positions currently on screen.
+            first_visible (int): Index of the row at the top of the view. Pass a negative value
+                to align the view to the bottom of the list instead, as after scrolling to the end.
+        """
+        if first_visible < 0:
+            first_visible = max(len(rows) - len(button_locs), 0)
+        visible = rows[first_visible : first_visible + len(button_locs)]
+        return [(row, ScreenPoint((int(loc[0]), int(loc[1])))) for row, loc in zip(visible, button_locs)]
+
+    def assign_by_position(
+        self, rows: list[WorklistRow], button_locs: np.ndarray, row_origin_y: int, row_height=WORKLIST_ROW_HEIGHT
+    ) -> list[tuple[WorklistRow, ScreenPoint]]:
+        """
+        Pairs score buttons with rows from their height on screen, so a button that was not
+        matched (e.g. on a row cut off at the edge of the view) does not shift the others.
+
+        Args:
+            rows (list[WorklistRow]): Every row of the current page, in grid order.
+            button_locs (np.ndarray): Score button positions currently on screen.
+            row_origin_y (int): Screen y the first row's button would be at with the list at its
+                current scroll position, i.e. its y at the top of the list minus the scroll offset.
+            row_height (int): Height of one worklist row in pixels.
+        """
+        assignments = []
+        for loc in button_locs:
+            index = round((int(loc[1]) - row_origin_y) / row_height)
+            if 0 <= index < len(rows):
+                assignments.append((rows[index], ScreenPoint((int(loc[0]), int(loc[1])))))
+        return assignments
+
+    def is_opened(self, row: WorklistRow) -> bool:
+        return row.key in self.opened
+
+    def mark_opened(self, row: WorklistRow):
+        self.opened.add(row.key)
+
+    def unopened(self, assignments: list[tuple[WorklistRow, ScreenPoint]]) -> list[tuple[WorklistRow, ScreenPoint]]:
+        return [(row, loc) for row, loc in assignments if not self.is_opened(row)]